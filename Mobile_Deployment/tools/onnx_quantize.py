@@ -1,9 +1,15 @@
 import argparse
+import hashlib
+import json
 import os
-from typing import Dict, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 
+# bump when _preprocess_image changes, old caches are then ignored
+CACHE_VERSION = 1
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
@@ -50,6 +56,30 @@ def parse_args() -> argparse.Namespace:
         default=[0.229, 0.224, 0.225],
         help="Std normalization values.",
     )
+    parser.add_argument(
+        "--cache_dir",
+        default=".calib_cache",
+        help="Directory of preprocessed calibration tensors, reused while only "
+        "quantization settings change (default: .calib_cache).",
+    )
+    parser.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="Preprocess calibration images in memory without the cache.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Processes to preprocess calibration images (default: cpu count).",
+    )
+    parser.add_argument(
+        "--calib_batch_size",
+        type=int,
+        default=1,
+        help="Samples per calibration batch, keep 1 for models exported with "
+        "a fixed batch size (default: 1).",
+    )
     parser.add_argument(
         "--per_channel",
         action="store_true",
@@ -141,6 +171,124 @@ class ImageCalibrationDataReader:
             return None
         return _preprocess_image(image_path, self.input_size, self.mean, self.std)
 
+    def rewind(self) -> None:
+        self._iter = iter(self.image_paths)
+
+
+class CachedCalibrationDataReader:
+    """Stream batches of calibration samples from the cached arrays."""
+
+    def __init__(self, images: np.ndarray, infos: np.ndarray, batch_size: int = 1):
+        self.images = images
+        self.infos = infos
+        self.batch_size = batch_size
+        self._start = 0
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        start, end = self._start, self._start + self.batch_size
+        if start >= len(self.images):
+            return None
+        self._start = end
+        infos = self.infos[start:end]
+        return {
+            # copy out of the mmap, pages are read only when needed
+            "image": np.array(self.images[start:end]),
+            "im_shape": np.array(infos[:, :2]),
+            "scale_factor": np.array(infos[:, 2:]),
+        }
+
+    def rewind(self) -> None:
+        self._start = 0
+
+
+def _cache_key(
+    image_paths: List[str], input_size: int, mean: List[float], std: List[float]
+) -> str:
+    files = []
+    for path in image_paths:
+        stat = os.stat(path)
+        files.append([os.path.abspath(path), stat.st_mtime_ns, stat.st_size])
+    key = json.dumps([CACHE_VERSION, files, input_size, list(mean), list(std)])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _fill_cache(
+    args: Tuple[str, List[Tuple[int, str]], int, List[float], List[float]]
+) -> List[Tuple[int, np.ndarray]]:
+    """Preprocess images into their rows of the cache file, in a worker."""
+    image_file, items, input_size, mean, std = args
+    images = np.load(image_file, mmap_mode="r+")
+    infos = []
+    for idx, path in items:
+        sample = _preprocess_image(path, input_size, mean, std)
+        images[idx] = sample["image"][0]
+        infos.append(
+            (idx, np.concatenate([sample["im_shape"][0], sample["scale_factor"][0]]))
+        )
+    images.flush()
+    return infos
+
+
+def load_calibration_cache(
+    image_paths: List[str],
+    input_size: int,
+    mean: List[float],
+    std: List[float],
+    cache_dir: str,
+    workers: int = 1,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return preprocessed images [N, 3, S, S] as a read-only memmap and their
+    im_shape + scale_factor rows [N, 4], building the cache if it is missing.
+    The cache is keyed by the image files (path, mtime, size), input size and
+    mean/std, so changing quantization settings reuses it.
+    """
+    key = _cache_key(image_paths, input_size, mean, std)
+    image_file = os.path.join(cache_dir, f"calib_{key}.image.npy")
+    info_file = os.path.join(cache_dir, f"calib_{key}.info.npy")
+    if os.path.exists(image_file) and os.path.exists(info_file):
+        print(f"Load {len(image_paths)} calibration samples from {image_file}")
+        return np.load(image_file, mmap_mode="r"), np.load(info_file)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_image_file = f"{image_file}.{os.getpid()}.tmp.npy"
+    images = np.lib.format.open_memmap(
+        tmp_image_file,
+        mode="w+",
+        dtype=np.float32,
+        shape=(len(image_paths), 3, input_size, input_size),
+    )
+    del images
+
+    items = list(enumerate(image_paths))
+    workers = max(1, min(workers, len(items)))
+    chunk = (len(items) + workers * 4 - 1) // (workers * 4)
+    tasks = [
+        (tmp_image_file, items[i : i + chunk], input_size, list(mean), list(std))
+        for i in range(0, len(items), chunk)
+    ]
+    infos = np.zeros((len(image_paths), 4), dtype=np.float32)
+    print(f"Preprocess {len(image_paths)} calibration samples with {workers} workers")
+    try:
+        if workers == 1:
+            results = list(map(_fill_cache, tasks))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(_fill_cache, tasks))
+        for result in results:
+            for idx, info in result:
+                infos[idx] = info
+        tmp_info_file = f"{info_file}.{os.getpid()}.tmp.npy"
+        np.save(tmp_info_file, infos)
+        # the image file is complete once renamed, info last marks the cache valid
+        os.replace(tmp_image_file, image_file)
+        os.replace(tmp_info_file, info_file)
+    finally:
+        if os.path.exists(tmp_image_file):
+            os.remove(tmp_image_file)
+    print(f"Saved calibration cache to {image_file}")
+    return np.load(image_file, mmap_mode="r"), infos
+
 
 def _maybe_optimize(input_path: str) -> str:
     try:
@@ -198,12 +346,25 @@ def main() -> None:
         else CalibrationMethod.MinMax
     )
 
-    data_reader = ImageCalibrationDataReader(
-        image_paths=image_paths,
-        input_size=args.input_size,
-        mean=args.mean,
-        std=args.std,
-    )
+    if args.no_cache:
+        data_reader = ImageCalibrationDataReader(
+            image_paths=image_paths,
+            input_size=args.input_size,
+            mean=args.mean,
+            std=args.std,
+        )
+    else:
+        images, infos = load_calibration_cache(
+            image_paths,
+            args.input_size,
+            args.mean,
+            args.std,
+            args.cache_dir,
+            workers=args.workers,
+        )
+        data_reader = CachedCalibrationDataReader(
+            images, infos, batch_size=args.calib_batch_size
+        )
 
     quantize_static(
         model_path,
@@ -0,0 +1,134 @@
+# Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Benchmark of PreprocessPlan against building the operators for every batch,
+on random jpg files, e.g.
+
+    python deploy/python/benchmark_preprocess.py --target_size 320 608
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import cv2
+import numpy as np
+
+# add deploy path of PaddleDetection to sys.path
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'])))
+sys.path.insert(0, parent_path)
+
+from preprocess import preprocess, create_inputs, PreprocessPlan, Resize, NormalizeImage, Permute
+
+
+def build_ops(preprocess_infos):
+    ops = []
+    for op_info in preprocess_infos:
+        new_op_info = op_info.copy()
+        op_type = new_op_info.pop('type')
+        ops.append(eval(op_type)(**new_op_info))
+    return ops
+
+
+def reference_preprocess(preprocess_infos, image_list):
+    # Detector.preprocess before PreprocessPlan
+    ops = build_ops(preprocess_infos)
+    imgs, im_infos = [], []
+    for im_file in image_list:
+        im, im_info = preprocess(im_file, ops)
+        imgs.append(im)
+        im_infos.append(im_info)
+    return create_inputs(imgs, im_infos)
+
+
+def timeit(func, batches, repeat):
+    costs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for batch in batches:
+            func(batch)
+        costs.append((time.perf_counter() - start) / len(batches))
+    return min(costs) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--target_size', type=int, nargs='+', default=[320, 608])
+    parser.add_argument('--batch_size', type=int, default=1)
+    parser.add_argument('--num_images', type=int, default=32)
+    parser.add_argument('--image_shape', type=int, nargs=2, default=[720, 1280])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        rng = np.random.RandomState(0)
+        image_list = []
+        for i in range(args.num_images):
+            # smooth content so the jpg decode cost is realistic
+            im = cv2.resize(
+                rng.randint(0, 256, (args.image_shape[0] // 16,
+                                     args.image_shape[1] // 16, 3)).astype(
+                                         np.uint8),
+                (args.image_shape[1], args.image_shape[0]))
+            path = os.path.join(tmp_dir, '{}.jpg'.format(i))
+            cv2.imwrite(path, im)
+            image_list.append(path)
+        bs = args.batch_size
+        batches = [
+            image_list[i:i + bs] for i in range(0, len(image_list), bs)
+        ]
+        decoded = [[
+            cv2.imread(path)[:, :, ::-1].copy() for path in batch
+        ] for batch in batches]
+
+        for size in args.target_size:
+            infos = [{
+                'type': 'Resize',
+                'target_size': [size, size],
+                'keep_ratio': False,
+                'interp': 2
+            }, {
+                'type': 'NormalizeImage',
+                'mean': [0.485, 0.456, 0.406],
+                'std': [0.229, 0.224, 0.225],
+                'is_scale': True
+            }, {
+                'type': 'Permute'
+            }]
+            plan = PreprocessPlan(build_ops(infos))
+            assert plan.fused
+            for inputs in [batches[0], decoded[0]]:
+                expect = reference_preprocess(infos, inputs)
+                out = plan(inputs, reuse_buffer=True)
+                for k, v in expect.items():
+                    assert np.array_equal(out[k], v), k
+
+            for name, data in [('jpg', batches), ('decoded', decoded)]:
+                ref_ms = timeit(lambda b: reference_preprocess(infos, b),
+                                data, args.repeat)
+                plan_ms = timeit(lambda b: plan(b, reuse_buffer=True), data,
+                                 args.repeat)
+                print('{0}x{0} {1} bs={2}: ops {3:.2f} ms/batch, plan {4:.2f} '
+                      'ms/batch, speedup {5:.2f}x'.format(
+                          size, name, bs, ref_ms, plan_ms, ref_ms / plan_ms))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
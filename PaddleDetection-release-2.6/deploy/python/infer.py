@@ -16,6 +16,12 @@ import os
 import yaml
 import glob
 import json
+import time
+import hashlib
+import threading
+from collections import deque
+from queue import Queue, Full, Empty
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from functools import reduce
 
@@ -33,10 +39,10 @@ sys.path.insert(0, parent_path)
 
 from benchmark_utils import PaddleInferBenchmark
 from picodet_postprocess import PicoDetPostProcess
-from preprocess import preprocess, Resize, NormalizeImage, Permute, PadStride, LetterBoxResize, WarpAffine, Pad, decode_image
+from preprocess import preprocess, Resize, NormalizeImage, Permute, PadStride, LetterBoxResize, WarpAffine, Pad, decode_image, create_inputs, PreprocessPlan
 from keypoint_preprocess import EvalAffine, TopDownEvalAffine, expand_crop
-from visualize import visualize_box_mask
-from utils import argsparser, Timer, get_current_memory_mb, multiclass_nms, coco_clsid2catid
+from visualize import visualize_box_mask, draw_box_cv2
+from utils import argsparser, Timer, get_current_memory_mb, multiclass_nms, batched_nms, slice_windows, coco_clsid2catid
 
 # Global dictionary
 SUPPORT_MODELS = {
@@ -48,6 +54,13 @@ SUPPORT_MODELS = {
 
 TUNED_TRT_DYNAMIC_MODELS = {'DETR'}
 
+# onnxruntime tensor types of outputs bound to preallocated buffers
+ONNX_DTYPES = {
+    'tensor(float)': np.float32,
+    'tensor(int32)': np.int32,
+    'tensor(int64)': np.int64
+}
+
 
 def bench_log(detector, img_list, model_info, batch_size=1, name=None):
     mems = {
@@ -130,19 +143,20 @@ class Detector(object):
         return PredictConfig(model_dir)
 
     def preprocess(self, image_list):
-        preprocess_ops = []
-        for op_info in self.pred_config.preprocess_infos:
-            new_op_info = op_info.copy()
-            op_type = new_op_info.pop('type')
-            preprocess_ops.append(eval(op_type)(**new_op_info))
+        inputs = self.create_batch_inputs(image_list, reuse_buffer=True)
+        self.set_inputs(inputs)
+        return inputs
+
+    def create_batch_inputs(self, image_list, reuse_buffer=False):
+        """
+        Decode and transform images into the inputs of model, the predictor
+        is not touched so it is safe to call from other threads unless
+        `reuse_buffer` is True, see PreprocessPlan.
+        """
+        plan = get_preprocess_plan(self.pred_config)
+        return plan(image_list, reuse_buffer=reuse_buffer)
 
-        input_im_lst = []
-        input_im_info_lst = []
-        for im_path in image_list:
-            im, im_info = preprocess(im_path, preprocess_ops)
-            input_im_lst.append(im)
-            input_im_info_lst.append(im_info)
-        inputs = create_inputs(input_im_lst, input_im_info_lst)
+    def set_inputs(self, inputs):
         input_names = self.predictor.get_input_names()
         for i in range(len(input_names)):
             input_tensor = self.predictor.get_input_handle(input_names[i])
@@ -151,8 +165,6 @@ class Detector(object):
             else:
                 input_tensor.copy_from_cpu(inputs[input_names[i]])
 
-        return inputs
-
     def postprocess(self, inputs, result):
         # postprocess output of predictor
         np_boxes_num = result['boxes_num']
@@ -245,113 +257,80 @@ class Detector(object):
                             run_benchmark=False,
                             repeats=1,
                             visual=True,
-                            save_results=False):
-        # slice infer only support bs=1
-        results = []
-        try:
-            import sahi
-            from sahi.slicing import slice_image
-        except Exception as e:
-            print(
-                'sahi not found, plaese install sahi. '
-                'for example: `pip install sahi`, see https://github.com/obss/sahi.'
+                            save_results=False,
+                            slice_batch_size=8):
+        """
+        Slice each image into overlapping windows, run the slices in batches
+        of `slice_batch_size` packed across images, and merge the results of
+        each image once all its slices are done. Only images with pending
+        slices are kept decoded, so memory is bounded by the batch instead
+        of the largest image's number of slices.
+        """
+        if combine_method not in ['nms', 'concat']:
+            raise ValueError(
+                "Now only support 'nms' or 'concat' to fuse detection results."
             )
-            raise e
         num_classes = len(self.pred_config.labels)
-        for i in range(len(img_list)):
-            ori_image = img_list[i]
-            slice_image_result = sahi.slicing.slice_image(
-                image=ori_image,
-                slice_height=slice_size[0],
-                slice_width=slice_size[1],
-                overlap_height_ratio=overlap_ratio[0],
-                overlap_width_ratio=overlap_ratio[1])
-            sub_img_num = len(slice_image_result)
-            merged_bboxs = []
-            print('slice to {} sub_samples.', sub_img_num)
-
-            batch_image_list = [
-                slice_image_result.images[_ind] for _ind in range(sub_img_num)
-            ]
-            if run_benchmark:
-                # preprocess
-                inputs = self.preprocess(batch_image_list)  # warmup
-                self.det_times.preprocess_time_s.start()
-                inputs = self.preprocess(batch_image_list)
-                self.det_times.preprocess_time_s.end()
-
-                # model prediction
-                result = self.predict(repeats=50, run_benchmark=True)  # warmup
-                self.det_times.inference_time_s.start()
-                result = self.predict(repeats=repeats, run_benchmark=True)
-                self.det_times.inference_time_s.end(repeats=repeats)
-
-                # postprocess
-                result_warmup = self.postprocess(inputs, result)  # warmup
-                self.det_times.postprocess_time_s.start()
-                result = self.postprocess(inputs, result)
-                self.det_times.postprocess_time_s.end()
-                self.det_times.img_num += 1
-
-                cm, gm, gu = get_current_memory_mb()
-                self.cpu_mem += cm
-                self.gpu_mem += gm
-                self.gpu_util += gu
-            else:
-                # preprocess
-                self.det_times.preprocess_time_s.start()
-                inputs = self.preprocess(batch_image_list)
-                self.det_times.preprocess_time_s.end()
-
-                # model prediction
-                self.det_times.inference_time_s.start()
-                result = self.predict()
-                self.det_times.inference_time_s.end()
-
-                # postprocess
-                self.det_times.postprocess_time_s.start()
-                result = self.postprocess(inputs, result)
-                self.det_times.postprocess_time_s.end()
-                self.det_times.img_num += 1
-
-            st, ed = 0, result['boxes_num'][0]  # start_index, end_index
-            for _ind in range(sub_img_num):
-                boxes_num = result['boxes_num'][_ind]
-                ed = st + boxes_num
-                shift_amount = slice_image_result.starting_pixels[_ind]
-                result['boxes'][st:ed][:, 2:4] = result['boxes'][
-                    st:ed][:, 2:4] + shift_amount
-                result['boxes'][st:ed][:, 4:6] = result['boxes'][
-                    st:ed][:, 4:6] + shift_amount
-                merged_bboxs.append(result['boxes'][st:ed])
-                st = ed
-
-            merged_results = {'boxes': []}
+        results = []
+        # slices of the current batch and their image index and window
+        batch_images, batch_owners, batch_windows = [], [], []
+        # per image: number of slices left and boxes of the finished ones
+        pending, merged_bboxs = {}, {}
+
+        def _run_batch():
+            result = self._predict_slice_batch(batch_images, run_benchmark,
+                                               repeats)
+            boxes_num = np.asarray(result['boxes_num']).reshape(-1)
+            boxes = result['boxes']
+            if boxes is None or len(boxes) == 0:
+                boxes = np.zeros((0, 6), dtype=np.float32)
+            # shift boxes of every slice back to its image at once
+            shift = np.repeat(np.asarray(batch_windows)[:, :2], boxes_num, 0)
+            boxes[:, 2:6] += np.tile(shift, 2)
+            owners = np.repeat(batch_owners, boxes_num)
+            for i in sorted(set(batch_owners)):
+                merged_bboxs[i].append(boxes[owners == i])
+                pending[i] -= batch_owners.count(i)
+                if pending[i] == 0:
+                    _merge_image(i)
+            del batch_images[:], batch_owners[:], batch_windows[:]
+
+        def _merge_image(i):
+            bboxs = np.concatenate(merged_bboxs.pop(i))
+            pending.pop(i)
             if combine_method == 'nms':
-                final_boxes = multiclass_nms(
-                    np.concatenate(merged_bboxs), num_classes, match_threshold,
-                    match_metric)
-                merged_results['boxes'] = np.concatenate(final_boxes)
-            elif combine_method == 'concat':
-                merged_results['boxes'] = np.concatenate(merged_bboxs)
-            else:
-                raise ValueError(
-                    "Now only support 'nms' or 'concat' to fuse detection results."
-                )
-            merged_results['boxes_num'] = np.array(
-                [len(merged_results['boxes'])], dtype=np.int32)
-
+                bboxs = batched_nms(bboxs, num_classes, match_threshold,
+                                    match_metric)
+            merged_results = {
+                'boxes': bboxs,
+                'boxes_num': np.array(
+                    [len(bboxs)], dtype=np.int32)
+            }
+            self.det_times.img_num += 1
             if visual:
                 visualize(
-                    [ori_image],  # should be list
+                    [img_list[i]],  # should be list
                     merged_results,
                     self.pred_config.labels,
                     output_dir=self.output_dir,
                     threshold=self.threshold)
-
             results.append(merged_results)
             print('Test iter {}'.format(i))
 
+        for i, ori_image in enumerate(img_list):
+            im, _ = decode_image(ori_image, {})
+            windows = slice_windows(im.shape[0], im.shape[1], slice_size,
+                                    overlap_ratio)
+            pending[i], merged_bboxs[i] = len(windows), []
+            for x0, y0, x1, y1 in windows:
+                batch_images.append(im[y0:y1, x0:x1])
+                batch_owners.append(i)
+                batch_windows.append((x0, y0))
+                if len(batch_images) == slice_batch_size:
+                    _run_batch()
+        if len(batch_images) > 0:
+            _run_batch()
+
         results = self.merge_batch_result(results)
         if save_results:
             Path(self.output_dir).mkdir(exist_ok=True)
@@ -359,12 +338,61 @@ class Detector(object):
                 img_list, results, use_coco_category=FLAGS.use_coco_category)
         return results
 
+    def _predict_slice_batch(self, batch_image_list, run_benchmark=False,
+                             repeats=1):
+        if run_benchmark:
+            # preprocess
+            inputs = self.preprocess(batch_image_list)  # warmup
+            self.det_times.preprocess_time_s.start()
+            inputs = self.preprocess(batch_image_list)
+            self.det_times.preprocess_time_s.end()
+
+            # model prediction
+            result = self.predict(repeats=50, run_benchmark=True)  # warmup
+            self.det_times.inference_time_s.start()
+            result = self.predict(repeats=repeats, run_benchmark=True)
+            self.det_times.inference_time_s.end(repeats=repeats)
+
+            # postprocess
+            result_warmup = self.postprocess(inputs, result)  # warmup
+            self.det_times.postprocess_time_s.start()
+            result = self.postprocess(inputs, result)
+            self.det_times.postprocess_time_s.end()
+
+            cm, gm, gu = get_current_memory_mb()
+            self.cpu_mem += cm
+            self.gpu_mem += gm
+            self.gpu_util += gu
+        else:
+            # preprocess
+            self.det_times.preprocess_time_s.start()
+            inputs = self.preprocess(batch_image_list)
+            self.det_times.preprocess_time_s.end()
+
+            # model prediction
+            self.det_times.inference_time_s.start()
+            result = self.predict()
+            self.det_times.inference_time_s.end()
+
+            # postprocess
+            self.det_times.postprocess_time_s.start()
+            result = self.postprocess(inputs, result)
+            self.det_times.postprocess_time_s.end()
+        return result
+
     def predict_image(self,
                       image_list,
                       run_benchmark=False,
                       repeats=1,
                       visual=True,
-                      save_results=False):
+                      save_results=False,
+                      pipeline_depth=0):
+        if pipeline_depth > 0 and not run_benchmark:
+            return self.predict_image_pipeline(
+                image_list,
+                pipeline_depth=pipeline_depth,
+                visual=visual,
+                save_results=save_results)
         batch_loop_cnt = math.ceil(float(len(image_list)) / self.batch_size)
         results = []
         for i in range(batch_loop_cnt):
@@ -428,9 +456,131 @@ class Detector(object):
                 image_list, results, use_coco_category=FLAGS.use_coco_category)
         return results
 
-    def predict_video(self, video_file, camera_id):
+    def predict_image_pipeline(self,
+                               image_list,
+                               pipeline_depth=2,
+                               visual=True,
+                               save_results=False):
+        """
+        Same as predict_image, but batches are preprocessed by a pool of
+        `pipeline_depth` threads and postprocessed (and visualized) by
+        another thread, while this thread only runs the predictor. At most
+        `pipeline_depth` batches wait for or in preprocessing and for
+        postprocessing, and results are returned in order of image_list.
+        Stage times in det_times are the busy time of each stage, their sum
+        is larger than the wall time reported as pipeline_time_s.
+        """
+        if type(self).preprocess is not Detector.preprocess:
+            print('{} has its own preprocess, run without pipeline'.format(
+                type(self).__name__))
+            return self.predict_image(
+                image_list, visual=visual, save_results=save_results)
+
+        batches = [
+            image_list[i:i + self.batch_size]
+            for i in range(0, len(image_list), self.batch_size)
+        ]
+        results = [None] * len(batches)
+        timer = self.det_times
+        # None stops the postprocess thread
+        post_queue = Queue(maxsize=pipeline_depth)
+        errors = []
+
+        def _preprocess(batch_image_list):
+            start = time.time()
+            inputs = self.create_batch_inputs(batch_image_list)
+            return inputs, time.time() - start
+
+        def _postprocess():
+            while True:
+                item = post_queue.get()
+                if item is None:
+                    return
+                if errors:
+                    continue
+                i, inputs, result = item
+                try:
+                    timer.postprocess_time_s.start()
+                    result = self.postprocess(inputs, result)
+                    timer.postprocess_time_s.end()
+                    if visual:
+                        visualize(
+                            batches[i],
+                            result,
+                            self.pred_config.labels,
+                            output_dir=self.output_dir,
+                            threshold=self.threshold)
+                    results[i] = result
+                except Exception as e:
+                    errors.append(e)
+
+        post_thread = threading.Thread(target=_postprocess, daemon=True)
+        post_thread.start()
+        pending = deque()
+        wall_start = time.time()
+        try:
+            with ThreadPoolExecutor(max_workers=pipeline_depth) as executor:
+                next_batch = 0
+                for i in range(len(batches)):
+                    while next_batch < len(batches) and \
+                            len(pending) < pipeline_depth:
+                        pending.append(
+                            executor.submit(_preprocess, batches[next_batch]))
+                        next_batch += 1
+                    timer.record_queue('preprocess',
+                                       sum(f.done() for f in pending))
+                    wait_start = time.time()
+                    inputs, cost = pending.popleft().result()
+                    timer.record_wait('preprocess', time.time() - wait_start)
+                    timer.preprocess_time_s.add(cost)
+
+                    self.set_inputs(inputs)
+                    timer.inference_time_s.start()
+                    result = self.predict()
+                    timer.inference_time_s.end()
+                    timer.img_num += len(batches[i])
+
+                    timer.record_queue('postprocess', post_queue.qsize())
+                    wait_start = time.time()
+                    post_queue.put((i, inputs, result))
+                    timer.record_wait('postprocess', time.time() - wait_start)
+                    if errors:
+                        break
+                    print('Test iter {}'.format(i))
+        finally:
+            for f in pending:
+                f.cancel()
+            post_queue.put(None)
+            post_thread.join()
+        timer.pipeline_time_s.add(time.time() - wall_start)
+        if errors:
+            raise errors[0]
+
+        results = self.merge_batch_result(results)
+        if save_results:
+            Path(self.output_dir).mkdir(exist_ok=True)
+            self.save_coco_results(
+                image_list, results, use_coco_category=FLAGS.use_coco_category)
+        return results
+
+    def predict_video(self,
+                      video_file,
+                      camera_id,
+                      visual=True,
+                      frame_batch_size=None,
+                      queue_size=8):
+        """
+        Predict a video file or camera stream. Frames are decoded by a reader
+        thread and encoded by a writer thread, while this thread runs the
+        model on batches of `frame_batch_size` consecutive frames (default
+        is the batch size of the detector) and draws the boxes on the BGR
+        frames with cv2. The writer is not created if `visual` is False. A
+        camera does not wait for the model, when the reader gets ahead by
+        `queue_size` frames the oldest are dropped and counted.
+        """
         video_out_name = 'output.mp4'
-        if camera_id != -1:
+        is_camera = camera_id != -1
+        if is_camera:
             capture = cv2.VideoCapture(camera_id)
         else:
             capture = cv2.VideoCapture(video_file)
@@ -441,33 +591,150 @@ class Detector(object):
         fps = int(capture.get(cv2.CAP_PROP_FPS))
         frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
         print("fps: %d, frame_count: %d" % (fps, frame_count))
+        frame_batch_size = frame_batch_size or self.batch_size
+
+        writer = None
+        if visual:
+            if not os.path.exists(self.output_dir):
+                os.makedirs(self.output_dir)
+            out_path = os.path.join(self.output_dir, video_out_name)
+            fourcc = cv2.VideoWriter_fourcc(* 'mp4v')
+            writer = cv2.VideoWriter(out_path, fourcc, fps, (width, height))
+
+        stop = threading.Event()
+        frame_queue = Queue(maxsize=queue_size)
+        write_queue = Queue(maxsize=queue_size)
+        counts = {'read': 0, 'dropped': 0}
+
+        def _put(q, item):
+            # give up once the consumer is gone, e.g. 'q' is pressed
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return
+                except Full:
+                    continue
+
+        def _read():
+            try:
+                while not stop.is_set():
+                    ret, frame = capture.read()
+                    if not ret:
+                        break
+                    counts['read'] += 1
+                    if not is_camera:
+                        _put(frame_queue, frame)
+                        continue
+                    while True:
+                        try:
+                            frame_queue.put_nowait(frame)
+                            break
+                        except Full:
+                            try:
+                                frame_queue.get_nowait()
+                                counts['dropped'] += 1
+                            except Empty:
+                                pass
+            finally:
+                _put(frame_queue, None)
+
+        def _write():
+            while True:
+                frame = write_queue.get()
+                if frame is None:
+                    break
+                writer.write(frame)
+
+        reader = threading.Thread(target=_read, daemon=True)
+        reader.start()
+        if writer is not None:
+            write_thread = threading.Thread(target=_write, daemon=True)
+            write_thread.start()
 
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)
-        out_path = os.path.join(self.output_dir, video_out_name)
-        fourcc = cv2.VideoWriter_fourcc(* 'mp4v')
-        writer = cv2.VideoWriter(out_path, fourcc, fps, (width, height))
-        index = 1
-        while (1):
-            ret, frame = capture.read()
-            if not ret:
-                break
-            print('detect frame: %d' % (index))
-            index += 1
-            results = self.predict_image([frame[:, :, ::-1]], visual=False)
-
-            im = visualize_box_mask(
-                frame,
-                results,
-                self.pred_config.labels,
-                threshold=self.threshold)
-            im = np.array(im)
-            writer.write(im)
-            if camera_id != -1:
-                cv2.imshow('Mask Detection', im)
-                if cv2.waitKey(1) & 0xFF == ord('q'):
+        index, end_of_stream = 0, False
+        start_time = None
+        try:
+            while not end_of_stream:
+                frames = [frame_queue.get()]
+                if frames[0] is None:
                     break
-        writer.release()
+                if start_time is None:
+                    start_time = time.time()
+                while len(frames) < frame_batch_size:
+                    frame = frame_queue.get()
+                    if frame is None:
+                        end_of_stream = True
+                        break
+                    frames.append(frame)
+                print('detect frame: %d-%d' % (index + 1, index + len(frames)))
+                index += len(frames)
+
+                # preprocess
+                self.det_times.preprocess_time_s.start()
+                inputs = self.preprocess([f[:, :, ::-1] for f in frames])
+                self.det_times.preprocess_time_s.end()
+
+                # model prediction
+                self.det_times.inference_time_s.start()
+                result = self.predict()
+                self.det_times.inference_time_s.end()
+
+                # postprocess
+                self.det_times.postprocess_time_s.start()
+                result = self.postprocess(inputs, result)
+                self.det_times.postprocess_time_s.end()
+                self.det_times.img_num += len(frames)
+
+                if writer is None and not is_camera:
+                    continue
+                for im in self._draw_frames(frames, result):
+                    if writer is not None:
+                        write_queue.put(im)
+                    if is_camera:
+                        cv2.imshow('Mask Detection', im)
+                        if cv2.waitKey(1) & 0xFF == ord('q'):
+                            end_of_stream = True
+                            break
+        finally:
+            stop.set()
+            reader.join()
+            capture.release()
+            if writer is not None:
+                write_queue.put(None)
+                write_thread.join()
+                writer.release()
+
+        elapsed = time.time() - start_time if start_time is not None else 0.
+        print('processed frames: %d, time: %.2fs, sustained fps: %.2f' %
+              (index, elapsed, index / elapsed if elapsed > 0 else 0.))
+        if is_camera:
+            print('read frames: %d, dropped frames: %d' %
+                  (counts['read'], counts['dropped']))
+
+    def _draw_frames(self, frames, result):
+        start_idx = 0
+        for idx, frame in enumerate(frames):
+            im_bboxes_num = result['boxes_num'][idx]
+            im_results = {
+                k: result[k][start_idx:start_idx + im_bboxes_num]
+                for k in ['boxes', 'masks', 'segm', 'label', 'score']
+                if k in result
+            }
+            start_idx += im_bboxes_num
+            if 'masks' in im_results or 'segm' in im_results:
+                im = np.array(
+                    visualize_box_mask(
+                        frame,
+                        im_results,
+                        self.pred_config.labels,
+                        threshold=self.threshold))
+            else:
+                im = draw_box_cv2(
+                    frame,
+                    im_results.get('boxes', np.zeros((0, 6))),
+                    self.pred_config.labels,
+                    threshold=self.threshold)
+            yield im
 
     def save_coco_results(self, image_list, results, use_coco_category=False):
         bbox_results = []
@@ -715,45 +982,190 @@ class DetectorPicoDet(Detector):
         return result
 
 
-def create_inputs(imgs, im_info):
-    """generate input for different model type
+class OnnxDetector(Detector):
+    """
+    Detector running an ONNX model exported by paddle2onnx with ONNX Runtime,
+    sharing preprocess, postprocess, visualization and timers of Detector.
+    The model should output boxes [N, 6] and boxes_num [B] like the paddle
+    inference model, i.e. exported with NMS.
+
     Args:
-        imgs (list(numpy)): list of images (np.ndarray)
-        im_info (list(dict)): list of image info
-    Returns:
-        inputs (dict): input of model
+        model_dir (str): root path of infer_cfg.yml
+        onnx_file (str): path of the onnx model, default is model.onnx in
+            model_dir
+        device (str): CPU or GPU, GPU needs onnxruntime-gpu
+        batch_size (int): size of pre batch in inference, models with a
+            fixed batch dimension (e.g. 1 with multiclass_nms3) are run in
+            chunks of that size
+        cpu_threads (int): intra-op threads of ONNX Runtime
+        inter_op_threads (int): inter-op threads, more than 1 runs
+            independent nodes in parallel
+        graph_opt_level (str): graph optimization level, one of disable,
+            basic, extended and all
+        optimized_model_dir (str|None): directory to cache the optimized
+            model, so later sessions skip graph optimization, None to
+            disable the cache
+        use_iobinding (bool): bind inputs and outputs to preallocated
+            buffers instead of copying them in each run
+        output_dir (str): The path of output
+        threshold (float): The threshold of score for visualization
     """
-    inputs = {}
-
-    im_shape = []
-    scale_factor = []
-    if len(imgs) == 1:
-        inputs['image'] = np.array((imgs[0], )).astype('float32')
-        inputs['im_shape'] = np.array(
-            (im_info[0]['im_shape'], )).astype('float32')
-        inputs['scale_factor'] = np.array(
-            (im_info[0]['scale_factor'], )).astype('float32')
-        return inputs
 
-    for e in im_info:
-        im_shape.append(np.array((e['im_shape'], )).astype('float32'))
-        scale_factor.append(np.array((e['scale_factor'], )).astype('float32'))
+    def __init__(self,
+                 model_dir,
+                 onnx_file=None,
+                 device='CPU',
+                 batch_size=1,
+                 cpu_threads=1,
+                 inter_op_threads=1,
+                 graph_opt_level='all',
+                 optimized_model_dir=None,
+                 use_iobinding=True,
+                 output_dir='output',
+                 threshold=0.5):
+        self.pred_config = self.set_config(model_dir)
+        if onnx_file is None:
+            onnx_file = os.path.join(model_dir, 'model.onnx')
+        self.predictor = load_onnx_predictor(
+            onnx_file,
+            device=device,
+            cpu_threads=cpu_threads,
+            inter_op_threads=inter_op_threads,
+            graph_opt_level=graph_opt_level,
+            optimized_model_dir=optimized_model_dir)
+        self.config = None
+        self.det_times = Timer()
+        self.cpu_mem, self.gpu_mem, self.gpu_util = 0, 0, 0
+        self.batch_size = batch_size
+        self.output_dir = output_dir
+        self.threshold = threshold
+        self.use_iobinding = use_iobinding
+
+        self.input_names = [x.name for x in self.predictor.get_inputs()]
+        self.output_names = [x.name for x in self.predictor.get_outputs()]
+        self.output_shapes = {
+            x.name: x.shape
+            for x in self.predictor.get_outputs()
+        }
+        self.output_dtypes = {
+            x.name: ONNX_DTYPES.get(x.type)
+            for x in self.predictor.get_outputs()
+        }
+        batch_dim = self.predictor.get_inputs()[0].shape[0]
+        # None if the batch dimension is dynamic
+        self.model_batch_size = batch_dim if isinstance(batch_dim,
+                                                        int) else None
+        self._inputs = None
+        self._output_buffers = {}
+
+    def set_inputs(self, inputs):
+        feeds = {}
+        for name in self.input_names:
+            key = 'image' if name == 'x' else name
+            feeds[name] = np.ascontiguousarray(inputs[key], dtype=np.float32)
+        self._inputs = feeds
+
+    def _run(self, feeds):
+        if not self.use_iobinding:
+            return self.predictor.run(self.output_names, feeds)
+        binding = self.predictor.io_binding()
+        for name, value in feeds.items():
+            binding.bind_cpu_input(name, value)
+        num = len(next(iter(feeds.values())))
+        for name in self.output_names:
+            buf = self._output_buffer(name, num)
+            if buf is None:
+                # dynamic shape, e.g. boxes after NMS, allocated by ORT
+                binding.bind_output(name, 'cpu')
+            else:
+                binding.bind_output(name, 'cpu', 0, buf.dtype.type,
+                                    buf.shape, buf.ctypes.data)
+        self.predictor.run_with_iobinding(binding)
+        outputs = binding.copy_outputs_to_cpu()
+        # copy_outputs_to_cpu copies preallocated outputs too, return the
+        # buffers themselves to skip the copy
+        return [
+            self._output_buffers.get((name, num), out)
+            for name, out in zip(self.output_names, outputs)
+        ]
+
+    def _output_buffer(self, name, num):
+        key = (name, num)
+        if key not in self._output_buffers:
+            shape = list(self.output_shapes[name])
+            if len(shape) > 0 and not isinstance(shape[0], int):
+                shape[0] = num
+            dtype = self.output_dtypes[name]
+            if dtype is None or not all(
+                    isinstance(s, int) and s > 0 for s in shape):
+                return None
+            self._output_buffers[key] = np.empty(shape, dtype=dtype)
+        return self._output_buffers[key]
+
+    def predict(self, repeats=1, run_benchmark=False):
+        '''
+        Args:
+            repeats (int): repeats number for prediction
+        Returns:
+            result (dict): same as Detector.predict
+        '''
+        feeds = self._inputs
+        num = len(feeds[self.input_names[0]])
+        step = self.model_batch_size or num
+        np_boxes_num, np_boxes, np_masks = np.array([0]), None, None
+        for i in range(repeats):
+            outputs = []
+            for st in range(0, num, step):
+                chunk = {k: v[st:st + step] for k, v in feeds.items()}
+                pad = step - len(chunk[self.input_names[0]])
+                if pad > 0:
+                    # fixed batch dimension, repeat the last image
+                    chunk = {
+                        k: np.concatenate([v] + [v[-1:]] * pad)
+                        for k, v in chunk.items()
+                    }
+                out = self._run(chunk)
+                if num > step:
+                    # preallocated outputs are reused by the next chunk
+                    out = [np.array(o) for o in out]
+                outputs.append(out + [step - pad])
+        if run_benchmark:
+            return dict(boxes=np_boxes, masks=np_masks, boxes_num=np_boxes_num)
+
+        boxes, boxes_num, masks = [], [], []
+        for out in outputs:
+            valid = out[-1]
+            if len(self.output_names) == 1:
+                # some exported model can not get tensor 'bbox_num'
+                num_i = np.array([len(out[0])])
+            else:
+                num_i = np.asarray(out[1]).reshape(-1)[:valid]
+            boxes.append(np.asarray(out[0])[:int(num_i.sum())])
+            boxes_num.append(num_i)
+            if self.pred_config.mask:
+                masks.append(np.asarray(out[2])[:int(num_i.sum())])
+        np_boxes = np.concatenate(boxes)
+        np_boxes_num = np.concatenate(boxes_num)
+        if self.pred_config.mask:
+            np_masks = np.concatenate(masks)
+        return dict(boxes=np_boxes, masks=np_masks, boxes_num=np_boxes_num)
 
-    inputs['im_shape'] = np.concatenate(im_shape, axis=0)
-    inputs['scale_factor'] = np.concatenate(scale_factor, axis=0)
 
-    imgs_shape = [[e.shape[1], e.shape[2]] for e in imgs]
-    max_shape_h = max([e[0] for e in imgs_shape])
-    max_shape_w = max([e[1] for e in imgs_shape])
-    padding_imgs = []
-    for img in imgs:
-        im_c, im_h, im_w = img.shape[:]
-        padding_im = np.zeros(
-            (im_c, max_shape_h, max_shape_w), dtype=np.float32)
-        padding_im[:, :im_h, :im_w] = img
-        padding_imgs.append(padding_im)
-    inputs['image'] = np.stack(padding_imgs, axis=0)
-    return inputs
+def get_preprocess_plan(pred_config):
+    """
+    Build the preprocess operators of `pred_config` once and keep the
+    PreprocessPlan on it, as they are the same for every batch and frame
+    """
+    plan = getattr(pred_config, 'preprocess_plan', None)
+    if plan is None:
+        preprocess_ops = []
+        for op_info in pred_config.preprocess_infos:
+            new_op_info = op_info.copy()
+            op_type = new_op_info.pop('type')
+            preprocess_ops.append(eval(op_type)(**new_op_info))
+        plan = PreprocessPlan(preprocess_ops)
+        pred_config.preprocess_plan = plan
+    return plan
 
 
 class PredictConfig():
@@ -933,6 +1345,79 @@ def load_predictor(model_dir,
     return predictor, config
 
 
+def load_onnx_predictor(onnx_file,
+                        device='CPU',
+                        cpu_threads=1,
+                        inter_op_threads=1,
+                        graph_opt_level='all',
+                        optimized_model_dir=None):
+    """create ONNX Runtime InferenceSession
+    Args:
+        onnx_file (str): path of the onnx model
+        device (str): CPU or GPU
+        cpu_threads (int): intra-op threads
+        inter_op_threads (int): inter-op threads
+        graph_opt_level (str): disable/basic/extended/all
+        optimized_model_dir (str|None): directory to cache the optimized
+            model, keyed by the model file, level and onnxruntime version
+    Returns:
+        predictor (onnxruntime.InferenceSession)
+    """
+    try:
+        import onnxruntime as ort
+    except Exception as e:
+        print('onnxruntime not found, plaese install onnxruntime. '
+              'for example: `pip install onnxruntime`.')
+        raise e
+    if not os.path.exists(onnx_file):
+        raise ValueError("Cannot find onnx model: {}".format(onnx_file))
+    opt_levels = {
+        'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    }
+    assert graph_opt_level in opt_levels, \
+        "graph_opt_level should be one of {}".format(list(opt_levels.keys()))
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = cpu_threads
+    options.inter_op_num_threads = inter_op_threads
+    options.execution_mode = ort.ExecutionMode.ORT_PARALLEL \
+        if inter_op_threads > 1 else ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = opt_levels[graph_opt_level]
+    providers = ['CPUExecutionProvider']
+    if device == 'GPU':
+        providers.insert(0, 'CUDAExecutionProvider')
+
+    model_file, tmp_file = onnx_file, None
+    if optimized_model_dir and graph_opt_level != 'disable':
+        stat = os.stat(onnx_file)
+        key = '{}|{}|{}|{}|{}|{}'.format(
+            os.path.abspath(onnx_file), stat.st_mtime_ns, stat.st_size,
+            graph_opt_level, ort.__version__, ','.join(providers))
+        cached_file = os.path.join(
+            optimized_model_dir, '{}.{}.onnx'.format(
+                os.path.splitext(os.path.basename(onnx_file))[0],
+                hashlib.md5(key.encode('utf-8')).hexdigest()[:16]))
+        if os.path.exists(cached_file):
+            print('Load optimized onnx model from {}'.format(cached_file))
+            model_file = cached_file
+            # already optimized offline
+            options.graph_optimization_level = opt_levels['disable']
+        else:
+            os.makedirs(optimized_model_dir, exist_ok=True)
+            tmp_file = '{}.{}.tmp'.format(cached_file, os.getpid())
+            options.optimized_model_filepath = tmp_file
+
+    predictor = ort.InferenceSession(
+        model_file, sess_options=options, providers=providers)
+    if tmp_file is not None and os.path.exists(tmp_file):
+        os.replace(tmp_file, cached_file)
+        print('Save optimized onnx model to {}'.format(cached_file))
+    return predictor
+
+
 def get_test_images(infer_dir, infer_img):
     """
     Get image path list in TEST mode
@@ -1015,24 +1500,39 @@ def main():
     elif arch == 'PicoDet':
         detector_func = 'DetectorPicoDet'
 
-    detector = eval(detector_func)(
-        FLAGS.model_dir,
-        device=FLAGS.device,
-        run_mode=FLAGS.run_mode,
-        batch_size=FLAGS.batch_size,
-        trt_min_shape=FLAGS.trt_min_shape,
-        trt_max_shape=FLAGS.trt_max_shape,
-        trt_opt_shape=FLAGS.trt_opt_shape,
-        trt_calib_mode=FLAGS.trt_calib_mode,
-        cpu_threads=FLAGS.cpu_threads,
-        enable_mkldnn=FLAGS.enable_mkldnn,
-        enable_mkldnn_bfloat16=FLAGS.enable_mkldnn_bfloat16,
-        threshold=FLAGS.threshold,
-        output_dir=FLAGS.output_dir)
+    if FLAGS.backend == 'onnxruntime':
+        detector = OnnxDetector(
+            FLAGS.model_dir,
+            onnx_file=FLAGS.onnx_file,
+            device=FLAGS.device,
+            batch_size=FLAGS.batch_size,
+            cpu_threads=FLAGS.cpu_threads,
+            inter_op_threads=FLAGS.ort_inter_op_threads,
+            graph_opt_level=FLAGS.ort_graph_opt_level,
+            optimized_model_dir=FLAGS.ort_optimized_model_dir,
+            use_iobinding=FLAGS.ort_iobinding,
+            threshold=FLAGS.threshold,
+            output_dir=FLAGS.output_dir)
+    else:
+        detector = eval(detector_func)(
+            FLAGS.model_dir,
+            device=FLAGS.device,
+            run_mode=FLAGS.run_mode,
+            batch_size=FLAGS.batch_size,
+            trt_min_shape=FLAGS.trt_min_shape,
+            trt_max_shape=FLAGS.trt_max_shape,
+            trt_opt_shape=FLAGS.trt_opt_shape,
+            trt_calib_mode=FLAGS.trt_calib_mode,
+            cpu_threads=FLAGS.cpu_threads,
+            enable_mkldnn=FLAGS.enable_mkldnn,
+            enable_mkldnn_bfloat16=FLAGS.enable_mkldnn_bfloat16,
+            threshold=FLAGS.threshold,
+            output_dir=FLAGS.output_dir)
 
     # predict from video file or camera video stream
     if FLAGS.video_file is not None or FLAGS.camera_id != -1:
-        detector.predict_video(FLAGS.video_file, FLAGS.camera_id)
+        detector.predict_video(
+            FLAGS.video_file, FLAGS.camera_id, visual=FLAGS.save_images)
     else:
         # predict from image
         if FLAGS.image_dir is None and FLAGS.image_file is not None:
@@ -1047,15 +1547,17 @@ def main():
                 FLAGS.match_threshold,
                 FLAGS.match_metric,
                 visual=FLAGS.save_images,
-                save_results=FLAGS.save_results)
+                save_results=FLAGS.save_results,
+                slice_batch_size=FLAGS.slice_batch_size)
         else:
             detector.predict_image(
                 img_list,
                 FLAGS.run_benchmark,
                 repeats=100,
                 visual=FLAGS.save_images,
-                save_results=FLAGS.save_results)
-        if not FLAGS.run_benchmark:
+                save_results=FLAGS.save_results,
+                pipeline_depth=FLAGS.pipeline_depth)
+        if not FLAGS.run_benchmark or FLAGS.backend == 'onnxruntime':
             detector.det_times.info(average=True)
         else:
             mode = FLAGS.run_mode
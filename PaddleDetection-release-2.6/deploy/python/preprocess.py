@@ -520,3 +520,134 @@ def preprocess(im, preprocess_ops):
     for operator in preprocess_ops:
         im, im_info = operator(im, im_info)
     return im, im_info
+
+
+class PreprocessPlan(object):
+    """preprocess a batch of images with operators built once
+    When the operators are Resize (keep_ratio=False), NormalizeImage and
+    Permute, each image is resized as uint8 and then normalized and permuted
+    in one pass by a lookup table of the 256 values of each channel, written
+    into a NCHW float32 batch buffer which can be reused across batches.
+    The lookup table is computed by NormalizeImage itself, so results are
+    identical to running the operators one by one. Other operator lists are
+    run one by one as `preprocess`.
+    Args:
+        preprocess_ops (list): operators built from the Preprocess of
+            infer_cfg.yml
+    """
+
+    def __init__(self, preprocess_ops):
+        self.preprocess_ops = preprocess_ops
+        self.fused = False
+        self._buffer = None
+        if len(preprocess_ops) == 3 and \
+                type(preprocess_ops[0]) is Resize and \
+                not preprocess_ops[0].keep_ratio and \
+                type(preprocess_ops[1]) is NormalizeImage and \
+                type(preprocess_ops[2]) is Permute:
+            self.resize = preprocess_ops[0]
+            self.target_size = tuple(int(s) for s in self.resize.target_size)
+            values = np.tile(
+                np.arange(
+                    256, dtype=np.uint8)[None, :, None], (1, 1, 3))
+            lut, _ = preprocess_ops[1](values, {})
+            # [3, 256], row c maps the values of channel c
+            self.lut = np.ascontiguousarray(lut[0].T, dtype=np.float32)
+            self.fused = True
+
+    def __call__(self, image_list, reuse_buffer=False):
+        """
+        Args:
+            image_list (list): image paths or RGB images (np.ndarray)
+            reuse_buffer (bool): write images into the buffer of the last
+                call, the returned inputs are only valid until the next call
+        Returns:
+            inputs (dict): input of model, same as create_inputs
+        """
+        if not self.fused:
+            return self._run_ops(image_list)
+
+        h, w = self.target_size
+        num = len(image_list)
+        buffer = self._buffer
+        if not reuse_buffer or buffer is None or len(buffer) < num:
+            buffer = np.empty((num, 3, h, w), dtype=np.float32)
+            if reuse_buffer:
+                self._buffer = buffer
+        images = buffer[:num]
+        im_shape = np.zeros((num, 2), dtype=np.float32)
+        scale_factor = np.zeros((num, 2), dtype=np.float32)
+        for i, im_file in enumerate(image_list):
+            # decoded images stay BGR, channels are swapped by the table
+            if isinstance(im_file, str):
+                with open(im_file, 'rb') as f:
+                    data = np.frombuffer(f.read(), dtype='uint8')
+                im = cv2.imdecode(data, 1)
+                channels = (2, 1, 0)
+            else:
+                im = im_file
+                channels = (0, 1, 2)
+            if im.dtype != np.uint8 or im.ndim != 3 or im.shape[2] != 3:
+                return self._run_ops(image_list)
+            im_info = {}
+            im, im_info = self.resize(im, im_info)
+            if im.shape[:2] != (h, w):
+                return self._run_ops(image_list)
+            for c in range(3):
+                np.take(self.lut[c], im[:, :, channels[c]], out=images[i, c])
+            im_shape[i] = im_info['im_shape']
+            scale_factor[i] = im_info['scale_factor']
+        return {
+            'image': images,
+            'im_shape': im_shape,
+            'scale_factor': scale_factor
+        }
+
+    def _run_ops(self, image_list):
+        imgs, im_infos = [], []
+        for im_file in image_list:
+            im, im_info = preprocess(im_file, self.preprocess_ops)
+            imgs.append(im)
+            im_infos.append(im_info)
+        return create_inputs(imgs, im_infos)
+
+
+def create_inputs(imgs, im_info):
+    """generate input for different model type
+    Args:
+        imgs (list(numpy)): list of images (np.ndarray)
+        im_info (list(dict)): list of image info
+    Returns:
+        inputs (dict): input of model
+    """
+    inputs = {}
+
+    im_shape = []
+    scale_factor = []
+    if len(imgs) == 1:
+        inputs['image'] = np.array((imgs[0], )).astype('float32')
+        inputs['im_shape'] = np.array(
+            (im_info[0]['im_shape'], )).astype('float32')
+        inputs['scale_factor'] = np.array(
+            (im_info[0]['scale_factor'], )).astype('float32')
+        return inputs
+
+    for e in im_info:
+        im_shape.append(np.array((e['im_shape'], )).astype('float32'))
+        scale_factor.append(np.array((e['scale_factor'], )).astype('float32'))
+
+    inputs['im_shape'] = np.concatenate(im_shape, axis=0)
+    inputs['scale_factor'] = np.concatenate(scale_factor, axis=0)
+
+    imgs_shape = [[e.shape[1], e.shape[2]] for e in imgs]
+    max_shape_h = max([e[0] for e in imgs_shape])
+    max_shape_w = max([e[1] for e in imgs_shape])
+    padding_imgs = []
+    for img in imgs:
+        im_c, im_h, im_w = img.shape[:]
+        padding_im = np.zeros(
+            (im_c, max_shape_h, max_shape_w), dtype=np.float32)
+        padding_im[:, :im_h, :im_w] = img
+        padding_imgs.append(padding_im)
+    inputs['image'] = np.stack(padding_imgs, axis=0)
+    return inputs
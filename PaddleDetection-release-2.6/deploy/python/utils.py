@@ -185,6 +185,12 @@ def argsparser():
         type=float,
         default=[0.25, 0.25],
         help="Overlap height ratio of the sliced image.")
+    parser.add_argument(
+        "--slice_batch_size",
+        type=int,
+        default=8,
+        help="Number of slices in each batch of slice_infer, slices of "
+        "different images are packed into the same batch.")
     parser.add_argument(
         "--combine_method",
         type=str,
@@ -201,6 +207,49 @@ def argsparser():
         type=str,
         default='ios',
         help="Combine method matching metric, choose in ['iou', 'ios'].")
+    parser.add_argument(
+        "--backend",
+        type=str,
+        default='paddle',
+        choices=['paddle', 'onnxruntime'],
+        help="Inference backend, onnxruntime runs the onnx model of "
+        "--onnx_file with the preprocess and postprocess of model_dir.")
+    parser.add_argument(
+        "--onnx_file",
+        type=str,
+        default=None,
+        help="Path of the onnx model, default is model.onnx in model_dir.")
+    parser.add_argument(
+        "--ort_inter_op_threads",
+        type=int,
+        default=1,
+        help="Inter-op threads of onnxruntime, intra-op threads are set by "
+        "--cpu_threads.")
+    parser.add_argument(
+        "--ort_graph_opt_level",
+        type=str,
+        default='all',
+        choices=['disable', 'basic', 'extended', 'all'],
+        help="Graph optimization level of onnxruntime.")
+    parser.add_argument(
+        "--ort_optimized_model_dir",
+        type=str,
+        default=None,
+        help="Directory to cache the onnx model optimized by onnxruntime, "
+        "None to optimize in every launch.")
+    parser.add_argument(
+        "--ort_iobinding",
+        type=ast.literal_eval,
+        default=True,
+        help="Whether to bind inputs and outputs of onnxruntime to "
+        "preallocated buffers.")
+    parser.add_argument(
+        "--pipeline_depth",
+        type=int,
+        default=0,
+        help="Number of batches preprocessed ahead by a thread pool while "
+        "the predictor runs, 0 to run preprocess, inference and postprocess "
+        "in sequence.")
     return parser
 
 
@@ -222,6 +271,10 @@ class Times(object):
         else:
             self.time = (self.et - self.st) / repeats
 
+    def add(self, cost):
+        # time measured elsewhere, e.g. by a worker thread
+        self.time += cost
+
     def reset(self):
         self.time = 0.
         self.st = 0.
@@ -240,6 +293,33 @@ class Timer(Times):
         self.postprocess_time_s = Times()
         self.tracking_time_s = Times()
         self.img_num = 0
+        # wall time and per-stage stats of predict_image_pipeline
+        self.pipeline_time_s = Times()
+        self.queue_stats = {}
+
+    def record_queue(self, stage, depth):
+        """
+        Record the number of batches ready in the input queue of `stage`.
+        """
+        stats = self.queue_stats.setdefault(stage, [0, 0, 0., 0])
+        stats[0] += depth
+        stats[1] += 1
+
+    def record_wait(self, stage, cost):
+        """
+        Record the time the predictor waited on the queue of `stage`.
+        """
+        stats = self.queue_stats.setdefault(stage, [0, 0, 0., 0])
+        stats[2] += cost
+        stats[3] = max(stats[3], cost)
+
+    def pipeline_report(self):
+        dic = {'pipeline_time_s': self.pipeline_time_s.value()}
+        for stage, (depth, num, wait, max_wait) in self.queue_stats.items():
+            dic[stage + '_queue_depth'] = round(depth / max(1, num), 2)
+            dic[stage + '_wait_s'] = round(wait / max(1, num), 4)
+            dic[stage + '_max_wait_s'] = round(max_wait, 4)
+        return dic
 
     def info(self, average=False):
         pre_time = self.preprocess_time_s.value()
@@ -279,6 +359,17 @@ class Timer(Times):
                 "preprocess_time(ms): {:.2f}, inference_time(ms): {:.2f}, postprocess_time(ms): {:.2f}".
                 format(preprocess_time * 1000, inference_time * 1000,
                        postprocess_time * 1000))
+        if self.queue_stats:
+            pipe_time = self.pipeline_time_s.value()
+            print("pipeline wall time(ms): {:.2f}, QPS: {:2f}".format(
+                pipe_time * 1000, self.img_num / pipe_time
+                if pipe_time > 0 else 0))
+            for stage, (depth, num, wait,
+                        max_wait) in self.queue_stats.items():
+                print("{} queue: average ready batches {:.2f}, predictor "
+                      "wait(ms) average {:.2f}, max {:.2f}".format(
+                          stage, depth / max(1, num), wait * 1000 / max(
+                              1, num), max_wait * 1000))
 
     def report(self, average=False):
         dic = {}
@@ -300,6 +391,8 @@ class Timer(Times):
                                            4) if average else track_time
             total_time = total_time + track_time
         dic['total_time_s'] = round(total_time, 4)
+        if self.queue_stats:
+            dic.update(self.pipeline_report())
         return dic
 
 
@@ -329,6 +422,38 @@ def get_current_memory_mb():
     return round(cpu_mem, 4), round(gpu_mem, 4), round(gpu_percent, 4)
 
 
+def slice_windows(height, width, slice_size=[640, 640],
+                  overlap_ratio=[0.25, 0.25]):
+    """ Windows to slice an image into, the same as get_slice_bboxes of sahi:
+        slices step by slice size minus overlap, windows crossing the border
+        are moved back inside the image, rows from top to bottom.
+        Args:
+            height, width: size of the image
+            slice_size: [height, width] of the slices
+            overlap_ratio: [height, width] overlap ratio of adjacent slices
+        Returns:
+            np.ndarray: shape [K, 4], int64 [x_min, y_min, x_max, y_max]
+    """
+
+    def _starts(size, slice_len, ratio):
+        step = slice_len - int(ratio * slice_len)
+        assert step > 0, "overlap_ratio should be less than 1"
+        num = 1 if slice_len >= size else 1 + -(-(size - slice_len) // step)
+        ends = np.arange(num, dtype=np.int64) * step + slice_len
+        ends = np.minimum(ends, size)
+        return np.maximum(ends - slice_len, 0), ends
+
+    y_min, y_max = _starts(height, slice_size[0], overlap_ratio[0])
+    x_min, x_max = _starts(width, slice_size[1], overlap_ratio[1])
+    num_y, num_x = len(y_min), len(x_min)
+    return np.stack(
+        [
+            np.tile(x_min, num_y), np.repeat(y_min, num_x),
+            np.tile(x_max, num_y), np.repeat(y_max, num_x)
+        ],
+        axis=1)
+
+
 def multiclass_nms(bboxs, num_classes, match_threshold=0.6, match_metric='iou'):
     final_boxes = []
     for c in range(num_classes):
@@ -339,6 +464,31 @@ def multiclass_nms(bboxs, num_classes, match_threshold=0.6, match_metric='iou'):
     return final_boxes
 
 
+def batched_nms(bboxs, num_classes, match_threshold=0.6, match_metric='iou'):
+    """ NMS of all classes in one pass, boxes of each class are shifted by
+        class id times the extent of all boxes so boxes of different classes
+        never overlap. Same as np.concatenate(multiclass_nms(...)) except
+        the rounding of shifted coordinates and the order of equal scores.
+        Args:
+            bboxs: shape [N, 6], [class, score, x1, y1, x2, y2]
+            num_classes: boxes of class out of [0, num_classes) are dropped
+            match_metric: 'iou' or 'ios'
+            match_threshold: overlap thresh for match metric.
+    """
+    bboxs = bboxs[(bboxs[:, 0] >= 0) & (bboxs[:, 0] < num_classes)]
+    out_dtype = np.result_type(np.int64, bboxs.dtype)
+    if bboxs.shape[0] == 0:
+        return np.zeros((0, bboxs.shape[1]), dtype=out_dtype)
+    coords = bboxs[:, 2:]
+    extent = coords.max() - coords.min() + 2
+    shifted = bboxs[:, 1:].copy()
+    shifted[:, 1:] += (bboxs[:, :1] * extent).astype(bboxs.dtype)
+    keep = _nms_keep(shifted, match_threshold, match_metric)
+    # grouped by class as multiclass_nms
+    keep = keep[np.argsort(bboxs[keep, 0], kind='stable')]
+    return bboxs[keep].astype(out_dtype)
+
+
 def nms(dets, match_threshold=0.6, match_metric='iou'):
     """ Apply NMS to avoid detecting too many overlapping bounding boxes.
         Args:
@@ -348,50 +498,45 @@ def nms(dets, match_threshold=0.6, match_metric='iou'):
     """
     if dets.shape[0] == 0:
         return dets[[], :]
-    scores = dets[:, 0]
+    keep = _nms_keep(dets, match_threshold, match_metric)
+    dets = dets[keep, :]
+    return dets
+
+
+def _nms_keep(dets, match_threshold, match_metric):
+    """ Indices of dets kept by greedy NMS in ascending order. Each kept box
+        is matched with all remaining boxes at once, in the same precision
+        as the scalar loop (e.g. float32 boxes are matched in float64).
+    """
+    if match_metric not in ('iou', 'ios'):
+        raise ValueError()
     x1 = dets[:, 1]
     y1 = dets[:, 2]
     x2 = dets[:, 3]
     y2 = dets[:, 4]
     areas = (x2 - x1 + 1) * (y2 - y1 + 1)
-    order = scores.argsort()[::-1]
-
-    ndets = dets.shape[0]
-    suppressed = np.zeros((ndets), dtype=np.int32)
-
-    for _i in range(ndets):
-        i = order[_i]
-        if suppressed[i] == 1:
-            continue
-        ix1 = x1[i]
-        iy1 = y1[i]
-        ix2 = x2[i]
-        iy2 = y2[i]
-        iarea = areas[i]
-        for _j in range(_i + 1, ndets):
-            j = order[_j]
-            if suppressed[j] == 1:
-                continue
-            xx1 = max(ix1, x1[j])
-            yy1 = max(iy1, y1[j])
-            xx2 = min(ix2, x2[j])
-            yy2 = min(iy2, y2[j])
-            w = max(0.0, xx2 - xx1 + 1)
-            h = max(0.0, yy2 - yy1 + 1)
-            inter = w * h
+    order = dets[:, 0].argsort()[::-1]
+    dtype = np.asarray(dets.dtype.type(0) + 1).dtype
+
+    suppressed = np.zeros((dets.shape[0]), dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        while order.size > 1:
+            i, rest = order[0], order[1:]
+            w = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])
+                 ).astype(dtype) + 1
+            h = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])
+                 ).astype(dtype) + 1
+            inter = np.where(w > 0, w, 0.) * np.where(h > 0, h, 0.)
             if match_metric == 'iou':
-                union = iarea + areas[j] - inter
+                union = (areas[i] + areas[rest]).astype(dtype) - inter
                 match_value = inter / union
-            elif match_metric == 'ios':
-                smaller = min(iarea, areas[j])
-                match_value = inter / smaller
             else:
-                raise ValueError()
-            if match_value >= match_threshold:
-                suppressed[j] = 1
-    keep = np.where(suppressed == 0)[0]
-    dets = dets[keep, :]
-    return dets
+                smaller = np.minimum(areas[i], areas[rest]).astype(dtype)
+                match_value = inter / smaller
+            matched = match_value >= match_threshold
+            suppressed[rest[matched]] = True
+            order = rest[~matched]
+    return np.where(~suppressed)[0]
 
 
 coco_clsid2catid = {
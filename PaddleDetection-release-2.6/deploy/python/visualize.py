@@ -166,6 +166,50 @@ def draw_box(im, np_boxes, labels, threshold=0.5):
     return im
 
 
+def draw_box_cv2(im, np_boxes, labels, threshold=0.5):
+    """
+    Draw boxes on a BGR image read by cv2 in place, same as draw_box without
+    converting to and from PIL, used for video frames.
+    Args:
+        im (np.ndarray): BGR image, shape [H, W, 3]
+        np_boxes (np.ndarray): shape:[N,6], N: number of box,
+                               matix element:[class, score, x_min, y_min, x_max, y_max]
+        labels (list): labels:['class1', ..., 'classn']
+        threshold (float): threshold of box
+    Returns:
+        im (np.ndarray): visualized image
+    """
+    draw_thickness = max(min(im.shape[:2]) // 320, 1)
+    color_list = get_color_map_list(len(labels))
+    expect_boxes = (np_boxes[:, 1] > threshold) & (np_boxes[:, 0] > -1) & (
+        np_boxes[:, 0] < len(labels))
+    np_boxes = np_boxes[expect_boxes, :]
+
+    for dt in np_boxes:
+        clsid, bbox, score = int(dt[0]), dt[2:], dt[1]
+        # color map is rgb
+        color = tuple(int(c) for c in color_list[clsid][::-1])
+        if len(bbox) == 4:
+            xmin, ymin, xmax, ymax = [int(round(v)) for v in bbox]
+            cv2.rectangle(im, (xmin, ymin), (xmax, ymax), color,
+                          draw_thickness)
+        elif len(bbox) == 8:
+            pts = np.round(bbox).astype(np.int32).reshape(4, 2)
+            cv2.polylines(im, [pts], True, color, 2)
+            xmin, ymin = pts.min(axis=0)
+
+        # draw label
+        text = "{} {:.4f}".format(labels[clsid], score)
+        (tw, th), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX,
+                                             0.4, 1)
+        cv2.rectangle(im, (int(xmin) + 1, int(ymin) - th - baseline),
+                      (int(xmin) + tw + 1, int(ymin)), color, -1)
+        cv2.putText(im, text, (int(xmin) + 1, int(ymin) - baseline),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1,
+                    cv2.LINE_AA)
+    return im
+
+
 def draw_segm(im,
               np_segms,
               np_label,
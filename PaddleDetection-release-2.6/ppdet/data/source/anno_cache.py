@@ -0,0 +1,231 @@
+# Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import uuid
+import hashlib
+import numpy as np
+
+from ppdet.utils.logger import setup_logger
+logger = setup_logger(__name__)
+
+__all__ = ['VOCAnnoCache']
+
+CACHE_VERSION = 2
+
+# column files of one cache generation, all indexed by `offsets`
+_COLUMNS = ('offsets', 'stat', 'info', 'size', 'gt_bbox', 'gt_class',
+            'difficult')
+
+
+class VOCAnnoCache(object):
+    """
+    Persistent cache of parsed PascalVOC annotations.
+
+    The parsed records of one annotation list are stored as columnar numpy
+    arrays: `offsets` [N + 1] indexes the concatenated `gt_bbox` [M, 4],
+    `gt_class` [M] and `difficult` [M] arrays, and per-file `stat`
+    (mtime_ns, size), `info` (has_id, im_id, num_objs) and `size` (w, h)
+    arrays. The few per-file 'warnings' of invalid bboxes are kept in the
+    index json. Arrays are loaded with mmap, so a warm launch only stats the
+    xml files, and an xml whose mtime or size changed is parsed again
+    while all the others are served from the cache.
+
+    Args:
+        cache_dir (str): directory to store the cache files.
+        anno_path (str): the annotation list file, part of the cache key.
+        cname2cid (dict): mapping from category name to class id, part of
+            the cache key.
+    """
+
+    def __init__(self, cache_dir, anno_path, cname2cid):
+        self.cache_dir = cache_dir
+        key = json.dumps([
+            CACHE_VERSION,
+            os.path.abspath(anno_path),
+            sorted(cname2cid.items())
+        ])
+        self.name = 'voc_{}'.format(
+            hashlib.md5(key.encode('utf-8')).hexdigest()[:16])
+        self.index_file = os.path.join(cache_dir, self.name + '.json')
+
+        self._files = {}
+        self._warnings = {}
+        self._cols = None
+        self._token = None
+        self._new = {}
+        self._dirty = False
+        self._hits = 0
+        self._load()
+
+    def _column_file(self, token, col):
+        return os.path.join(self.cache_dir,
+                            '{}.{}.{}.npy'.format(self.name, token, col))
+
+    def _load(self):
+        if not os.path.isfile(self.index_file):
+            return
+        try:
+            with open(self.index_file, 'r') as f:
+                index = json.load(f)
+            if index.get('version') != CACHE_VERSION:
+                return
+            cols = {
+                col: np.load(self._column_file(index['token'], col),
+                             mmap_mode='r')
+                for col in _COLUMNS
+            }
+            files = index['files']
+            if len(cols['offsets']) != len(files) + 1 or \
+                    len(cols['gt_bbox']) != cols['offsets'][-1]:
+                raise ValueError('inconsistent column length')
+        except Exception as e:
+            logger.warning('Failed to load annotation cache {}: {}, it will '
+                           'be rebuilt.'.format(self.index_file, e))
+            return
+        self._cols = cols
+        self._files = {f: i for i, f in enumerate(files)}
+        self._warnings = {
+            files[int(i)]: msgs
+            for i, msgs in index.get('warnings', {}).items()
+        }
+        self._token = index['token']
+
+    def _match(self, idx, xml_stat):
+        mtime_ns, size = self._cols['stat'][idx]
+        return mtime_ns == xml_stat.st_mtime_ns and size == xml_stat.st_size
+
+    def _cached(self, idx, xml_file):
+        cols = self._cols
+        has_id, im_id, num_objs = cols['info'][idx]
+        st, ed = cols['offsets'][idx], cols['offsets'][idx + 1]
+        return {
+            'im_id': int(im_id) if has_id else None,
+            'w': float(cols['size'][idx, 0]),
+            'h': float(cols['size'][idx, 1]),
+            'num_objs': int(num_objs),
+            'gt_bbox': np.array(cols['gt_bbox'][st:ed]),
+            'gt_class': np.array(cols['gt_class'][st:ed]).reshape(-1, 1),
+            'difficult': np.array(cols['difficult'][st:ed]).reshape(-1, 1),
+            'warnings': list(self._warnings.get(xml_file, []))
+        }
+
+    def get(self, xml_file, xml_stat):
+        """
+        Return the cached record of `xml_file`, or None if it is not cached
+        or `xml_stat` (result of os.stat) does not match the cached one.
+        """
+        idx = self._files.get(xml_file)
+        if idx is None or not self._match(idx, xml_stat):
+            return None
+        self._hits += 1
+        return self._cached(idx, xml_file)
+
+    def put(self, xml_file, xml_stat, anno):
+        """
+        Record `anno` of `xml_file` for the next flush. Every file visited in
+        this launch must be put, cached or not.
+        """
+        self._new[xml_file] = (xml_stat.st_mtime_ns, xml_stat.st_size, anno)
+        idx = self._files.get(xml_file)
+        if idx is None or not self._match(idx, xml_stat):
+            self._dirty = True
+
+    def flush(self):
+        """
+        Write a new cache generation if any file was parsed in this launch.
+        Cached files not visited (e.g. with `sample_num`) are carried over.
+        """
+        logger.debug('annotation cache {}: {} hits, {} parsed'.format(
+            self.name, self._hits,
+            len(self._new) - self._hits))
+        if not self._dirty:
+            self._new = {}
+            return
+
+        entries = list(self._new.items())
+        for xml_file, idx in self._files.items():
+            if xml_file not in self._new:
+                mtime_ns, size = self._cols['stat'][idx]
+                entries.append((xml_file, (mtime_ns, size,
+                                           self._cached(idx, xml_file))))
+
+        num = len(entries)
+        num_box = sum(len(e[2]['gt_bbox']) for _, e in entries)
+        cols = {
+            'offsets': np.zeros((num + 1, ), dtype=np.int64),
+            'stat': np.zeros((num, 2), dtype=np.int64),
+            'info': np.zeros((num, 3), dtype=np.int64),
+            'size': np.zeros((num, 2), dtype=np.float64),
+            'gt_bbox': np.zeros((num_box, 4), dtype=np.float32),
+            'gt_class': np.zeros((num_box, ), dtype=np.int32),
+            'difficult': np.zeros((num_box, ), dtype=np.int32)
+        }
+        st = 0
+        for i, (_, (mtime_ns, size, anno)) in enumerate(entries):
+            ed = st + len(anno['gt_bbox'])
+            cols['offsets'][i + 1] = ed
+            cols['stat'][i] = [mtime_ns, size]
+            cols['info'][i] = [
+                anno['im_id'] is not None, anno['im_id'] or 0, anno['num_objs']
+            ]
+            cols['size'][i] = [anno['w'], anno['h']]
+            cols['gt_bbox'][st:ed] = anno['gt_bbox']
+            cols['gt_class'][st:ed] = anno['gt_class'].reshape(-1)
+            cols['difficult'][st:ed] = anno['difficult'].reshape(-1)
+            st = ed
+
+        warnings = {
+            str(i): anno['warnings']
+            for i, (_, (_, _, anno)) in enumerate(entries)
+            if anno.get('warnings')
+        }
+        try:
+            self._write(cols, [xml_file for xml_file, _ in entries], warnings)
+        except Exception as e:
+            logger.warning('Failed to write annotation cache {}: {}'.format(
+                self.index_file, e))
+        self._new = {}
+
+    def _write(self, cols, files, warnings):
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir, exist_ok=True)
+        # columns are written under a fresh token and the index is replaced
+        # atomically last, so concurrent readers (e.g. the other rank) always
+        # see a complete generation
+        token = uuid.uuid4().hex[:8]
+        for col in _COLUMNS:
+            np.save(self._column_file(token, col), cols[col])
+        tmp_file = '{}.{}.tmp'.format(self.index_file, token)
+        with open(tmp_file, 'w') as f:
+            json.dump({
+                'version': CACHE_VERSION,
+                'token': token,
+                'files': files,
+                'warnings': warnings
+            }, f)
+        os.replace(tmp_file, self.index_file)
+
+        # only remove the generation this launch loaded, the others may have
+        # just been published by a concurrent rebuild
+        if self._token is not None:
+            for col in _COLUMNS:
+                try:
+                    os.remove(self._column_file(self._token, col))
+                except OSError:
+                    pass
+        self._token = token
+        logger.info('Saved annotation cache of {} files to {}'.format(
+            len(files), self.index_file))
@@ -0,0 +1,68 @@
+# Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Parallel annotation reader shared by VOCDataSet, tools/x2coco.py and
+Scripts/voc_viewer/server.py.
+
+Only the standard library is used here, the standalone scripts load this
+file by path without importing ppdet (and paddle).
+"""
+
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+__all__ = ['parallel_map']
+
+# below this number of files the process pool costs more than it saves
+MIN_PARALLEL_ITEMS = 64
+MAX_CHUNKSIZE = 64
+
+
+def parallel_map(func, items, num_workers=None, chunksize=None):
+    """
+    Yield `func(item)` for each item of `items` in order, computed by a
+    process pool. Exceptions raised by `func` are re-raised when the
+    corresponding result is reached, same as a serial loop.
+
+    Args:
+        func (callable): picklable function, e.g. a module level function
+            or a functools.partial of one.
+        items (list): arguments of `func`.
+        num_workers (int|None): number of processes, None means the number
+            of cpu cores, 0 or 1 runs `func` in this process.
+        chunksize (int|None): number of items sent to a worker at a time,
+            None to derive it from the number of items and workers.
+    """
+    items = list(items)
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    num_workers = min(num_workers, len(items))
+    if num_workers <= 1 or len(items) < MIN_PARALLEL_ITEMS:
+        for item in items:
+            yield func(item)
+        return
+
+    if chunksize is None:
+        chunksize = max(1, min(MAX_CHUNKSIZE, len(items) // (num_workers * 4)))
+    executor = ProcessPoolExecutor(max_workers=num_workers)
+    try:
+        for result in executor.map(func, items, chunksize=chunksize):
+            yield result
+    finally:
+        # drop the pending chunks if the consumer stops early
+        if sys.version_info >= (3, 9):
+            executor.shutdown(cancel_futures=True)
+        else:
+            executor.shutdown()
@@ -20,7 +20,7 @@ except Exception:
     from collections import Sequence
 import numpy as np
 from ppdet.core.workspace import register, serializable
-from .dataset import DetDataset
+from .dataset import DetDataset, slice_windows, slice_records
 
 from ppdet.utils.logger import setup_logger
 logger = setup_logger(__name__)
@@ -304,17 +304,6 @@ class SlicedCOCODataSet(COCODataSet):
             self.load_image_only = True
             logger.warning('Annotation file: {} does not contains ground truth '
                            'and load image information only.'.format(anno_path))
-        try:
-            import sahi
-            from sahi.slicing import slice_image
-        except Exception as e:
-            logger.error(
-                'sahi not found, plaese install sahi. '
-                'for example: `pip install sahi`, see https://github.com/obss/sahi.'
-            )
-            raise e
-
-        sub_img_ids = 0
         for img_id in img_ids:
             img_anno = coco.loadImgs([img_id])[0]
             im_fname = img_anno['file_name']
@@ -335,29 +324,12 @@ class SlicedCOCODataSet(COCODataSet):
                                    im_w, im_h, img_id))
                 continue
 
-            slice_image_result = sahi.slicing.slice_image(
-                image=im_path,
-                slice_height=self.sliced_size[0],
-                slice_width=self.sliced_size[1],
-                overlap_height_ratio=self.overlap_ratio[0],
-                overlap_width_ratio=self.overlap_ratio[1])
-
-            sub_img_num = len(slice_image_result)
-            for _ind in range(sub_img_num):
-                im = slice_image_result.images[_ind]
-                coco_rec = {
-                    'image': im,
-                    'im_id': np.array([sub_img_ids + _ind]),
-                    'h': im.shape[0],
-                    'w': im.shape[1],
-                    'ori_im_id': np.array([img_id]),
-                    'st_pix': np.array(
-                        slice_image_result.starting_pixels[_ind],
-                        dtype=np.float32),
-                    'is_last': 1 if _ind == sub_img_num - 1 else 0,
-                } if 'image' in self.data_fields else {}
-                records.append(coco_rec)
-            ct_sub += sub_img_num
+            windows = slice_windows(
+                int(im_h), int(im_w), self.sliced_size, self.overlap_ratio)
+            if 'image' in self.data_fields:
+                records.extend(
+                    slice_records(windows, im_path, img_id, len(records)))
+            ct_sub += len(windows)
             ct += 1
             if self.sample_num > 0 and ct >= self.sample_num:
                 break
@@ -14,6 +14,7 @@
 
 import os
 import copy
+import cv2
 import numpy as np
 try:
     from collections.abc import Sequence
@@ -23,6 +24,7 @@ from paddle.io import Dataset
 from ppdet.core.workspace import register, serializable
 from ppdet.utils.download import get_dataset_path
 from ppdet.data import source
+from .roidb_store import RoidbStore
 
 from ppdet.utils.logger import setup_logger
 logger = setup_logger(__name__)
@@ -74,24 +76,23 @@ class DetDataset(Dataset):
         if self.repeat > 1:
             idx %= n
         # data batch
-        roidb = copy.deepcopy(self.roidbs[idx])
+        roidb = self._get_roidb(idx)
         if self.mixup_epoch == 0 or self._epoch < self.mixup_epoch:
             idx = np.random.randint(n)
-            roidb = [roidb, copy.deepcopy(self.roidbs[idx])]
+            roidb = [roidb, self._get_roidb(idx)]
         elif self.cutmix_epoch == 0 or self._epoch < self.cutmix_epoch:
             idx = np.random.randint(n)
-            roidb = [roidb, copy.deepcopy(self.roidbs[idx])]
+            roidb = [roidb, self._get_roidb(idx)]
         elif self.mosaic_epoch == 0 or self._epoch < self.mosaic_epoch:
             roidb = [roidb, ] + [
-                copy.deepcopy(self.roidbs[np.random.randint(n)])
-                for _ in range(4)
+                self._get_roidb(np.random.randint(n)) for _ in range(4)
             ]
         elif self.pre_img_epoch == 0 or self._epoch < self.pre_img_epoch:
             # Add previous image as input, only used in CenterTrack
             idx_pre_img = idx - 1
             if idx_pre_img < 0:
                 idx_pre_img = idx + 1
-            roidb = [roidb, ] + [copy.deepcopy(self.roidbs[idx_pre_img])]
+            roidb = [roidb, ] + [self._get_roidb(idx_pre_img)]
         if isinstance(roidb, Sequence):
             for r in roidb:
                 r['curr_iter'] = self._curr_iter
@@ -101,6 +102,36 @@ class DetDataset(Dataset):
 
         return self.transform(roidb)
 
+    def _get_roidb(self, idx):
+        # RoidbStore builds a new record of views, copying only the fields
+        # transforms update in place
+        if isinstance(self.roidbs, RoidbStore):
+            roidb = self.roidbs[idx]
+        else:
+            roidb = copy.deepcopy(self.roidbs[idx])
+        if 'slice_window' in roidb:
+            roidb = self._load_slice(roidb)
+        return roidb
+
+    def _load_slice(self, roidb):
+        """
+        Crop the slice of a record made by slice_windows from its image. The
+        last decoded image is kept, so consecutive slices of one image (e.g.
+        in a batch) decode it only once.
+        """
+        im_file = roidb.pop('im_file')
+        cached = getattr(self, '_slice_image', None)
+        if cached is None or cached[0] != im_file:
+            with open(im_file, 'rb') as f:
+                data = np.frombuffer(f.read(), dtype='uint8')
+            # rgb as Decode, which passes the decoded slice through
+            im = cv2.cvtColor(cv2.imdecode(data, 1), cv2.COLOR_BGR2RGB)
+            cached = (im_file, im)
+            self._slice_image = cached
+        x0, y0, x1, y1 = roidb.pop('slice_window')
+        roidb['image'] = np.ascontiguousarray(cached[1][y0:y1, x0:x1])
+        return roidb
+
     def check_or_download_dataset(self):
         self.dataset_dir = get_dataset_path(self.dataset_dir, self.anno_path,
                                             self.image_dir)
@@ -127,6 +158,77 @@ class DetDataset(Dataset):
         return os.path.join(self.dataset_dir, self.anno_path)
 
 
+def slice_windows(height, width, slice_size=[640, 640],
+                  overlap_ratio=[0.25, 0.25]):
+    """
+    Windows to slice an image into, the same as get_slice_bboxes of sahi:
+    slices step by slice size minus overlap, windows crossing the border are
+    moved back inside the image, rows from top to bottom.
+
+    Args:
+        height (int): height of the image.
+        width (int): width of the image.
+        slice_size (list): [height, width] of the slices.
+        overlap_ratio (list): [height, width] overlap ratio of adjacent
+            slices.
+
+    Returns:
+        np.ndarray: windows [K, 4] of int64 x_min, y_min, x_max, y_max.
+    """
+
+    def _starts(size, slice_len, ratio):
+        step = slice_len - int(ratio * slice_len)
+        assert step > 0, "overlap_ratio should be less than 1"
+        num = 1 if slice_len >= size else 1 + -(-(size - slice_len) // step)
+        ends = np.arange(num, dtype=np.int64) * step + slice_len
+        ends = np.minimum(ends, size)
+        return np.maximum(ends - slice_len, 0), ends
+
+    y_min, y_max = _starts(height, slice_size[0], overlap_ratio[0])
+    x_min, x_max = _starts(width, slice_size[1], overlap_ratio[1])
+    num_y, num_x = len(y_min), len(x_min)
+    return np.stack(
+        [
+            np.tile(x_min, num_y), np.repeat(y_min, num_x),
+            np.tile(x_max, num_y), np.repeat(y_max, num_x)
+        ],
+        axis=1)
+
+
+def slice_records(windows, im_file, ori_im_id, start_id):
+    """
+    Records of the slices of one image, the pixels are cropped when a
+    record is loaded, so only images being read are held in memory.
+    """
+    records = []
+    for i, window in enumerate(windows):
+        records.append({
+            'im_file': im_file,
+            'slice_window': window,
+            'im_id': np.array([start_id + i]),
+            'h': int(window[3] - window[1]),
+            'w': int(window[2] - window[0]),
+            'ori_im_id': np.array([ori_im_id]),
+            'st_pix': window[:2].astype(np.float32),
+            'is_last': 1 if i == len(windows) - 1 else 0,
+        })
+    return records
+
+
+def _image_size(im_file):
+    """
+    Return (height, width) of an image as decoded by cv2, which applies the
+    EXIF orientation, without decoding the pixels.
+    """
+    from PIL import Image
+    with Image.open(im_file) as im:
+        width, height = im.size
+        # orientations 5 to 8 rotate the image by 90 degrees
+        if im.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+            width, height = height, width
+    return height, width
+
+
 def _is_valid_file(f, extensions=('.jpg', '.jpeg', '.png', '.bmp')):
     return f.lower().endswith(extensions)
 
@@ -221,48 +323,20 @@ class ImageFolder(DetDataset):
                          overlap_ratio=[0.25, 0.25]):
         self.image_dir = images
         ori_records = self._load_images()
-        try:
-            import sahi
-            from sahi.slicing import slice_image
-        except Exception as e:
-            logger.error(
-                'sahi not found, plaese install sahi. '
-                'for example: `pip install sahi`, see https://github.com/obss/sahi.'
-            )
-            raise e
-
-        sub_img_ids = 0
+
         ct = 0
-        ct_sub = 0
         records = []
         for i, ori_rec in enumerate(ori_records):
             im_path = ori_rec['im_file']
-            slice_image_result = sahi.slicing.slice_image(
-                image=im_path,
-                slice_height=slice_size[0],
-                slice_width=slice_size[1],
-                overlap_height_ratio=overlap_ratio[0],
-                overlap_width_ratio=overlap_ratio[1])
-
-            sub_img_num = len(slice_image_result)
-            for _ind in range(sub_img_num):
-                im = slice_image_result.images[_ind]
-                rec = {
-                    'image': im,
-                    'im_id': np.array([sub_img_ids + _ind]),
-                    'h': im.shape[0],
-                    'w': im.shape[1],
-                    'ori_im_id': np.array([ori_rec['im_id'][0]]),
-                    'st_pix': np.array(
-                        slice_image_result.starting_pixels[_ind],
-                        dtype=np.float32),
-                    'is_last': 1 if _ind == sub_img_num - 1 else 0,
-                } if 'image' in self.data_fields else {}
-                records.append(rec)
-            ct_sub += sub_img_num
+            height, width = _image_size(im_path)
+            windows = slice_windows(height, width, slice_size, overlap_ratio)
+            if 'image' in self.data_fields:
+                records.extend(
+                    slice_records(windows, im_path, ori_rec['im_id'][0],
+                                  len(records)))
             ct += 1
-        logger.info('{} samples and slice to {} sub_samples.'.format(ct,
-                                                                     ct_sub))
+        logger.info('{} samples and slice to {} sub_samples.'.format(
+            ct, len(records)))
         self.roidbs = records
 
     def get_label_list(self):
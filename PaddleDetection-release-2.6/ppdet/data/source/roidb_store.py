@@ -0,0 +1,153 @@
+# Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+try:
+    from collections.abc import Sequence
+except Exception:
+    from collections import Sequence
+
+from ppdet.utils.logger import setup_logger
+logger = setup_logger(__name__)
+
+__all__ = ['RoidbStore']
+
+# fields updated in place by ppdet transforms (e.g. RandomFlip, Resize)
+DEFAULT_COPY_FIELDS = ('gt_bbox', )
+
+
+class RoidbStore(Sequence):
+    """
+    Struct-of-arrays storage of roidb records.
+
+    Every field is one numpy column: arrays of all records are concatenated
+    along the first axis and indexed by per-field offsets, and scalars
+    (str, int, float, bool) are stored as a 1-D array. Indexing builds a new
+    record dict whose arrays are read-only views of the columns, only the
+    fields in `copy_fields` are copied, as transforms update them in place.
+    Writing to any other view raises an error instead of corrupting the
+    store, add such fields to `copy_fields`.
+
+    Compared with a list of dicts, this needs no deepcopy per sample, and
+    forked DataLoader workers do not touch (and duplicate) the pages of
+    millions of small python objects.
+
+    Args:
+        columns (dict): field name to column array.
+        offsets (dict): field name to offsets array [N + 1] of array fields.
+        num (int): number of records N.
+        copy_fields (list|tuple): fields copied when a record is indexed.
+    """
+
+    def __init__(self, columns, offsets, num, copy_fields=DEFAULT_COPY_FIELDS):
+        self._columns = columns
+        self._offsets = offsets
+        self._len = num
+        self.copy_fields = set(copy_fields)
+        for col in columns.values():
+            col.flags.writeable = False
+
+    @classmethod
+    def from_records(cls, records, copy_fields=DEFAULT_COPY_FIELDS):
+        """
+        Pack a list of record dicts, all records must have the same fields.
+        Return `records` unchanged if a field can not be stored as a column,
+        e.g. polygons of segmentation.
+        """
+        if len(records) == 0:
+            return records
+        keys = list(records[0].keys())
+        columns, offsets = {}, {}
+        for k in keys:
+            try:
+                values = [rec[k] for rec in records]
+            except KeyError:
+                logger.debug('field {} is missing in some records, keep '
+                             'roidbs as list'.format(k))
+                return records
+            packed = _pack_column(values)
+            if packed is None:
+                logger.debug('field {} can not be packed, keep roidbs as '
+                             'list'.format(k))
+                return records
+            columns[k], offsets[k] = packed
+            if offsets[k] is None:
+                offsets.pop(k)
+        if any(len(rec) != len(keys) for rec in records):
+            return records
+
+        # fields of the same lengths (e.g. gt_bbox and gt_class) share offsets
+        shared = {}
+        for k, o in offsets.items():
+            offsets[k] = shared.setdefault(o.tobytes(), o)
+        return cls(columns, offsets, len(records), copy_fields)
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(self._len))]
+        if idx < 0:
+            idx += self._len
+        if idx < 0 or idx >= self._len:
+            raise IndexError('roidb index {} out of range'.format(idx))
+        rec = {}
+        for k, col in self._columns.items():
+            offsets = self._offsets.get(k)
+            if offsets is None:
+                rec[k] = col[idx].item()
+            elif k in self.copy_fields:
+                rec[k] = col[offsets[idx]:offsets[idx + 1]].copy()
+            else:
+                rec[k] = col[offsets[idx]:offsets[idx + 1]]
+        return rec
+
+    @property
+    def nbytes(self):
+        offsets = {id(o): o for o in self._offsets.values()}
+        return sum(a.nbytes for a in self._columns.values()) + sum(
+            o.nbytes for o in offsets.values())
+
+
+def _pack_column(values):
+    """
+    Return (column, offsets) of `values`, offsets is None for scalars, or
+    None if `values` can not be packed losslessly.
+    """
+    first = values[0]
+    if isinstance(first, np.ndarray):
+        if first.ndim == 0:
+            return None
+        dtype, shape = first.dtype, first.shape[1:]
+        for v in values:
+            if not isinstance(v, np.ndarray) or v.dtype != dtype or \
+                    v.shape[1:] != shape:
+                return None
+        offsets = np.zeros((len(values) + 1, ), dtype=np.int64)
+        offsets[1:] = np.cumsum([len(v) for v in values])
+        return np.concatenate(values, axis=0), offsets
+
+    # bool is checked before int as bool is a subclass of int
+    for typ in (bool, int, float, str):
+        if isinstance(first, typ):
+            break
+    else:
+        return None
+    if not all(type(v) is type(first) for v in values):
+        return None
+    column = np.array(values)
+    if column.ndim != 1 or (typ is int and column.dtype.kind != 'i'):
+        return None
+    return column, None
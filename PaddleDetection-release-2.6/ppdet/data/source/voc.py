@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import os
+import functools
 import numpy as np
 
 import xml.etree.ElementTree as ET
@@ -20,6 +21,9 @@ import xml.etree.ElementTree as ET
 from ppdet.core.workspace import register, serializable
 
 from .dataset import DetDataset
+from .anno_cache import VOCAnnoCache
+from .anno_reader import parallel_map
+from .roidb_store import RoidbStore
 
 from ppdet.utils.logger import setup_logger
 logger = setup_logger(__name__)
@@ -47,6 +51,15 @@ class VOCDataSet(DetDataset):
             record's, if empty_ratio is out of [0. ,1.), do not sample the 
             records and use all the empty entries. 1. as default
         repeat (int): repeat times for dataset, use in benchmark.
+        anno_cache_dir (str|None): directory of the parsed annotation cache,
+            relative paths are joined with `dataset_dir`. None as default,
+            which parses every xml file on each launch.
+        parse_workers (int|None): number of processes to parse xml files,
+            None means the number of cpu cores, 0 parses in this process.
+        compact_roidbs (bool): whether to pack the records into a columnar
+            RoidbStore, which avoids deepcopy of each sample and the memory
+            of per-record python objects in every DataLoader worker. False
+            as default.
     """
 
     def __init__(self,
@@ -58,7 +71,10 @@ class VOCDataSet(DetDataset):
                  label_list=None,
                  allow_empty=False,
                  empty_ratio=1.,
-                 repeat=1):
+                 repeat=1,
+                 anno_cache_dir=None,
+                 parse_workers=None,
+                 compact_roidbs=False):
         super(VOCDataSet, self).__init__(
             dataset_dir=dataset_dir,
             image_dir=image_dir,
@@ -69,6 +85,9 @@ class VOCDataSet(DetDataset):
         self.label_list = label_list
         self.allow_empty = allow_empty
         self.empty_ratio = empty_ratio
+        self.anno_cache_dir = anno_cache_dir
+        self.parse_workers = parse_workers
+        self.compact_roidbs = compact_roidbs
 
     def _sample_empty(self, records, num):
         # if empty_ratio is out of [0. ,1.), do not sample the records
@@ -103,111 +122,189 @@ class VOCDataSet(DetDataset):
         else:
             cname2cid = pascalvoc_label()
 
+        cache = None
+        if self.anno_cache_dir:
+            cache_dir = os.path.join(self.dataset_dir, self.anno_cache_dir)
+            cache = VOCAnnoCache(cache_dir, anno_path, cname2cid)
+
+        items = []
         with open(anno_path, 'r') as fr:
-            while True:
-                line = fr.readline()
-                if not line:
-                    break
+            for line in fr.readlines():
                 img_file, xml_file = [os.path.join(image_dir, x) \
                         for x in line.strip().split()[:2]]
+                items.append((img_file, xml_file))
+        valid = [
+            os.path.exists(img_file) and os.path.isfile(xml_file)
+            for img_file, xml_file in items
+        ]
+        annos = self._load_annos(
+            [xml_file for (_, xml_file), v in zip(items, valid) if v],
+            cname2cid, cache)
+
+        for (img_file, xml_file), is_valid in zip(items, valid):
+            if not is_valid:
                 if not os.path.exists(img_file):
                     logger.warning(
                         'Illegal image file: {}, and it will be ignored'.format(
                             img_file))
-                    continue
-                if not os.path.isfile(xml_file):
+                else:
                     logger.warning(
                         'Illegal xml file: {}, and it will be ignored'.format(
                             xml_file))
-                    continue
-                tree = ET.parse(xml_file)
-                if tree.find('id') is None:
-                    im_id = np.array([ct])
-                else:
-                    im_id = np.array([int(tree.find('id').text)])
+                continue
+            anno = next(annos)
+            for msg in anno.get('warnings', []):
+                logger.warning(msg)
 
-                objs = tree.findall('object')
-                im_w = float(tree.find('size').find('width').text)
-                im_h = float(tree.find('size').find('height').text)
-                if im_w < 0 or im_h < 0:
-                    logger.warning(
-                        'Illegal width: {} or height: {} in annotation, '
-                        'and {} will be ignored'.format(im_w, im_h, xml_file))
-                    continue
-
-                num_bbox, i = len(objs), 0
-                gt_bbox = np.zeros((num_bbox, 4), dtype=np.float32)
-                gt_class = np.zeros((num_bbox, 1), dtype=np.int32)
-                gt_score = np.zeros((num_bbox, 1), dtype=np.float32)
-                difficult = np.zeros((num_bbox, 1), dtype=np.int32)
-                for obj in objs:
-                    cname = obj.find('name').text
-
-                    # user dataset may not contain difficult field
-                    _difficult = obj.find('difficult')
-                    _difficult = int(
-                        _difficult.text) if _difficult is not None else 0
-
-                    x1 = float(obj.find('bndbox').find('xmin').text)
-                    y1 = float(obj.find('bndbox').find('ymin').text)
-                    x2 = float(obj.find('bndbox').find('xmax').text)
-                    y2 = float(obj.find('bndbox').find('ymax').text)
-                    x1 = max(0, x1)
-                    y1 = max(0, y1)
-                    x2 = min(im_w - 1, x2)
-                    y2 = min(im_h - 1, y2)
-                    if x2 > x1 and y2 > y1:
-                        gt_bbox[i, :] = [x1, y1, x2, y2]
-                        gt_class[i, 0] = cname2cid[cname]
-                        gt_score[i, 0] = 1.
-                        difficult[i, 0] = _difficult
-                        i += 1
-                    else:
-                        logger.warning(
-                            'Found an invalid bbox in annotations: xml_file: {}'
-                            ', x1: {}, y1: {}, x2: {}, y2: {}.'.format(
-                                xml_file, x1, y1, x2, y2))
-                gt_bbox = gt_bbox[:i, :]
-                gt_class = gt_class[:i, :]
-                gt_score = gt_score[:i, :]
-                difficult = difficult[:i, :]
-
-                voc_rec = {
-                    'im_file': img_file,
-                    'im_id': im_id,
-                    'h': im_h,
-                    'w': im_w
-                } if 'image' in self.data_fields else {}
-
-                gt_rec = {
-                    'gt_class': gt_class,
-                    'gt_score': gt_score,
-                    'gt_bbox': gt_bbox,
-                    'difficult': difficult
-                }
-                for k, v in gt_rec.items():
-                    if k in self.data_fields:
-                        voc_rec[k] = v
-
-                if len(objs) == 0:
-                    empty_records.append(voc_rec)
-                else:
-                    records.append(voc_rec)
+            if anno['im_id'] is None:
+                im_id = np.array([ct])
+            else:
+                im_id = np.array([anno['im_id']])
+            im_w, im_h = anno['w'], anno['h']
+            if im_w < 0 or im_h < 0:
+                logger.warning(
+                    'Illegal width: {} or height: {} in annotation, '
+                    'and {} will be ignored'.format(im_w, im_h, xml_file))
+                continue
+
+            gt_bbox = anno['gt_bbox']
+            gt_class = anno['gt_class']
+            gt_score = np.ones((len(gt_bbox), 1), dtype=np.float32)
+            difficult = anno['difficult']
 
-                ct += 1
-                if self.sample_num > 0 and ct >= self.sample_num:
-                    break
+            voc_rec = {
+                'im_file': img_file,
+                'im_id': im_id,
+                'h': im_h,
+                'w': im_w
+            } if 'image' in self.data_fields else {}
+
+            gt_rec = {
+                'gt_class': gt_class,
+                'gt_score': gt_score,
+                'gt_bbox': gt_bbox,
+                'difficult': difficult
+            }
+            for k, v in gt_rec.items():
+                if k in self.data_fields:
+                    voc_rec[k] = v
+
+            if anno['num_objs'] == 0:
+                empty_records.append(voc_rec)
+            else:
+                records.append(voc_rec)
+
+            ct += 1
+            if self.sample_num > 0 and ct >= self.sample_num:
+                break
+        if cache is not None:
+            cache.flush()
         assert ct > 0, 'not found any voc record in %s' % (self.anno_path)
         logger.debug('{} samples in file {}'.format(ct, anno_path))
         if self.allow_empty and len(empty_records) > 0:
             empty_records = self._sample_empty(empty_records, len(records))
             records += empty_records
+        if self.compact_roidbs:
+            records = RoidbStore.from_records(records)
         self.roidbs, self.cname2cid = records, cname2cid
 
+    def _load_annos(self, xml_files, cname2cid, cache=None):
+        """
+        Yield the parsed annotation of each file in `xml_files` in order,
+        served from `cache` if possible, the others are parsed in parallel.
+        """
+        if cache is not None:
+            xml_stats = [os.stat(xml_file) for xml_file in xml_files]
+            cached = [cache.get(f, st) for f, st in zip(xml_files, xml_stats)]
+        else:
+            cached = [None] * len(xml_files)
+        # records after `sample_num` are never consumed, parse lazily
+        num_workers = 0 if self.sample_num > 0 else self.parse_workers
+        parsed = parallel_map(
+            functools.partial(parse_voc_xml, cname2cid=cname2cid),
+            [f for f, anno in zip(xml_files, cached) if anno is None],
+            num_workers=num_workers)
+        for i, anno in enumerate(cached):
+            if anno is None:
+                anno = next(parsed)
+            if cache is not None:
+                cache.put(xml_files[i], xml_stats[i], anno)
+            yield anno
+
     def get_label_list(self):
         return os.path.join(self.dataset_dir, self.label_list)
 
 
+def parse_voc_xml(xml_file, cname2cid):
+    """
+    Parse one PascalVOC xml file.
+
+    Args:
+        xml_file (str): path of the xml annotation file.
+        cname2cid (dict): mapping from category name to class id.
+
+    Returns:
+        anno (dict): 'im_id' (int|None, the `id` field of the xml), 'w', 'h',
+            'num_objs' (number of objects in the xml, including invalid
+            ones), the valid 'gt_bbox' [N, 4], 'gt_class' [N, 1] and
+            'difficult' [N, 1] arrays, and 'warnings' of invalid bboxes,
+            returned instead of logged as this may run in a worker process.
+    """
+    tree = ET.parse(xml_file)
+    if tree.find('id') is None:
+        im_id = None
+    else:
+        im_id = int(tree.find('id').text)
+
+    objs = tree.findall('object')
+    im_w = float(tree.find('size').find('width').text)
+    im_h = float(tree.find('size').find('height').text)
+
+    num_bbox, i = len(objs), 0
+    warnings = []
+    gt_bbox = np.zeros((num_bbox, 4), dtype=np.float32)
+    gt_class = np.zeros((num_bbox, 1), dtype=np.int32)
+    difficult = np.zeros((num_bbox, 1), dtype=np.int32)
+    if im_w < 0 or im_h < 0:
+        # the whole record is dropped by the caller
+        objs = []
+    for obj in objs:
+        cname = obj.find('name').text
+
+        # user dataset may not contain difficult field
+        _difficult = obj.find('difficult')
+        _difficult = int(_difficult.text) if _difficult is not None else 0
+
+        x1 = float(obj.find('bndbox').find('xmin').text)
+        y1 = float(obj.find('bndbox').find('ymin').text)
+        x2 = float(obj.find('bndbox').find('xmax').text)
+        y2 = float(obj.find('bndbox').find('ymax').text)
+        x1 = max(0, x1)
+        y1 = max(0, y1)
+        x2 = min(im_w - 1, x2)
+        y2 = min(im_h - 1, y2)
+        if x2 > x1 and y2 > y1:
+            gt_bbox[i, :] = [x1, y1, x2, y2]
+            gt_class[i, 0] = cname2cid[cname]
+            difficult[i, 0] = _difficult
+            i += 1
+        else:
+            warnings.append(
+                'Found an invalid bbox in annotations: xml_file: {}'
+                ', x1: {}, y1: {}, x2: {}, y2: {}.'.format(xml_file, x1, y1,
+                                                           x2, y2))
+    return {
+        'im_id': im_id,
+        'w': im_w,
+        'h': im_h,
+        'num_objs': num_bbox,
+        'gt_bbox': gt_bbox[:i, :],
+        'gt_class': gt_class[:i, :],
+        'difficult': difficult[:i, :],
+        'warnings': warnings
+    }
+
+
 def pascalvoc_label():
     labels_map = {
         'aeroplane': 0,
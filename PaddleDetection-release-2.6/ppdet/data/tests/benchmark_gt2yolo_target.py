@@ -0,0 +1,81 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Micro-benchmark of Gt2YoloTarget against its reference loop, e.g.
+
+    python ppdet/data/tests/benchmark_gt2yolo_target.py --batch_size 16
+"""
+
+from __future__ import print_function
+import os, sys
+# add python path of PaddleDetection to sys.path
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import copy
+import time
+import argparse
+
+from ppdet.data.transform.batch_operators import Gt2YoloTarget
+from ppdet.data.tests.test_gt2yolo_target import (
+    ANCHORS, ANCHOR_MASKS, DOWNSAMPLE_RATIOS, make_samples)
+
+
+def timeit(func, batches, repeat):
+    costs = []
+    for _ in range(repeat):
+        inputs = copy.deepcopy(batches)
+        start = time.perf_counter()
+        for samples in inputs:
+            func(samples)
+        costs.append((time.perf_counter() - start) / len(batches))
+    return min(costs) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch_size', type=int, default=16)
+    parser.add_argument('--max_boxes', type=int, default=50)
+    parser.add_argument('--size', type=int, default=608)
+    parser.add_argument('--num_classes', type=int, default=2)
+    parser.add_argument('--iou_thresh', type=float, default=1.)
+    parser.add_argument('--num_batches', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    op = Gt2YoloTarget(
+        ANCHORS,
+        ANCHOR_MASKS,
+        DOWNSAMPLE_RATIOS,
+        num_classes=args.num_classes,
+        iou_thresh=args.iou_thresh)
+    batches = [
+        make_samples(
+            seed,
+            batch_size=args.batch_size,
+            max_boxes=args.max_boxes,
+            size=args.size,
+            num_classes=args.num_classes) for seed in range(args.num_batches)
+    ]
+    loop_ms = timeit(op._call_loop, batches, args.repeat)
+    vec_ms = timeit(op, batches, args.repeat)
+    print('Gt2YoloTarget bs={} size={} iou_thresh={}: loop {:.2f} ms/batch, '
+          'vectorized {:.2f} ms/batch, speedup {:.1f}x'.format(
+              args.batch_size, args.size, args.iou_thresh, loop_ms, vec_ms,
+              loop_ms / vec_ms))
+
+
+if __name__ == '__main__':
+    main()
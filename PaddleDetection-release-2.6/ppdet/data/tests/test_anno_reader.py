@@ -0,0 +1,100 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+import os, sys
+# add python path of PaddleDetection to sys.path
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from ppdet.data.source.anno_reader import parallel_map
+from ppdet.data.source.voc import VOCDataSet
+from ppdet.data.tests.test_voc_anno_cache import write_xml
+
+
+def square(x):
+    if x < 0:
+        raise ValueError('negative input {}'.format(x))
+    return x * x
+
+
+class TestParallelMap(unittest.TestCase):
+    def test_order(self):
+        items = list(range(200))
+        out = list(parallel_map(square, items, num_workers=4, chunksize=7))
+        self.assertEqual(out, [x * x for x in items])
+
+    def test_exception(self):
+        items = list(range(100)) + [-1]
+        with self.assertRaises(ValueError):
+            list(parallel_map(square, items, num_workers=4))
+
+
+class TestVOCParallelParse(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, 'images'))
+        os.makedirs(os.path.join(self.root, 'annotations'))
+        with open(os.path.join(self.root, 'label_list.txt'), 'w') as f:
+            f.write('mouse\nother\n')
+        lines = []
+        rng = np.random.RandomState(1)
+        for i in range(100):
+            name = 'mouse_{:05d}'.format(i)
+            open(os.path.join(self.root, 'images', name + '.jpg'), 'w').close()
+            objects = []
+            for _ in range(rng.randint(4)):
+                # some boxes fall outside of the image and are dropped
+                x1, y1 = rng.randint(0, 400, size=2)
+                objects.append((['mouse', 'other'][rng.randint(2)],
+                                rng.randint(2), x1, y1, x1 + 30, y1 + 30))
+            write_xml(
+                os.path.join(self.root, 'annotations', name + '.xml'), 320,
+                240, objects)
+            lines.append('images/{0}.jpg annotations/{0}.xml'.format(name))
+        with open(os.path.join(self.root, 'train.txt'), 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def load(self, parse_workers):
+        dataset = VOCDataSet(
+            dataset_dir=self.root,
+            anno_path='train.txt',
+            label_list='label_list.txt',
+            data_fields=['image', 'gt_bbox', 'gt_class', 'difficult'],
+            allow_empty=True,
+            parse_workers=parse_workers)
+        dataset.parse_dataset()
+        return dataset.roidbs
+
+    def test_parallel_parse(self):
+        expect = self.load(parse_workers=0)
+        roidbs = self.load(parse_workers=4)
+        self.assertEqual(len(roidbs), len(expect))
+        for rec, exp in zip(roidbs, expect):
+            self.assertEqual(sorted(rec.keys()), sorted(exp.keys()))
+            for k in exp:
+                np.testing.assert_array_equal(rec[k], exp[k])
+
+
+if __name__ == '__main__':
+    unittest.main()
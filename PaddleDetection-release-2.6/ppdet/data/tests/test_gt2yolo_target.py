@@ -0,0 +1,106 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+import os, sys
+# add python path of PaddleDetection to sys.path
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import copy
+import unittest
+import numpy as np
+
+from ppdet.data.transform.batch_operators import Gt2YoloTarget
+
+ANCHORS = [[10, 13], [16, 30], [33, 23], [30, 61], [62, 45], [59, 119],
+           [116, 90], [156, 198], [373, 326]]
+ANCHOR_MASKS = [[6, 7, 8], [3, 4, 5], [0, 1, 2]]
+DOWNSAMPLE_RATIOS = [32, 16, 8]
+
+
+def make_samples(seed,
+                 batch_size=8,
+                 max_boxes=50,
+                 size=320,
+                 num_classes=5,
+                 dtype=np.float32):
+    """
+    Random normalized xywh samples as output by NormalizeBox, BboxXYXY2XYWH
+    and PadBox, with boxes sharing a cell and zero padded boxes.
+    """
+    rng = np.random.RandomState(seed)
+    samples = []
+    for _ in range(batch_size):
+        num = rng.randint(0, max_boxes)
+        gt_bbox = rng.rand(num, 4).astype(dtype)
+        gt_bbox[:, 2:] *= 0.5
+        if num > 4:
+            gt_bbox[1] = gt_bbox[0]
+            gt_bbox[3, :2] = gt_bbox[2, :2]
+        if num > 8:
+            gt_bbox[-3:] = 0.
+        samples.append({
+            'image': np.zeros(
+                (3, size, size), dtype=np.float32),
+            'gt_bbox': gt_bbox,
+            'gt_class': rng.randint(0, num_classes, (num, 1)).astype(np.int32),
+            'gt_score': rng.choice([1., 0.5, 0.], (num, 1)).astype(np.float32)
+        })
+    return samples
+
+
+class TestGt2YoloTarget(unittest.TestCase):
+    def check(self, iou_thresh, samples):
+        op = Gt2YoloTarget(
+            ANCHORS,
+            ANCHOR_MASKS,
+            DOWNSAMPLE_RATIOS,
+            num_classes=5,
+            iou_thresh=iou_thresh)
+        expect = op._call_loop(copy.deepcopy(samples))
+        out = op(samples)
+        for e, o in zip(expect, out):
+            self.assertEqual(sorted(e.keys()), sorted(o.keys()))
+            for i in range(len(ANCHOR_MASKS)):
+                t_e, t_o = e['target{}'.format(i)], o['target{}'.format(i)]
+                self.assertEqual(t_e.dtype, t_o.dtype)
+                self.assertEqual(t_e.shape, t_o.shape)
+                # bit-exact
+                self.assertEqual(t_e.tobytes(), t_o.tobytes())
+
+    def test_best_anchor(self):
+        for seed in range(10):
+            self.check(1., make_samples(seed))
+
+    def test_iou_thresh(self):
+        for iou_thresh in [0.1, 0.25, 0.7]:
+            for seed in range(10):
+                self.check(iou_thresh, make_samples(seed))
+
+    def test_float64_and_no_score(self):
+        samples = make_samples(0, dtype=np.float64)
+        for sample in samples:
+            sample.pop('gt_score')
+        self.check(0.25, samples)
+
+    def test_mixed_dtype(self):
+        samples = make_samples(1, batch_size=2)
+        samples[1]['gt_bbox'] = samples[1]['gt_bbox'].astype(np.float64)
+        self.check(0.25, samples)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+import os, sys
+# add python path of PaddleDetection to sys.path
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import unittest
+import numpy as np
+
+from ppdet.data.source.dataset import DetDataset
+from ppdet.data.source.roidb_store import RoidbStore
+
+
+def make_records(num, seed=0):
+    rng = np.random.RandomState(seed)
+    records = []
+    for i in range(num):
+        n = rng.randint(0, 4)
+        records.append({
+            'im_file': 'images/mouse_{:05d}.jpg'.format(i),
+            'im_id': np.array([i]),
+            'h': 240.,
+            'w': 320.,
+            'gt_class': rng.randint(0, 2, (n, 1)).astype(np.int32),
+            'gt_score': np.ones((n, 1), dtype=np.float32),
+            'gt_bbox': rng.rand(n, 4).astype(np.float32) * 100,
+            'difficult': np.zeros((n, 1), dtype=np.int32)
+        })
+    return records
+
+
+class TestRoidbStore(unittest.TestCase):
+    def test_records(self):
+        records = make_records(20)
+        store = RoidbStore.from_records(records)
+        self.assertIsInstance(store, RoidbStore)
+        self.assertEqual(len(store), len(records))
+        for rec, exp in zip(store, records):
+            self.assertEqual(list(rec.keys()), list(exp.keys()))
+            for k, v in exp.items():
+                if isinstance(v, np.ndarray):
+                    self.assertEqual(rec[k].dtype, v.dtype)
+                    self.assertEqual(rec[k].shape, v.shape)
+                    np.testing.assert_array_equal(rec[k], v)
+                else:
+                    self.assertIs(type(rec[k]), type(v))
+                    self.assertEqual(rec[k], v)
+        self.assertEqual(store[-1]['im_file'], records[-1]['im_file'])
+
+    def test_copy_on_write(self):
+        store = RoidbStore.from_records(make_records(5, seed=1))
+        rec = store[1]
+        rec['gt_bbox'][:, 0] = -1.
+        self.assertTrue((store[1]['gt_bbox'][:, 0] >= 0).all())
+        with self.assertRaises(ValueError):
+            rec['gt_class'][:] = 0
+
+    def test_fallback(self):
+        records = make_records(3)
+        records[1]['gt_poly'] = [[[0., 0., 1., 1.]]]
+        self.assertIs(RoidbStore.from_records(records), records)
+
+    def test_dataset_getitem(self):
+        dataset = DetDataset()
+        dataset.roidbs = RoidbStore.from_records(make_records(10))
+        dataset.set_kwargs(mosaic_epoch=5)
+        dataset.set_transform(lambda x: x)
+        samples = dataset[3]
+        self.assertEqual(len(samples), 5)
+        self.assertEqual(samples[0]['im_file'], 'images/mouse_00003.jpg')
+        for sample in samples:
+            self.assertIn('curr_iter', sample)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+import os, sys
+# add python path of PaddleDetection to sys.path
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+import cv2
+import numpy as np
+
+from ppdet.data.transform.operators import Decode, DecodeShmCache, Resize
+from ppdet.data.transform.shm_cache import SharedImageCache, EMPTY
+
+
+def _put_in_child(cache, key, im):
+    cache.put(key, im)
+
+
+class TestSharedImageCache(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_get_put(self):
+        cache = SharedImageCache(self.root, max_bytes=1 << 20, max_entries=64)
+        im = np.random.randint(0, 255, (30, 40, 3)).astype(np.uint8)
+        key = cache.make_key('a.jpg', 1, 2)
+        self.assertIsNone(cache.get(key))
+        self.assertTrue(cache.put(key, im, (300, 400)))
+        out, meta = cache.get(key, return_meta=True)
+        np.testing.assert_array_equal(out, im)
+        self.assertEqual(meta, (300, 400))
+        # a new instance maps the same files
+        other = SharedImageCache(self.root, max_bytes=1 << 20, max_entries=64)
+        np.testing.assert_array_equal(other.get(key), im)
+
+    def test_lru_eviction(self):
+        im_bytes = 32 * 32 * 3
+        cache = SharedImageCache(
+            self.root, max_bytes=im_bytes * 3 + 128, max_entries=64)
+        ims = [
+            np.full((32, 32, 3), i, dtype=np.uint8) for i in range(4)
+        ]
+        for i in range(3):
+            cache.put(i, ims[i])
+        # touch image 0, so image 1 is the least recently used
+        cache.get(0)
+        cache.put(3, ims[3])
+        self.assertIsNone(cache.get(1))
+        for i in (0, 2, 3):
+            np.testing.assert_array_equal(cache.get(i), ims[i])
+        self.assertLessEqual(cache.stats()['bytes'], cache.max_bytes)
+
+    def test_churn_keeps_probes_short(self):
+        im_bytes = 32 * 32 * 3
+        cache = SharedImageCache(
+            self.root, max_bytes=im_bytes * 3 + 128, max_entries=64)
+        im = np.zeros((32, 32, 3), dtype=np.uint8)
+        # far more keys than fit, each put evicts an image
+        for key in range(2000):
+            self.assertTrue(cache.put(key, im))
+        np.testing.assert_array_equal(cache.get(1999), im)
+        self.assertEqual(cache.stats()['images'], 3)
+
+        def miss_probe_length(key):
+            for n, slot in enumerate(cache._probe(key)):
+                if cache._table[slot]['state'] == EMPTY:
+                    return n + 1
+            return cache.max_entries
+
+        lengths = [miss_probe_length(key) for key in range(5000, 5200)]
+        self.assertIsNone(cache.get(5000))
+        self.assertLess(max(lengths), cache.max_entries // 2)
+
+    def test_shared_across_processes(self):
+        cache = SharedImageCache(self.root, max_bytes=1 << 20, max_entries=64)
+        im = np.random.randint(0, 255, (20, 10, 3)).astype(np.uint8)
+        ctx = multiprocessing.get_context('spawn')
+        p = ctx.Process(target=_put_in_child, args=(cache, 7, im))
+        p.start()
+        p.join()
+        np.testing.assert_array_equal(cache.get(7), im)
+
+
+class TestDecodeShmCache(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.im_file = os.path.join(self.root, 'im.jpg')
+        im = np.random.randint(0, 255, (120, 160, 3)).astype(np.uint8)
+        cv2.imwrite(self.im_file, im)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def sample(self):
+        return {
+            'im_file': self.im_file,
+            'h': 120.,
+            'w': 160.,
+            'gt_bbox': np.array(
+                [[10., 20., 150., 110.]], dtype=np.float32)
+        }
+
+    def assert_same(self, expect, out):
+        self.assertEqual(sorted(expect.keys()), sorted(out.keys()))
+        for k, v in expect.items():
+            np.testing.assert_array_equal(out[k], v)
+            self.assertEqual(np.asarray(out[k]).dtype, np.asarray(v).dtype)
+
+    def test_decode(self):
+        expect = Decode()(self.sample())
+        op = DecodeShmCache(os.path.join(self.root, 'cache'), 1 << 20, 64)
+        for _ in range(2):
+            self.assert_same(expect, op(self.sample()))
+        self.assertEqual(op.cache.stats()['images'], 1)
+
+    def test_pre_resized(self):
+        resize = Resize(target_size=[64, 96], keep_ratio=True)
+        expect = resize(Decode()(self.sample()))
+        op = DecodeShmCache(
+            os.path.join(self.root, 'cache'),
+            1 << 20,
+            64,
+            target_size=[64, 96],
+            keep_ratio=True)
+        for _ in range(2):
+            self.assert_same(expect, op(self.sample()))
+        self.assertEqual(op.cache.stats()['bytes'], expect['image'].size)
+
+
+if __name__ == '__main__':
+    unittest.main()
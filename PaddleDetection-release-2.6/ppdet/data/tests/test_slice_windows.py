@@ -0,0 +1,121 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+import os, sys
+# add python path of PaddleDetection to sys.path
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import importlib.util
+import shutil
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+from ppdet.data.source.dataset import ImageFolder, slice_windows
+
+
+def sahi_slice_bboxes(image_height, image_width, slice_height, slice_width,
+                      overlap_height_ratio, overlap_width_ratio):
+    # get_slice_bboxes of sahi
+    slice_bboxes = []
+    y_max = y_min = 0
+    y_overlap = int(overlap_height_ratio * slice_height)
+    x_overlap = int(overlap_width_ratio * slice_width)
+    while y_max < image_height:
+        x_min = x_max = 0
+        y_max = y_min + slice_height
+        while x_max < image_width:
+            x_max = x_min + slice_width
+            if y_max > image_height or x_max > image_width:
+                xmax = min(image_width, x_max)
+                ymax = min(image_height, y_max)
+                xmin = max(0, xmax - slice_width)
+                ymin = max(0, ymax - slice_height)
+                slice_bboxes.append([xmin, ymin, xmax, ymax])
+            else:
+                slice_bboxes.append([x_min, y_min, x_max, y_max])
+            x_min = x_max - x_overlap
+        y_min = y_max - y_overlap
+    return slice_bboxes
+
+
+def load_deploy_utils():
+    path = os.path.join(parent_path, 'deploy', 'python', 'utils.py')
+    spec = importlib.util.spec_from_file_location('deploy_utils', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class TestSliceWindows(unittest.TestCase):
+    def test_same_as_sahi(self):
+        deploy_utils = load_deploy_utils()
+        rng = np.random.RandomState(0)
+        for _ in range(500):
+            h, w = rng.randint(1, 3000, 2)
+            sh, sw = rng.randint(1, 1000, 2)
+            oh, ow = rng.choice([0., 0.1, 0.25, 0.5, 0.75], 2)
+            expect = sahi_slice_bboxes(h, w, sh, sw, oh, ow)
+            windows = slice_windows(h, w, [sh, sw], [oh, ow])
+            self.assertEqual(windows.tolist(), expect)
+            self.assertEqual(
+                deploy_utils.slice_windows(h, w, [sh, sw], [oh, ow]).tolist(),
+                expect)
+
+    def test_small_image(self):
+        windows = slice_windows(100, 50, [640, 640], [0.25, 0.25])
+        self.assertEqual(windows.tolist(), [[0, 0, 50, 100]])
+
+
+class TestSliceImages(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        rng = np.random.RandomState(0)
+        self.images = []
+        for i, (h, w) in enumerate([(300, 500), (120, 90), (640, 200)]):
+            im = rng.randint(0, 255, (h, w, 3)).astype(np.uint8)
+            path = os.path.join(self.root, 'im_{}.png'.format(i))
+            cv2.imwrite(path, im)
+            self.images.append((path, im[:, :, ::-1]))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_records(self):
+        dataset = ImageFolder()
+        dataset.set_slice_images([p for p, _ in self.images], [128, 128],
+                                 [0.25, 0.25])
+        idx = 0
+        for ori_id, (_, rgb) in enumerate(self.images):
+            windows = slice_windows(rgb.shape[0], rgb.shape[1], [128, 128],
+                                    [0.25, 0.25])
+            for k, (x0, y0, x1, y1) in enumerate(windows):
+                rec = dataset._get_roidb(idx)
+                np.testing.assert_array_equal(rec['image'],
+                                              rgb[y0:y1, x0:x1])
+                self.assertEqual(rec['ori_im_id'][0], ori_id)
+                self.assertEqual(rec['st_pix'].tolist(), [x0, y0])
+                self.assertEqual(rec['is_last'], int(k == len(windows) - 1))
+                self.assertEqual((rec['h'], rec['w']), (y1 - y0, x1 - x0))
+                idx += 1
+        self.assertEqual(idx, len(dataset.roidbs))
+
+
+if __name__ == '__main__':
+    unittest.main()
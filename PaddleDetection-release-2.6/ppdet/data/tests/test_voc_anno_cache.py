@@ -0,0 +1,190 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+import os, sys
+# add python path of PaddleDetection to sys.path
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+import ppdet.data.source.voc as voc
+from ppdet.data.source.voc import VOCDataSet
+from ppdet.data.source.anno_cache import VOCAnnoCache
+
+XML_TEMPLATE = """<annotation>
+    <size><width>{w}</width><height>{h}</height><depth>3</depth></size>
+{objects}</annotation>
+"""
+
+OBJ_TEMPLATE = """    <object>
+        <name>{name}</name>
+        <difficult>{difficult}</difficult>
+        <bndbox><xmin>{x1}</xmin><ymin>{y1}</ymin><xmax>{x2}</xmax><ymax>{y2}</ymax></bndbox>
+    </object>
+"""
+
+
+def write_xml(path, w, h, objects):
+    objs = ''.join(
+        OBJ_TEMPLATE.format(
+            name=n, difficult=d, x1=x1, y1=y1, x2=x2, y2=y2)
+        for n, d, x1, y1, x2, y2 in objects)
+    with open(path, 'w') as f:
+        f.write(XML_TEMPLATE.format(w=w, h=h, objects=objs))
+
+
+class TestVOCAnnoCache(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, 'images'))
+        os.makedirs(os.path.join(self.root, 'annotations'))
+        with open(os.path.join(self.root, 'label_list.txt'), 'w') as f:
+            f.write('mouse\nother\n')
+        lines = []
+        rng = np.random.RandomState(0)
+        for i in range(6):
+            name = 'mouse_{:05d}'.format(i)
+            open(os.path.join(self.root, 'images', name + '.jpg'), 'w').close()
+            objects = []
+            for _ in range(i % 3):
+                x1, y1 = rng.randint(0, 100, size=2)
+                objects.append((['mouse', 'other'][rng.randint(2)],
+                                rng.randint(2), x1, y1, x1 + 50, y1 + 40))
+            write_xml(
+                os.path.join(self.root, 'annotations', name + '.xml'), 320,
+                240, objects)
+            lines.append('images/{0}.jpg annotations/{0}.xml'.format(name))
+        with open(os.path.join(self.root, 'train.txt'), 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+        self.parsed = []
+        self._parse_voc_xml = voc.parse_voc_xml
+
+        def counting_parse(xml_file, cname2cid):
+            self.parsed.append(os.path.basename(xml_file))
+            return self._parse_voc_xml(xml_file, cname2cid)
+
+        voc.parse_voc_xml = counting_parse
+
+    def tearDown(self):
+        voc.parse_voc_xml = self._parse_voc_xml
+        shutil.rmtree(self.root)
+
+    def load(self, anno_cache_dir='.anno_cache'):
+        dataset = VOCDataSet(
+            dataset_dir=self.root,
+            anno_path='train.txt',
+            label_list='label_list.txt',
+            data_fields=['image', 'gt_bbox', 'gt_class', 'difficult'],
+            allow_empty=True,
+            anno_cache_dir=anno_cache_dir)
+        dataset.parse_dataset()
+        return dataset.roidbs
+
+    def assert_roidbs_equal(self, roidbs, expect):
+        self.assertEqual(len(roidbs), len(expect))
+        for rec, exp in zip(roidbs, expect):
+            self.assertEqual(sorted(rec.keys()), sorted(exp.keys()))
+            for k in exp:
+                if isinstance(exp[k], np.ndarray):
+                    self.assertEqual(rec[k].dtype, exp[k].dtype)
+                    np.testing.assert_array_equal(rec[k], exp[k])
+                else:
+                    self.assertEqual(rec[k], exp[k])
+
+    def test_cache(self):
+        expect = self.load(anno_cache_dir=None)
+        self.assertEqual(len(self.parsed), 6)
+
+        self.parsed = []
+        self.assert_roidbs_equal(self.load(), expect)
+        self.assertEqual(len(self.parsed), 6)
+
+        # warm launch parses nothing
+        self.parsed = []
+        self.assert_roidbs_equal(self.load(), expect)
+        self.assertEqual(self.parsed, [])
+
+        # only the modified xml is parsed again
+        write_xml(
+            os.path.join(self.root, 'annotations', 'mouse_00003.xml'), 320,
+            240, [('other', 0, 10, 10, 60, 60), ('mouse', 1, 5, 5, 20, 30)])
+        self.parsed = []
+        roidbs = self.load()
+        self.assertEqual(self.parsed, ['mouse_00003.xml'])
+        self.parsed = []
+        self.assert_roidbs_equal(self.load(anno_cache_dir=None), roidbs)
+
+    def test_cached_warnings(self):
+        # one invalid bbox (x2 < x1) next to a valid one
+        write_xml(
+            os.path.join(self.root, 'annotations', 'mouse_00002.xml'), 320,
+            240, [('mouse', 0, 80, 10, 20, 60), ('other', 0, 5, 5, 20, 30)])
+        messages = []
+        warning = voc.logger.warning
+        voc.logger.warning = messages.append
+        try:
+            logged = []
+            for anno_cache_dir in (None, '.anno_cache', '.anno_cache'):
+                messages[:] = []
+                self.load(anno_cache_dir=anno_cache_dir)
+                logged.append(list(messages))
+        finally:
+            voc.logger.warning = warning
+        self.assertEqual(len(logged[0]), 1)
+        self.assertIn('mouse_00002.xml', logged[0][0])
+        # cold and warm cached launches log the same warnings
+        self.assertEqual(logged[1], logged[0])
+        self.assertEqual(logged[2], logged[0])
+
+    def test_concurrent_rebuild(self):
+        cache_dir = os.path.join(self.root, 'cache')
+        anno_path = os.path.join(self.root, 'train.txt')
+        cname2cid = {'mouse': 0, 'other': 1}
+        xml_file = os.path.join(self.root, 'annotations', 'mouse_00001.xml')
+        anno = voc.parse_voc_xml(xml_file, cname2cid)
+
+        def rebuild(cache):
+            write_xml(xml_file, 320, 240, [])
+            cache.put(xml_file, os.stat(xml_file), anno)
+            cache.flush()
+
+        rebuild(VOCAnnoCache(cache_dir, anno_path, cname2cid))
+        # two launches load the same generation and both rebuild it
+        cache_a = VOCAnnoCache(cache_dir, anno_path, cname2cid)
+        cache_b = VOCAnnoCache(cache_dir, anno_path, cname2cid)
+        rebuild(cache_b)
+        published = VOCAnnoCache(cache_dir, anno_path, cname2cid)._token
+        rebuild(cache_a)
+        # the generation of b is not removed by a
+        for col in ('offsets', 'gt_bbox'):
+            self.assertTrue(
+                os.path.isfile(cache_a._column_file(published, col)))
+        # the generation both loaded is removed
+        self.assertEqual(
+            len([f for f in os.listdir(cache_dir) if f.endswith('.npy')]),
+            14)
+        cache = VOCAnnoCache(cache_dir, anno_path, cname2cid)
+        self.assertEqual(cache._token, cache_a._token)
+        self.assertIsNotNone(cache.get(xml_file, os.stat(xml_file)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -194,6 +194,124 @@ class Gt2YoloTarget(BaseOperator):
         assert len(self.anchor_masks) == len(self.downsample_ratios), \
             "anchor_masks', and 'downsample_ratios' should have same length."
 
+        for sample in samples:
+            if 'gt_score' not in sample:
+                sample['gt_score'] = np.ones(
+                    (sample['gt_bbox'].shape[0], 1), dtype=np.float32)
+        # all the boxes are computed together in the dtype of gt_bbox
+        if len(set(sample['gt_bbox'].dtype for sample in samples)) > 1:
+            return self._call_loop(samples, context)
+
+        h, w = samples[0]['image'].shape[1:3]
+        an_hw = np.array(self.anchors) / np.array([[w, h]])
+        gt_bbox = np.concatenate([sample['gt_bbox'] for sample in samples])
+        gt_class = np.concatenate(
+            [sample['gt_class'].reshape(-1) for sample in samples])
+        gt_score = np.concatenate(
+            [sample['gt_score'].reshape(-1) for sample in samples])
+        batch_idx = np.concatenate([
+            np.full((sample['gt_bbox'].shape[0], ), i, dtype=np.int64)
+            for i, sample in enumerate(samples)
+        ])
+        # the loop works on numpy scalars of gt_bbox, whose arithmetic with
+        # python numbers is promoted to `dtype` (float64 before numpy 2),
+        # follow the same promotion so that targets are bit-exact
+        dtype = np.asarray(gt_bbox.dtype.type(0) * 1.).dtype
+        valid = ~((gt_bbox[:, 2] <= 0.) | (gt_bbox[:, 3] <= 0.) |
+                  (gt_score <= 0.))
+        gx, gy, gw, gh = [gt_bbox[:, k].astype(dtype) for k in range(4)]
+
+        # iou [M, num_anchors] of gt and anchors centered at the same point,
+        # the same arithmetic as jaccard_overlap, where min(gw, aw) is gw if
+        # gw <= aw and keeps its dtype
+        gw_a, gh_a = gw[:, None], gh[:, None]
+        aw, ah = an_hw[None, :, 0], an_hw[None, :, 1]
+        gt_area = gw * gh
+        take_w, take_h = gw_a <= aw, gh_a <= ah
+        inter = np.where(take_w, gw_a, aw) * np.where(take_h, gh_a, ah)
+        inter = np.where(take_w & take_h, gt_area[:, None], inter)
+        iou = inter / (gt_area[:, None] + aw * ah - inter)
+
+        # first best match anchor, -1 if no anchor overlaps
+        best_idx = np.argmax(iou, axis=1)
+        best_iou = np.take_along_axis(iou, best_idx[:, None], axis=1)[:, 0]
+        best_idx[~(best_iou > 0.)] = -1
+
+        anchors = np.array(self.anchors)
+        # padded boxes are computed but never written
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tw = np.log(gw_a * w / anchors[None, :, 0].astype(dtype))
+            th = np.log(gh_a * h / anchors[None, :, 1].astype(dtype))
+        # gw * gh of two numpy scalars keeps the dtype of gt_bbox
+        tscale = 2.0 - (gt_bbox[:, 2] * gt_bbox[:, 3]).astype(dtype)
+
+        for i, (
+                mask, downsample_ratio
+        ) in enumerate(zip(self.anchor_masks, self.downsample_ratios)):
+            grid_h = int(h / downsample_ratio)
+            grid_w = int(w / downsample_ratio)
+            target = np.zeros(
+                (len(samples), len(mask), 6 + self.num_classes, grid_h,
+                 grid_w),
+                dtype=np.float32)
+            mask_arr = np.array(mask, dtype=np.int64)
+
+            gi = (gx * grid_w).astype(np.int64)
+            gj = (gy * grid_h).astype(np.int64)
+            tx = gx * grid_w - gi.astype(dtype)
+            ty = gy * grid_h - gj.astype(dtype)
+
+            # write events [M, len(mask)] in the order of the loop, the best
+            # match anchor of a gt always writes, and other anchors of iou
+            # larger than iou_thresh write only to empty cells
+            is_best = valid[:, None] & (best_idx[:, None] == mask_arr[None])
+            if self.iou_thresh < 1:
+                is_thresh = valid[:, None] & ~is_best & (
+                    iou[:, mask_arr] > self.iou_thresh)
+            else:
+                is_thresh = np.zeros_like(is_best)
+            box, n = np.nonzero(is_best | is_thresh)
+            if len(box) > 0:
+                an = mask_arr[n]
+                cell = np.ravel_multi_index(
+                    (batch_idx[box], n, gj[box] % grid_h, gi[box] % grid_w),
+                    (len(samples), len(mask), grid_h, grid_w))
+                # a thresh write happens only if it is the first event of its
+                # cell, the target of a cell is from the last event happened
+                _, first = np.unique(cell, return_index=True)
+                happened = is_best[box, n]
+                happened[first] = True
+                box, n, an, cell = box[happened], n[happened], an[
+                    happened], cell[happened]
+                _, last = np.unique(cell[::-1], return_index=True)
+                last = len(cell) - 1 - last
+
+                b, nl = batch_idx[box[last]], n[last]
+                cj, ci = gj[box[last]], gi[box[last]]
+                bl, al = box[last], an[last]
+                target[b, nl, 0, cj, ci] = tx[bl]
+                target[b, nl, 1, cj, ci] = ty[bl]
+                target[b, nl, 2, cj, ci] = tw[bl, al]
+                target[b, nl, 3, cj, ci] = th[bl, al]
+                target[b, nl, 4, cj, ci] = tscale[bl]
+                target[b, nl, 5, cj, ci] = gt_score[bl]
+                # classification of every event happened in a cell
+                target[batch_idx[box], n, 6 + gt_class[box], gj[box], gi[
+                    box]] = 1.
+            for sample, t in zip(samples, target):
+                sample['target{}'.format(i)] = t
+
+        for sample in samples:
+            # remove useless gt_class and gt_score after target calculated
+            sample.pop('gt_class')
+            sample.pop('gt_score')
+
+        return samples
+
+    def _call_loop(self, samples, context=None):
+        """
+        Reference implementation looping over every gt and anchor.
+        """
         h, w = samples[0]['image'].shape[1:3]
         an_hw = np.array(self.anchors) / np.array([[w, h]])
         for sample in samples:
@@ -134,24 +134,28 @@ class Decode(BaseOperator):
             im = sample['image']
 
         sample['image'] = im
+        return self._set_shape(sample, im.shape)
+
+    @staticmethod
+    def _set_shape(sample, im_shape):
         if 'h' not in sample:
-            sample['h'] = im.shape[0]
-        elif sample['h'] != im.shape[0]:
+            sample['h'] = im_shape[0]
+        elif sample['h'] != im_shape[0]:
             logger.warning(
                 "The actual image height: {} is not equal to the "
                 "height: {} in annotation, and update sample['h'] by actual "
-                "image height.".format(im.shape[0], sample['h']))
-            sample['h'] = im.shape[0]
+                "image height.".format(im_shape[0], sample['h']))
+            sample['h'] = im_shape[0]
         if 'w' not in sample:
-            sample['w'] = im.shape[1]
-        elif sample['w'] != im.shape[1]:
+            sample['w'] = im_shape[1]
+        elif sample['w'] != im_shape[1]:
             logger.warning(
                 "The actual image width: {} is not equal to the "
                 "width: {} in annotation, and update sample['w'] by actual "
-                "image width.".format(im.shape[1], sample['w']))
-            sample['w'] = im.shape[1]
+                "image width.".format(im_shape[1], sample['w']))
+            sample['w'] = im_shape[1]
 
-        sample['im_shape'] = np.array(im.shape[:2], dtype=np.float32)
+        sample['im_shape'] = np.array(im_shape[:2], dtype=np.float32)
         sample['scale_factor'] = np.array([1., 1.], dtype=np.float32)
         return sample
 
@@ -236,6 +240,91 @@ class DecodeCache(BaseOperator):
             MUTEX.release()
 
 
+@register_op
+class DecodeShmCache(Decode):
+    def __init__(self,
+                 cache_root=None,
+                 max_bytes=4 << 30,
+                 max_entries=1 << 16,
+                 target_size=None,
+                 keep_ratio=False,
+                 interp=cv2.INTER_LINEAR):
+        """
+        Decode image and cache the decoded uint8 image in a memory-mapped
+        file shared by all dataloader workers and ranks on the host, see
+        SharedImageCache. Output is the same as Decode, images failed to
+        decode and samples with `keep_ori_im` bypass the cache.
+
+        If target_size is set, this is Decode followed by Resize with the
+        same arguments, and the resized image is cached instead, which
+        saves both decoding and resizing for fixed-size pipelines.
+        Args:
+            cache_root (str|None): directory of the cache files, None to
+                use /dev/shm/ppdet_decode_cache
+            max_bytes (int): byte budget of cached images, least recently
+                used images are evicted when it is exceeded
+            max_entries (int): max number of cached images
+            target_size (int|list|None): target size of Resize, None to
+                cache the decoded image
+            keep_ratio (bool): keep_ratio of Resize
+            interp (int): interpolation method of Resize
+        """
+        super(DecodeShmCache, self).__init__()
+        from .shm_cache import SharedImageCache
+        self.cache = SharedImageCache(cache_root, max_bytes, max_entries)
+        self.resize = None
+        if target_size is not None:
+            self.resize = _CachedResize(target_size, keep_ratio, interp)
+            self.resize_key = (self.resize.target_size, keep_ratio, interp)
+
+    def _key(self, im_file):
+        st = os.stat(im_file)
+        parts = [os.path.abspath(im_file), st.st_mtime_ns, st.st_size]
+        if self.resize is not None:
+            parts.append(self.resize_key)
+        return self.cache.make_key(*parts)
+
+    def apply(self, sample, context=None):
+        if 'image' in sample or 'im_file' not in sample or \
+                sample.get('keep_ori_im', False):
+            sample = super(DecodeShmCache, self).apply(sample, context)
+            if self.resize is not None:
+                sample = self.resize(sample, context)
+            return sample
+
+        key = self._key(sample['im_file'])
+        im, ori_shape = self.cache.get(key, return_meta=True)
+        if im is None:
+            sample = super(DecodeShmCache, self).apply(sample, context)
+            im = sample['image']
+            if not isinstance(im, np.ndarray) or im.dtype != np.uint8:
+                return sample
+            ori_shape = im.shape[:2]
+            if self.resize is not None:
+                sample = self.resize(sample, context)
+                im = sample['image'].astype(np.uint8)
+            self.cache.put(key, im, ori_shape)
+            return sample
+
+        sample.pop('im_file')
+        if self.resize is not None:
+            # Resize gets an image view of the original shape, so scale
+            # factor and boxes are updated exactly as without cache
+            sample['image'] = np.broadcast_to(
+                np.zeros((1, 1, im.shape[2]), dtype=np.uint8),
+                tuple(ori_shape) + im.shape[2:])
+        else:
+            sample['image'] = im
+        sample = self._set_shape(sample, ori_shape)
+        if self.resize is not None:
+            self.resize.resized = im
+            try:
+                sample = self.resize(sample, context)
+            finally:
+                self.resize.resized = None
+        return sample
+
+
 @register_op
 class SniperDecodeCrop(BaseOperator):
     def __init__(self):
@@ -1039,6 +1128,21 @@ class Resize(BaseOperator):
         return sample
 
 
+class _CachedResize(Resize):
+    """
+    Resize returning `resized` as the resized image if it is set.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(_CachedResize, self).__init__(*args, **kwargs)
+        self.resized = None
+
+    def apply_image(self, image, scale):
+        if self.resized is not None:
+            return self.resized
+        return super(_CachedResize, self).apply_image(image, scale)
+
+
 @register_op
 class MultiscaleTestResize(BaseOperator):
     def __init__(self,
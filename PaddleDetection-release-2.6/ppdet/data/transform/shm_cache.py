@@ -0,0 +1,296 @@
+# Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import time
+import mmap
+import hashlib
+import tempfile
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from ppdet.utils.logger import setup_logger
+logger = setup_logger(__name__)
+
+__all__ = ['SharedImageCache']
+
+MAGIC = 0x43445050  # 'PPDC'
+VERSION = 1
+HEADER_BYTES = 64
+ALIGN = 64
+
+# entry states of the index table
+EMPTY, READY, DELETED = 0, 1, 2
+
+# rebuild the index when evicted entries take this share of it, a lookup
+# only stops at an EMPTY entry, so misses get slower as evictions pile up
+REBUILD_RATIO = 0.25
+
+ENTRY_DTYPE = np.dtype([
+    ('key', '<u8'),
+    ('state', '<i4'),
+    ('seq', '<u4'),
+    ('offset', '<i8'),
+    ('nbytes', '<i8'),
+    ('shape', '<i4', (3, )),
+    ('meta', '<i4', (2, )),
+    ('pad', '<i4'),
+    ('atime', '<f8'),
+])
+
+
+def default_cache_root():
+    if os.path.isdir('/dev/shm'):
+        return '/dev/shm/ppdet_decode_cache'
+    return os.path.join(tempfile.gettempdir(), 'ppdet_decode_cache')
+
+
+class SharedImageCache(object):
+    """
+    Cache of decoded uint8 images in one memory-mapped data file, shared by
+    all processes on a host (DataLoader workers of every rank).
+
+    The data file is an arena of `max_bytes` bytes, and the index file is
+    an open addressing hash table of `max_entries` entries holding offset,
+    shape and last access time of each image. Lookups are lock-free: an
+    entry is validated by its sequence number before and after the pixels
+    are copied out. Inserts take an exclusive file lock, and when the arena
+    is full the least recently used images are evicted until a hole is
+    large enough, and the index is rebuilt from its live entries once
+    evicted entries take a quarter of it. Files are created sparse, so only cached images take
+    memory, and they survive across launches until removed (or reboot if
+    kept under /dev/shm).
+
+    Args:
+        cache_root (str|None): directory of the cache files, None to use
+            /dev/shm/ppdet_decode_cache.
+        max_bytes (int): byte budget of cached pixels.
+        max_entries (int): capacity of the index table, keep it larger than
+            twice the number of images.
+    """
+
+    def __init__(self, cache_root=None, max_bytes=4 << 30, max_entries=1 << 16):
+        self.cache_root = cache_root or default_cache_root()
+        self.max_bytes = int(max_bytes)
+        self.max_entries = int(max_entries)
+        name = 'cache_{}_{}'.format(self.max_bytes, self.max_entries)
+        self.data_file = os.path.join(self.cache_root, name + '.data')
+        self.index_file = os.path.join(self.cache_root, name + '.index')
+        self.lock_file = os.path.join(self.cache_root, name + '.lock')
+        self._pid = None
+        self.enabled = fcntl is not None
+        if not self.enabled:
+            logger.warning('fcntl is not available, SharedImageCache is '
+                           'disabled.')
+
+    def __getstate__(self):
+        # mmaps are re-opened in each (forked or spawned) worker
+        state = self.__dict__.copy()
+        for k in ('_data', '_arena', '_index_mm', '_table', '_lock_fd'):
+            state.pop(k, None)
+        state['_pid'] = None
+        return state
+
+    def _open(self):
+        if self._pid == os.getpid():
+            return
+        os.makedirs(self.cache_root, exist_ok=True)
+        self._lock_fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT)
+        index_bytes = HEADER_BYTES + ENTRY_DTYPE.itemsize * self.max_entries
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            index_fd = os.open(self.index_file, os.O_RDWR | os.O_CREAT)
+            data_fd = os.open(self.data_file, os.O_RDWR | os.O_CREAT)
+            try:
+                header = os.pread(index_fd, 16, 0)
+                if len(header) < 16 or np.frombuffer(header,
+                                                     dtype='<i4')[0] != MAGIC:
+                    # new cache, truncate creates sparse files
+                    os.ftruncate(index_fd, 0)
+                    os.ftruncate(index_fd, index_bytes)
+                    os.ftruncate(data_fd, self.max_bytes)
+                    os.pwrite(
+                        index_fd,
+                        np.array([MAGIC, VERSION, 0, 0], dtype='<i4').tobytes(),
+                        0)
+                self._index_mm = mmap.mmap(index_fd, index_bytes)
+                self._data = mmap.mmap(data_fd, self.max_bytes)
+            finally:
+                os.close(index_fd)
+                os.close(data_fd)
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+        self._arena = np.frombuffer(self._data, dtype=np.uint8)
+        self._table = np.frombuffer(self._index_mm,
+                                    dtype=ENTRY_DTYPE,
+                                    count=self.max_entries,
+                                    offset=HEADER_BYTES)
+        self._pid = os.getpid()
+
+    @staticmethod
+    def make_key(*parts):
+        digest = hashlib.blake2b('|'.join(str(p)
+                                          for p in parts).encode('utf-8'),
+                                 digest_size=8).digest()
+        return int(np.frombuffer(digest, dtype='<u8')[0])
+
+    def _probe(self, key):
+        start = key % self.max_entries
+        for i in range(self.max_entries):
+            yield (start + i) % self.max_entries
+
+    def get(self, key, return_meta=False):
+        """
+        Return a copy of the cached image of `key`, or None if missing. If
+        `return_meta` is True, return (image, meta) instead, meta is the pair
+        of ints given to `put`.
+        """
+        if not self.enabled:
+            return (None, None) if return_meta else None
+        self._open()
+        table = self._table
+        for slot in self._probe(key):
+            entry = table[slot]
+            state = entry['state']
+            if state == EMPTY:
+                break
+            if state != READY or entry['key'] != key:
+                continue
+            seq = int(entry['seq'])
+            offset, nbytes = int(entry['offset']), int(entry['nbytes'])
+            shape = tuple(int(s) for s in entry['shape'])
+            meta = tuple(int(m) for m in entry['meta'])
+            try:
+                im = self._arena[offset:offset + nbytes].reshape(shape).copy()
+            except ValueError:
+                # fields read while the entry is rewritten by a rebuild
+                break
+            # the entry may be evicted and overwritten while copying
+            if entry['state'] != READY or int(entry['seq']) != seq or \
+                    entry['key'] != key:
+                break
+            entry['atime'] = time.time()
+            return (im, meta) if return_meta else im
+        return (None, None) if return_meta else None
+
+    def put(self, key, im, meta=(0, 0)):
+        """
+        Cache uint8 image `im` [H, W, C] of `key`, evicting least recently
+        used images if the budget is exceeded. `meta` is a pair of ints kept
+        with the image, e.g. the original size of a resized image.
+        """
+        if not self.enabled or im.dtype != np.uint8 or im.ndim != 3:
+            return False
+        nbytes = im.nbytes
+        if nbytes > self.max_bytes:
+            return False
+        self._open()
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            self._maybe_rebuild()
+            slot = self._find_slot(key)
+            if slot is None:
+                return False
+            offset = self._allocate(nbytes)
+            if offset is None:
+                return False
+            self._arena[offset:offset + nbytes] = im.reshape(-1)
+            entry = self._table[slot]
+            entry['key'] = key
+            entry['offset'] = offset
+            entry['nbytes'] = nbytes
+            entry['shape'] = im.shape
+            entry['meta'] = meta
+            entry['atime'] = time.time()
+            entry['seq'] = (int(entry['seq']) + 1) % (1 << 32)
+            # publish last, readers only trust READY entries
+            entry['state'] = READY
+            return True
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _find_slot(self, key):
+        table = self._table
+        free = None
+        for slot in self._probe(key):
+            state = table[slot]['state']
+            if state == READY and table[slot]['key'] == key:
+                # inserted by another process meanwhile
+                return None
+            if state != READY and free is None:
+                free = slot
+            if state == EMPTY:
+                break
+        return free
+
+    def _maybe_rebuild(self):
+        """
+        Re-insert the live entries into a clean index if evicted entries
+        take more than REBUILD_RATIO of it. Called with the lock held.
+        """
+        table = self._table
+        state = table['state']
+        if np.count_nonzero(state == DELETED) <= \
+                self.max_entries * REBUILD_RATIO:
+            return
+        live = table[state == READY].copy()
+        # lookups meanwhile miss, or fail the seq check after copying
+        table['state'] = EMPTY
+        table['seq'] += 1
+        for entry in live:
+            for slot in self._probe(int(entry['key'])):
+                if table[slot]['state'] == EMPTY:
+                    break
+            entry['state'] = EMPTY
+            entry['seq'] = (int(entry['seq']) + 1) % (1 << 32)
+            table[slot] = entry
+            # publish last, readers only trust READY entries
+            table[slot]['state'] = READY
+
+    def _allocate(self, nbytes):
+        table = self._table
+        size = (nbytes + ALIGN - 1) // ALIGN * ALIGN
+        while True:
+            live = np.nonzero(table['state'] == READY)[0]
+            starts = table['offset'][live]
+            order = np.argsort(starts)
+            starts = starts[order]
+            ends = starts + (table['nbytes'][live][order] + ALIGN -
+                             1) // ALIGN * ALIGN
+            hole_starts = np.concatenate([[0], ends])
+            hole_ends = np.concatenate([starts, [self.max_bytes]])
+            fit = np.nonzero(hole_ends - hole_starts >= size)[0]
+            if len(fit) > 0:
+                return int(hole_starts[fit[0]])
+            if len(live) == 0:
+                return None
+            # evict the least recently used image and retry
+            lru = live[np.argmin(table['atime'][live])]
+            table[lru]['seq'] = (int(table[lru]['seq']) + 1) % (1 << 32)
+            table[lru]['state'] = DELETED
+
+    def stats(self):
+        if not self.enabled:
+            return {}
+        self._open()
+        live = self._table['state'] == READY
+        return {
+            'images': int(live.sum()),
+            'bytes': int(self._table['nbytes'][live].sum()),
+            'max_bytes': self.max_bytes
+        }
@@ -26,7 +26,7 @@ import json
 import paddle
 import paddle.distributed as dist
 
-from ppdet.utils.checkpoint import save_model
+from ppdet.utils.checkpoint import save_model, CheckpointWriter
 from ppdet.metrics import get_infer_results
 
 from ppdet.utils.logger import setup_logger
@@ -113,9 +113,9 @@ class LogPrinter(Callback):
                 batch_size = self.model.cfg['{}Reader'.format(mode.capitalize(
                 ))]['batch_size']
 
-                logs = training_staus.log()
                 space_fmt = ':' + str(len(str(steps_per_epoch))) + 'd'
                 if step_id % self.model.cfg.log_iter == 0:
+                    logs = training_staus.log()
                     eta_steps = (epoches - epoch_id) * steps_per_epoch - step_id
                     eta_sec = eta_steps * batch_time.global_avg
                     eta_str = str(datetime.timedelta(seconds=int(eta_sec)))
@@ -166,6 +166,17 @@ class Checkpointer(Callback):
             self.weight = self.model.model.student_model
         else:
             self.weight = self.model.model
+        # write checkpoints in background, training only waits for the copy
+        # of the states to host memory
+        self.writer = None
+        if self.model.cfg.get('async_checkpoint', True):
+            self.writer = CheckpointWriter(
+                max_inflight=self.model.cfg.get('checkpoint_max_inflight', 1),
+                keep_last=self.model.cfg.get('checkpoint_keep_last', -1))
+
+    def on_train_end(self, status):
+        if self.writer is not None:
+            self.writer.wait()
 
     def on_epoch_end(self, status):
         # Checkpointer only performed during training
@@ -219,7 +230,8 @@ class Checkpointer(Callback):
                             self.save_dir,
                             save_name,
                             epoch_id + 1,
-                            ema_model=weight)
+                            ema_model=weight,
+                            writer=self.writer)
                     else:
                         # save model(student model) and ema_model(teacher model)
                         # in DenseTeacher SSOD, the teacher model will be higher,
@@ -232,12 +244,18 @@ class Checkpointer(Callback):
                             self.save_dir,
                             save_name,
                             epoch_id + 1,
-                            ema_model=student_model)
+                            ema_model=student_model,
+                            writer=self.writer)
                         del teacher_model
                         del student_model
                 else:
-                    save_model(weight, self.model.optimizer, self.save_dir,
-                               save_name, epoch_id + 1)
+                    save_model(
+                        weight,
+                        self.model.optimizer,
+                        self.save_dir,
+                        save_name,
+                        epoch_id + 1,
+                        writer=self.writer)
 
 
 class WiferFaceEval(Callback):
@@ -278,10 +296,13 @@ class VisualDLWriter(Callback):
         mode = status['mode']
         if dist.get_world_size() < 2 or dist.get_rank() == 0:
             if mode == 'train':
-                training_staus = status['training_staus']
-                for loss_name, loss_value in training_staus.get().items():
-                    self.vdl_writer.add_scalar(loss_name, loss_value,
-                                               self.vdl_loss_step)
+                # losses are copied to host once per log_iter steps, the
+                # same as LogPrinter
+                if status['step_id'] % self.model.cfg.log_iter == 0:
+                    training_staus = status['training_staus']
+                    for loss_name, loss_value in training_staus.get().items():
+                        self.vdl_writer.add_scalar(loss_name, loss_value,
+                                                   self.vdl_loss_step)
                 self.vdl_loss_step += 1
             elif mode == 'test':
                 ori_image = status['original_image']
@@ -401,6 +422,8 @@ class WandbCallback(Callback):
         mode = status['mode']
         if dist.get_world_size() < 2 or dist.get_rank() == 0:
             if mode == 'train':
+                if status['step_id'] % self.model.cfg.log_iter != 0:
+                    return
                 training_status = status['training_staus'].get()
                 for k, v in training_status.items():
                     training_status[k] = float(v)
@@ -20,6 +20,8 @@ import os
 import sys
 import copy
 import time
+import collections
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
 import numpy as np
@@ -45,7 +47,8 @@ from ppdet.data.source.category import get_categories
 import ppdet.utils.stats as stats
 from ppdet.utils.fuse_utils import fuse_conv_bn
 from ppdet.utils import profiler
-from ppdet.modeling.post_process import multiclass_nms
+from ppdet.utils.step_profiler import StepProfiler
+from ppdet.modeling.post_process import batched_nms
 
 from .callbacks import Callback, ComposeCallback, LogPrinter, Checkpointer, WiferFaceEval, VisualDLWriter, SniperProposalsGenerator, WandbCallback
 from .export_utils import _dump_infer_config, _prune_input_spec, apply_to_static
@@ -72,6 +75,11 @@ class Trainer(object):
         self.amp_level = self.cfg.get('amp_level', 'O1')
         self.custom_white_list = self.cfg.get('custom_white_list', None)
         self.custom_black_list = self.cfg.get('custom_black_list', None)
+        # seconds of each phase from building the Trainer to the first
+        # train step, logged as time to first step
+        self._startup_tic = time.time()
+        self._startup_phases = collections.OrderedDict()
+        self._first_batch = None
         if 'slim' in cfg and cfg['slim_type'] == 'PTQ':
             self.cfg['TestDataset'] = create('TestDataset')()
 
@@ -97,6 +105,7 @@ class Trainer(object):
         if self.mode == 'train':
             self.loader = create('{}Reader'.format(capital_mode))(
                 self.dataset, cfg.worker_num)
+            self._mark_startup('dataset')
 
         if cfg.architecture == 'JDE' and self.mode == 'train':
             self.cfg['JDEEmbeddingHead'][
@@ -114,6 +123,7 @@ class Trainer(object):
         else:
             self.model = self.cfg.model
             self.is_loaded_weights = True
+        self._mark_startup('model')
 
         if cfg.architecture == 'YOLOX':
             for k, m in self.model.named_sublayers():
@@ -212,6 +222,43 @@ class Trainer(object):
         # initial default metrics
         self._init_metrics()
         self._reset_metrics()
+        self._mark_startup('optimizer')
+
+    def _mark_startup(self, phase):
+        if self._startup_phases is None:
+            return
+        now = time.time()
+        last = self._startup_tic + sum(self._startup_phases.values())
+        self._startup_phases[phase] = self._startup_phases.get(phase,
+                                                               0.) + now - last
+
+    def _log_time_to_first_step(self):
+        self._mark_startup('first_step')
+        phases, self._startup_phases = self._startup_phases, None
+        total = sum(phases.values())
+        self.status['time_to_first_step'] = total
+        logger.info("Time to first step: {:.2f}s ({})".format(
+            total, ', '.join('{} {:.2f}s'.format(k, v)
+                             for k, v in phases.items())))
+
+    def _prefetch_first_batch(self):
+        # DataLoader workers and transforms produce the first batch in
+        # background, while weights and optimizer states are loaded
+        if self.mode != 'train' or self._first_batch is not None:
+            return
+        executor = ThreadPoolExecutor(max_workers=1)
+        self._first_batch = executor.submit(next, self.loader)
+        executor.shutdown(wait=False)
+
+    def _train_batches(self):
+        first_batch, self._first_batch = self._first_batch, None
+        if first_batch is not None:
+            try:
+                yield first_batch.result()
+            except StopIteration:
+                return
+        for data in self.loader:
+            yield data
 
     def _init_callbacks(self):
         if self.mode == 'train':
@@ -316,15 +363,21 @@ class Trainer(object):
             output_eval = self.cfg['output_eval'] \
                 if 'output_eval' in self.cfg else None
             save_prediction_only = self.cfg.get('save_prediction_only', False)
+            output_format = self.cfg.get('output_format', 'jsonl')
+            overlap_thresh = self.cfg.get('overlap_thresh', 0.5)
+            evaluate_difficult = self.cfg.get('evaluate_difficult', False)
 
             self._metrics = [
                 VOCMetric(
                     label_list=self.dataset.get_label_list(),
                     class_num=self.cfg.num_classes,
+                    overlap_thresh=overlap_thresh,
                     map_type=self.cfg.map_type,
+                    evaluate_difficult=evaluate_difficult,
                     classwise=classwise,
                     output_eval=output_eval,
-                    save_prediction_only=save_prediction_only)
+                    save_prediction_only=save_prediction_only,
+                    output_format=output_format)
             ]
         elif self.cfg.metric == 'WiderFace':
             multi_scale = self.cfg.multi_scale_eval if 'multi_scale_eval' in self.cfg else True
@@ -398,7 +451,10 @@ class Trainer(object):
         if self.is_loaded_weights:
             return
         self.start_epoch = 0
+        self._mark_startup('other')
+        self._prefetch_first_batch()
         load_pretrain_weight(self.model, weights)
+        self._mark_startup('weights')
         logger.debug("Load weights {} to start training".format(weights))
 
     def load_weights_sde(self, det_weights, reid_weights):
@@ -410,6 +466,8 @@ class Trainer(object):
             load_weight(self.model.reid, reid_weights)
 
     def resume_weights(self, weights):
+        self._mark_startup('other')
+        self._prefetch_first_batch()
         # support Distill resume weights
         if hasattr(self.model, 'student_model'):
             self.start_epoch = load_weight(self.model.student_model, weights,
@@ -417,6 +475,7 @@ class Trainer(object):
         else:
             self.start_epoch = load_weight(self.model, weights, self.optimizer,
                                            self.ema if self.use_ema else None)
+        self._mark_startup('weights')
         logger.debug("Resume weights of epoch {}".format(self.start_epoch))
 
     def train(self, validate=False):
@@ -459,7 +518,10 @@ class Trainer(object):
             self.cfg.log_iter, fmt='{avg:.4f}')
         self.status['data_time'] = stats.SmoothedValue(
             self.cfg.log_iter, fmt='{avg:.4f}')
-        self.status['training_staus'] = stats.TrainingStats(self.cfg.log_iter)
+        # losses are kept on device and copied to host every log_iter steps
+        self.status['training_staus'] = stats.TrainingStats(
+            self.cfg.log_iter,
+            deferred=self.cfg.get('deferred_loss_log', True))
 
         if self.cfg.get('print_flops', False):
             flops_loader = create('{}Reader'.format(self.mode.capitalize()))(
@@ -467,7 +529,24 @@ class Trainer(object):
             self._flops(flops_loader)
         profiler_options = self.cfg.get('profiler_options', None)
 
+        # wall time of each phase of the train steps, see StepProfiler
+        step_profile = self.cfg.get('step_profile', True) and (
+            self._nranks < 2 or self._local_rank == 0)
+        step_profile_file = self.cfg.get('step_profile_file', None)
+        if step_profile_file is None:
+            step_profile_file = os.path.join(
+                self.cfg.save_dir,
+                self.cfg.get('filename', ''), 'step_profile.jsonl')
+        step_profiler = StepProfiler(
+            self.loader,
+            step_profile_file,
+            capacity=self.cfg.get('step_profile_capacity', 10000),
+            sync=self.cfg.get('step_profile_sync', False),
+            enable=step_profile)
+        self.status['step_profiler'] = step_profiler
+
         self._compose_callback.on_train_begin(self.status)
+        self._mark_startup('setup')
 
         use_fused_allreduce_gradients = self.cfg[
             'use_fused_allreduce_gradients'] if 'use_fused_allreduce_gradients' in self.cfg else False
@@ -479,12 +558,15 @@ class Trainer(object):
             self.loader.dataset.set_epoch(epoch_id)
             model.train()
             iter_tic = time.time()
-            for step_id, data in enumerate(self.loader):
+            for step_id, data in enumerate(self._train_batches()):
+                self._mark_startup('first_batch')
+                step_profiler.begin(epoch_id, step_id, iter_tic)
                 self.status['data_time'].update(time.time() - iter_tic)
                 self.status['step_id'] = step_id
                 profiler.add_profiler_step(profiler_options)
                 self._compose_callback.on_step_begin(self.status)
                 data['epoch_id'] = epoch_id
+                step_profiler.mark('callback')
 
                 if self.use_amp:
                     if isinstance(
@@ -500,11 +582,13 @@ class Trainer(object):
                                 # model forward
                                 outputs = model(data)
                                 loss = outputs['loss']
+                            step_profiler.mark('forward')
                             # model backward
                             scaled_loss = scaler.scale(loss)
                             scaled_loss.backward()
                         fused_allreduce_gradients(
                             list(model.parameters()), None)
+                        step_profiler.mark('backward')
                     else:
                         with paddle.amp.auto_cast(
                                 enable=self.cfg.use_gpu or self.cfg.use_npu or
@@ -515,9 +599,11 @@ class Trainer(object):
                             # model forward
                             outputs = model(data)
                             loss = outputs['loss']
+                        step_profiler.mark('forward')
                         # model backward
                         scaled_loss = scaler.scale(loss)
                         scaled_loss.backward()
+                        step_profiler.mark('backward')
                     # in dygraph mode, optimizer.minimize is equal to optimizer.step
                     scaler.minimize(self.optimizer, scaled_loss)
                 else:
@@ -528,16 +614,20 @@ class Trainer(object):
                             # model forward
                             outputs = model(data)
                             loss = outputs['loss']
+                            step_profiler.mark('forward')
                             # model backward
                             loss.backward()
                         fused_allreduce_gradients(
                             list(model.parameters()), None)
+                        step_profiler.mark('backward')
                     else:
                         # model forward
                         outputs = model(data)
                         loss = outputs['loss']
+                        step_profiler.mark('forward')
                         # model backward
                         loss.backward()
+                        step_profiler.mark('backward')
                     self.optimizer.step()
                 curr_lr = self.optimizer.get_lr()
                 self.lr.step()
@@ -545,16 +635,22 @@ class Trainer(object):
                     self.pruner.step()
                 self.optimizer.clear_grad()
                 self.status['learning_rate'] = curr_lr
+                step_profiler.mark('optimizer')
 
                 if self._nranks < 2 or self._local_rank == 0:
                     self.status['training_staus'].update(outputs)
 
                 self.status['batch_time'].update(time.time() - iter_tic)
+                if self._startup_phases is not None:
+                    self._log_time_to_first_step()
                 self._compose_callback.on_step_end(self.status)
+                step_profiler.mark('callback')
                 if self.use_ema:
                     self.ema.update()
-                iter_tic = time.time()
+                    step_profiler.mark('ema')
+                iter_tic = step_profiler.end()
 
+            step_profiler.epoch_end(epoch_id)
             if self.cfg.get('unstructured_prune'):
                 self.pruner.update_params()
 
@@ -708,10 +804,9 @@ class Trainer(object):
                 # merge matching predictions
                 merged_results = {'bbox': []}
                 if combine_method == 'nms':
-                    final_boxes = multiclass_nms(
+                    merged_results['bbox'] = batched_nms(
                         np.concatenate(merged_bboxs), self.cfg.num_classes,
                         match_threshold, match_metric)
-                    merged_results['bbox'] = np.concatenate(final_boxes)
                 elif combine_method == 'concat':
                     merged_results['bbox'] = np.concatenate(merged_bboxs)
                 else:
@@ -768,12 +863,29 @@ class Trainer(object):
                       draw_threshold=0.5,
                       output_dir='output',
                       save_results=False,
-                      visualize=True):
+                      visualize=True,
+                      slice_batch_size=8):
+        """
+        Predict on overlapping slices of `images`, slices of different
+        images are packed into batches of `slice_batch_size`, and the results
+        of an image are merged once its last slice is done.
+        """
+        if combine_method not in ['nms', 'concat']:
+            raise ValueError(
+                "Now only support 'nms' or 'concat' to fuse detection results."
+            )
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
         self.dataset.set_slice_images(images, slice_size, overlap_ratio)
-        loader = create('TestReader')(self.dataset, 0)
+        batch_sampler = paddle.io.BatchSampler(
+            self.dataset,
+            batch_size=slice_batch_size,
+            shuffle=False,
+            drop_last=False)
+        loader = create('TestReader')(self.dataset,
+                                      0,
+                                      batch_sampler=batch_sampler)
         imid2path = self.dataset.get_imid2path()
 
         def setup_metrics_for_loader():
@@ -832,44 +944,40 @@ class Trainer(object):
             # forward
             outs = self.model(data)
 
-            outs['bbox'] = outs['bbox'].numpy()  # only in test mode
-            shift_amount = data['st_pix']
-            outs['bbox'][:, 2:4] = outs['bbox'][:, 2:4] + shift_amount.numpy()
-            outs['bbox'][:, 4:6] = outs['bbox'][:, 4:6] + shift_amount.numpy()
-            merged_bboxs.append(outs['bbox'])
-
-            if data['is_last'] > 0:
+            # shift boxes of every slice in the batch back to its image
+            bbox = outs['bbox'].numpy()  # only in test mode
+            bbox_num = outs['bbox_num'].numpy()
+            shift = np.repeat(data['st_pix'].numpy(), bbox_num, axis=0)
+            bbox[:, 2:6] += np.tile(shift, 2)
+            slice_bboxs = np.split(bbox, np.cumsum(bbox_num)[:-1])
+            is_last = data['is_last'].numpy().reshape(-1)
+
+            for k in range(len(slice_bboxs)):
+                merged_bboxs.append(slice_bboxs[k])
+                if is_last[k] == 0:
+                    continue
                 # merge matching predictions
-                merged_results = {'bbox': []}
+                merged_results = {'bbox': np.concatenate(merged_bboxs)}
                 if combine_method == 'nms':
-                    final_boxes = multiclass_nms(
-                        np.concatenate(merged_bboxs), self.cfg.num_classes,
+                    merged_results['bbox'] = batched_nms(
+                        merged_results['bbox'], self.cfg.num_classes,
                         match_threshold, match_metric)
-                    merged_results['bbox'] = np.concatenate(final_boxes)
-                elif combine_method == 'concat':
-                    merged_results['bbox'] = np.concatenate(merged_bboxs)
-                else:
-                    raise ValueError(
-                        "Now only support 'nms' or 'concat' to fuse detection results."
-                    )
-                merged_results['im_id'] = np.array([[0]])
                 merged_results['bbox_num'] = np.array(
                     [len(merged_results['bbox'])])
-
                 merged_bboxs = []
-                data['im_id'] = data['ori_im_id']
 
+                im_data = {
+                    key: data[key][k:k + 1]
+                    for key in ['im_shape', 'scale_factor']
+                }
+                im_data['im_id'] = data['ori_im_id'][k:k + 1]
+                merged_results['im_id'] = np.array([[0]])
                 for _m in metrics:
-                    _m.update(data, merged_results)
+                    _m.update(im_data, merged_results)
 
-                for key in ['im_shape', 'scale_factor', 'im_id']:
-                    if isinstance(data, typing.Sequence):
-                        merged_results[key] = data[0][key]
-                    else:
-                        merged_results[key] = data[key]
-                for key, value in merged_results.items():
-                    if hasattr(value, 'numpy'):
-                        merged_results[key] = value.numpy()
+                for key, value in im_data.items():
+                    merged_results[key] = value.numpy() if hasattr(
+                        value, 'numpy') else value
                 results.append(merged_results)
 
         for _m in metrics:
@@ -913,6 +1021,7 @@ class Trainer(object):
                     image.save(save_name, quality=95)
 
                     start = end
+        return results
 
     def predict(self,
                 images,
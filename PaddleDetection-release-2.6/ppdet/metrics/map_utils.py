@@ -31,6 +31,7 @@ __all__ = [
     'draw_pr_curve',
     'bbox_area',
     'jaccard_overlap',
+    'jaccard_overlap_matrix',
     'prune_zero_padding',
     'DetectionMAP',
     'ap_per_class',
@@ -91,6 +92,39 @@ def jaccard_overlap(pred, gt, is_bbox_normalized=False):
     return overlap
 
 
+def jaccard_overlap_matrix(pred, gt, is_bbox_normalized=False):
+    """
+    Calculate jaccard overlap ratio [P, G] between every prediction and
+    ground truth bounding box, each one is exactly jaccard_overlap of the
+    pair, with pred given as python floats and gt as numpy scalars.
+    """
+    norm = 1. - float(is_bbox_normalized)
+    pred = np.asarray(pred, dtype=np.float64).reshape(-1, 4)
+    gt = np.asarray(gt).reshape(-1, 4)
+    p = [pred[:, None, k] for k in range(4)]
+    g = [gt[None, :, k].astype(np.float64) for k in range(4)]
+
+    def _side(lo, hi):
+        # max/min keep pred on ties, and the side of two gt numpy scalars
+        # is computed in the dtype of gt
+        gt_side = (gt[:, hi] - gt[:, lo]).astype(np.float64)[None]
+        from_gt = (g[lo] > p[lo]) & (g[hi] < p[hi])
+        side = np.minimum(p[hi], g[hi]) - np.maximum(p[lo], g[lo])
+        return np.where(from_gt, gt_side, side) + norm, gt_side + norm
+
+    inter_w, gt_w = _side(0, 2)
+    inter_h, gt_h = _side(1, 3)
+    inter_size = inter_w * inter_h
+    pred_size = (p[2] - p[0] + norm) * (p[3] - p[1] + norm)
+    gt_size = gt_w * gt_h
+    with np.errstate(divide='ignore', invalid='ignore'):
+        overlap = inter_size / (pred_size + gt_size - inter_size)
+    disjoint = (p[0] >= g[2]) | (p[2] <= g[0]) | (p[1] >= g[3]) | (
+        p[3] <= g[1])
+    overlap[disjoint] = 0.
+    return overlap
+
+
 def calc_rbox_iou(pred, gt_poly):
     """
     calc iou between rotated bbox
@@ -145,10 +179,12 @@ class DetectionMAP(object):
 
     Args:
         class_num (int): The class number.
-        overlap_thresh (float): The threshold of overlap
+        overlap_thresh (float|list): The threshold of overlap
             ratio between prediction bounding box and 
             ground truth bounding box for deciding 
-            true/false positive. Default 0.5.
+            true/false positive. A list of thresholds, e.g.
+            [0.5, 0.55, ..., 0.95], is evaluated in one pass,
+            and mAP is the mean over thresholds. Default 0.5.
         map_type (str): Calculation method of mean average
             precision, currently support '11point' and
             'integral'. Default '11point'.
@@ -159,6 +195,10 @@ class DetectionMAP(object):
         catid2name (dict): Mapping between category id and category name.
         classwise (bool): Whether per-category AP and draw
             P-R Curve or not.
+        vectorized (bool): Whether to match and accumulate with numpy
+            arrays, False to use the reference python loops, e.g. for
+            regression tests. Both give identical results, the loops only
+            support a single overlap_thresh. Default True.
     """
 
     def __init__(self,
@@ -168,9 +208,17 @@ class DetectionMAP(object):
                  is_bbox_normalized=False,
                  evaluate_difficult=False,
                  catid2name=None,
-                 classwise=False):
+                 classwise=False,
+                 vectorized=True):
         self.class_num = class_num
         self.overlap_thresh = overlap_thresh
+        if isinstance(overlap_thresh, (list, tuple)):
+            self.overlap_threshs = [float(t) for t in overlap_thresh]
+        else:
+            self.overlap_threshs = [overlap_thresh]
+        assert len(self.overlap_threshs) > 0, "overlap_thresh is empty"
+        assert vectorized or len(self.overlap_threshs) == 1, \
+                "multiple overlap_thresh need vectorized=True"
         assert map_type in ['11point', 'integral'], \
                 "map_type currently only support '11point' "\
                 "and 'integral'"
@@ -178,6 +226,7 @@ class DetectionMAP(object):
         self.is_bbox_normalized = is_bbox_normalized
         self.evaluate_difficult = evaluate_difficult
         self.classwise = classwise
+        self.vectorized = vectorized
         self.classes = []
         for cname in catid2name.values():
             self.classes.append(cname)
@@ -190,6 +239,10 @@ class DetectionMAP(object):
         """
         if difficult is None:
             difficult = np.zeros_like(gt_label)
+        if self.vectorized:
+            self._update_vectorized(bbox, score, label, gt_box, gt_label,
+                                    difficult)
+            return
 
         # record class gt count
         for gtl, diff in zip(gt_label, difficult):
@@ -224,6 +277,63 @@ class DetectionMAP(object):
             else:
                 self.class_score_poss[int(l)].append([s, 0.0])
 
+    def _update_vectorized(self, bbox, score, label, gt_box, gt_label,
+                           difficult):
+        """
+        Same as the loops of update, with the overlaps of an image computed
+        as one matrix shared by all the thresholds. Predictions are matched
+        in the given order (score order after NMS), a prediction is a true
+        positive if its best match gt is not matched by any former one.
+
+        Each class records arrays [N, 1 + 2 * T] of T thresholds: score, pos
+        at each threshold, and whether counted at each threshold, as the
+        predictions matched to a difficult gt are ignored.
+        """
+        gt_label = np.asarray(gt_label).reshape(-1).astype(np.int64)
+        difficult = np.asarray(difficult).reshape(-1).astype(np.int64)
+        counted = gt_label[(difficult == 0) | self.evaluate_difficult]
+        for l, cnt in zip(*np.unique(counted, return_counts=True)):
+            self.class_gt_counts[int(l)] += int(cnt)
+
+        label = np.asarray(label).reshape(-1).astype(np.int64)
+        score = np.asarray(score).reshape(-1)
+        if len(label) == 0:
+            return
+        num_thresh = len(self.overlap_threshs)
+        pos = np.zeros((len(label), num_thresh), dtype=np.float64)
+        keep = np.ones((len(label), num_thresh), dtype=bool)
+        if len(gt_label) > 0:
+            overlap = self._overlap_matrix(bbox, gt_box)
+            overlap[label[:, None] != gt_label[None, :]] = -1.
+            max_idx = np.argmax(overlap, axis=1)
+            max_overlap = overlap[np.arange(len(label)), max_idx]
+            matched = max_overlap[:, None] > np.array(self.overlap_threshs)
+            if not self.evaluate_difficult:
+                keep = ~matched | (difficult[max_idx] == 0)[:, None]
+            matched &= keep
+            for t in range(num_thresh):
+                pred_idx = np.nonzero(matched[:, t])[0]
+                _, first = np.unique(max_idx[pred_idx], return_index=True)
+                pos[pred_idx[first], t] = 1.0
+
+        for l in np.unique(label):
+            sel = label == l
+            self.class_score_poss[int(l)].append(
+                np.concatenate(
+                    [score[sel, None].astype(np.float64), pos[sel], keep[sel]],
+                    axis=1))
+
+    def _overlap_matrix(self, bbox, gt_box):
+        if np.shape(gt_box)[-1] != 8:
+            return jaccard_overlap_matrix(bbox, gt_box,
+                                          self.is_bbox_normalized)
+        overlap = np.zeros((len(bbox), len(gt_box)), dtype=np.float64)
+        for i, b in enumerate(bbox):
+            pred = b.tolist() if isinstance(b, np.ndarray) else b
+            for j, g in enumerate(gt_box):
+                overlap[i, j] = calc_rbox_iou(pred, g)
+        return overlap
+
     def reset(self):
         """
         Reset metric statics
@@ -231,67 +341,108 @@ class DetectionMAP(object):
         self.class_score_poss = [[] for _ in range(self.class_num)]
         self.class_gt_counts = [0] * self.class_num
         self.mAP = 0.0
+        self.mAPs = [0.0] * len(self.overlap_threshs)
 
     def accumulate(self):
         """
         Accumulate metric results and calculate mAP
         """
+        self.mAPs = []
+        class_aps = []
+        for t in range(len(self.overlap_threshs)):
+            mAP, eval_results, aps = self._accumulate_thresh(t)
+            self.mAPs.append(mAP)
+            class_aps.append(aps)
+            if t == 0:
+                self.eval_results = eval_results
+        self.mAP = sum(self.mAPs) / len(self.mAPs)
+        # AP [class_num, T] of each class at each threshold, None for the
+        # classes without gt
+        self.class_aps = [list(aps) for aps in zip(*class_aps)]
+
+    def _accumulate_thresh(self, t):
+        """
+        Calculate mAP and per-class results at the t-th threshold
+        """
+        num_thresh = len(self.overlap_threshs)
         mAP = 0.
         valid_cnt = 0
         eval_results = []
-        for score_pos, count in zip(self.class_score_poss,
-                                    self.class_gt_counts):
+        class_aps = [None] * self.class_num
+        for c, (score_pos, count) in enumerate(
+                zip(self.class_score_poss, self.class_gt_counts)):
             if count == 0: continue
+            class_aps[c] = 0.
+            if self.vectorized and len(score_pos) > 0:
+                score_pos = np.concatenate(score_pos)
+                valid = score_pos[:, 1 + num_thresh + t] > 0
+                score_pos = score_pos[valid][:, [0, 1 + t]]
             if len(score_pos) == 0:
                 valid_cnt += 1
                 continue
 
-            accum_tp_list, accum_fp_list = \
-                    self._get_tp_fp_accum(score_pos)
-            precision = []
-            recall = []
-            for ac_tp, ac_fp in zip(accum_tp_list, accum_fp_list):
-                precision.append(float(ac_tp) / (ac_tp + ac_fp))
-                recall.append(float(ac_tp) / count)
-
-            one_class_ap = 0.0
-            if self.map_type == '11point':
-                max_precisions = [0.] * 11
-                start_idx = len(precision) - 1
-                for j in range(10, -1, -1):
-                    for i in range(start_idx, -1, -1):
-                        if recall[i] < float(j) / 10.:
-                            start_idx = i
-                            if j > 0:
-                                max_precisions[j - 1] = max_precisions[j]
-                                break
-                        else:
-                            if max_precisions[j] < precision[i]:
-                                max_precisions[j] = precision[i]
-                one_class_ap = sum(max_precisions) / 11.
-                mAP += one_class_ap
-                valid_cnt += 1
-            elif self.map_type == 'integral':
-                import math
-                prev_recall = 0.
-                for i in range(len(precision)):
-                    recall_gap = math.fabs(recall[i] - prev_recall)
-                    if recall_gap > 1e-6:
-                        one_class_ap += precision[i] * recall_gap
-                        prev_recall = recall[i]
-                mAP += one_class_ap
-                valid_cnt += 1
+            if self.vectorized:
+                precision, recall = self._get_precision_recall(score_pos,
+                                                               count)
+                if self.map_type == '11point':
+                    one_class_ap = _ap_11point(precision, recall)
+                else:
+                    one_class_ap = _ap_integral(precision, recall)
+                precision, recall = precision.tolist(), recall.tolist()
             else:
-                logger.error("Unspported mAP type {}".format(self.map_type))
-                sys.exit(1)
+                precision, recall, one_class_ap = \
+                    self._accumulate_reference(score_pos, count)
+            mAP += one_class_ap
+            valid_cnt += 1
+            class_aps[c] = one_class_ap
             eval_results.append({
                 'class': self.classes[valid_cnt - 1],
                 'ap': one_class_ap,
                 'precision': precision,
                 'recall': recall,
             })
-        self.eval_results = eval_results
-        self.mAP = mAP / float(valid_cnt) if valid_cnt > 0 else mAP
+        mAP = mAP / float(valid_cnt) if valid_cnt > 0 else mAP
+        return mAP, eval_results, class_aps
+
+    def _accumulate_reference(self, score_pos, count):
+        """
+        Calculate precision, recall and AP of one class with python loops
+        """
+        accum_tp_list, accum_fp_list = \
+                self._get_tp_fp_accum(score_pos)
+        precision = []
+        recall = []
+        for ac_tp, ac_fp in zip(accum_tp_list, accum_fp_list):
+            precision.append(float(ac_tp) / (ac_tp + ac_fp))
+            recall.append(float(ac_tp) / count)
+
+        one_class_ap = 0.0
+        if self.map_type == '11point':
+            max_precisions = [0.] * 11
+            start_idx = len(precision) - 1
+            for j in range(10, -1, -1):
+                for i in range(start_idx, -1, -1):
+                    if recall[i] < float(j) / 10.:
+                        start_idx = i
+                        if j > 0:
+                            max_precisions[j - 1] = max_precisions[j]
+                            break
+                    else:
+                        if max_precisions[j] < precision[i]:
+                            max_precisions[j] = precision[i]
+            one_class_ap = sum(max_precisions) / 11.
+        elif self.map_type == 'integral':
+            import math
+            prev_recall = 0.
+            for i in range(len(precision)):
+                recall_gap = math.fabs(recall[i] - prev_recall)
+                if recall_gap > 1e-6:
+                    one_class_ap += precision[i] * recall_gap
+                    prev_recall = recall[i]
+        else:
+            logger.error("Unspported mAP type {}".format(self.map_type))
+            sys.exit(1)
+        return precision, recall, one_class_ap
 
     def get_map(self):
         """
@@ -330,10 +481,46 @@ class DetectionMAP(object):
             table_data += [result for result in results_2d]
             table = AsciiTable(table_data)
             logger.info('Per-category of VOC AP: \n{}'.format(table.table))
+            if len(self.overlap_threshs) > 1:
+                table = AsciiTable(self._get_thresh_table())
+                logger.info('Per-category of VOC AP at each IoU threshold: '
+                            '\n{}'.format(table.table))
             logger.info(
                 "per-category PR curve has output to voc_pr_curve folder.")
         return self.mAP
 
+    def _get_thresh_table(self):
+        """
+        Rows of per-category AP at each threshold and the mean
+        """
+        headers = ['category', 'mAP'] + [
+            'AP@{:.2f}'.format(t) for t in self.overlap_threshs
+        ]
+        table_data = [headers]
+        for c, aps in enumerate(self.class_aps):
+            if aps[0] is None:
+                continue
+            table_data.append([str(self.classes[c]), '{:0.3f}'.format(
+                sum(aps) / len(aps))] + ['{:0.3f}'.format(ap) for ap in aps])
+        table_data.append(['all', '{:0.3f}'.format(self.mAP)] + [
+            '{:0.3f}'.format(m) for m in self.mAPs
+        ])
+        return table_data
+
+    def _get_precision_recall(self, score_pos, count):
+        """
+        Calculate precision and recall arrays from [N, 2] records of score
+        and pos
+        """
+        # stable as sorted(reverse=True), ties keep the order of update
+        order = np.argsort(-score_pos[:, 0], kind='stable')
+        pos = score_pos[order, 1].astype(np.int64)
+        accum_tp = np.cumsum(pos)
+        accum_fp = np.cumsum(1 - pos)
+        precision = accum_tp / (accum_tp + accum_fp)
+        recall = accum_tp / count
+        return precision, recall
+
     def _get_tp_fp_accum(self, score_pos_list):
         """
         Calculate accumulating true/false positive results from
@@ -352,6 +539,55 @@ class DetectionMAP(object):
         return accum_tp_list, accum_fp_list
 
 
+def _ap_11point(precision, recall):
+    """
+    11point AP of non-decreasing recall, the same as the reference loop of
+    DetectionMAP, which scans down from the last point and carries the max
+    precision to the next recall level only when it stops early.
+    """
+    max_precisions = [0.] * 11
+    start_idx = len(precision) - 1
+    for j in range(10, -1, -1):
+        # last index whose recall < j / 10, where the scan stops
+        stop = int(
+            np.searchsorted(
+                recall[:start_idx + 1], float(j) / 10., side='left')) - 1
+        if stop < start_idx:
+            max_precisions[j] = max(max_precisions[j],
+                                    float(precision[stop + 1:start_idx + 1]
+                                          .max()))
+        if stop >= 0:
+            start_idx = stop
+            if j > 0:
+                max_precisions[j - 1] = max_precisions[j]
+    return sum(max_precisions) / 11.
+
+
+def _ap_integral(precision, recall):
+    """
+    Integral AP of non-decreasing recall, the same as the reference loop of
+    DetectionMAP.
+    """
+    prev = np.concatenate([[0.], recall[:-1]])
+    idx = np.nonzero(recall != prev)[0]
+    gaps = recall[idx] - prev[idx]
+    if np.any(gaps <= 1e-6):
+        # rises within 1e-6 are merged with the next ones
+        import math
+        one_class_ap = 0.0
+        prev_recall = 0.
+        for i in range(len(precision)):
+            recall_gap = math.fabs(recall[i] - prev_recall)
+            if recall_gap > 1e-6:
+                one_class_ap += precision[i] * recall_gap
+                prev_recall = recall[i]
+        return float(one_class_ap)
+    if len(idx) == 0:
+        return 0.0
+    # cumsum adds in order as the loop
+    return float(np.cumsum(precision[idx] * gaps)[-1])
+
+
 def ap_per_class(tp, conf, pred_cls, target_cls):
     """
     Computes the average precision, given the recall and precision curves.
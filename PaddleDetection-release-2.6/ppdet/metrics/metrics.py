@@ -26,6 +26,7 @@ from collections import defaultdict
 from pathlib import Path
 
 from .map_utils import prune_zero_padding, DetectionMAP
+from .voc_results import VOCResultWriter, RESULT_FORMATS
 from .coco_utils import get_infer_results, cocoapi_eval
 from .widerface_utils import face_eval_run
 from ppdet.data.source.category import get_categories
@@ -229,9 +230,13 @@ class VOCMetric(Metric):
                  evaluate_difficult=False,
                  classwise=False,
                  output_eval=None,
-                 save_prediction_only=False):
+                 save_prediction_only=False,
+                 output_format='jsonl'):
         assert os.path.isfile(label_list), \
                 "label_list {} not a file".format(label_list)
+        assert output_format in RESULT_FORMATS, \
+                "output_format should be one of {}".format(
+                    list(RESULT_FORMATS.keys()))
         self.clsid2catid, self.catid2name = get_categories('VOC', label_list)
 
         self.overlap_thresh = overlap_thresh
@@ -239,6 +244,10 @@ class VOCMetric(Metric):
         self.evaluate_difficult = evaluate_difficult
         self.output_eval = output_eval
         self.save_prediction_only = save_prediction_only
+        # results are streamed to output_eval in update, except the legacy
+        # 'json' format kept in memory and dumped by accumulate
+        self.output_format = output_format
+        self.writer = None
         self.detection_map = DetectionMAP(
             class_num=class_num,
             overlap_thresh=overlap_thresh,
@@ -252,6 +261,9 @@ class VOCMetric(Metric):
 
     def reset(self):
         self.results = {'bbox': [], 'score': [], 'label': []}
+        if self.writer is not None:
+            self.writer.abort()
+            self.writer = None
         self.detection_map.reset()
 
     def update(self, inputs, outputs):
@@ -263,9 +275,12 @@ class VOCMetric(Metric):
         bbox_lengths = outputs['bbox_num'].numpy() if isinstance(
             outputs['bbox_num'], paddle.Tensor) else outputs['bbox_num']
 
-        self.results['bbox'].append(bboxes.tolist())
-        self.results['score'].append(scores.tolist())
-        self.results['label'].append(labels.tolist())
+        if self.output_format == 'json':
+            self.results['bbox'].append(bboxes.tolist())
+            self.results['score'].append(scores.tolist())
+            self.results['label'].append(labels.tolist())
+        elif self.output_eval and bboxes.shape[-1] == 4:
+            self._write_results(inputs, bboxes, scores, labels, bbox_lengths)
 
         if bboxes.shape == (1, 1) or bboxes is None:
             return
@@ -307,10 +322,32 @@ class VOCMetric(Metric):
                                       difficult)
             bbox_idx += bbox_num
 
+    def _write_results(self, inputs, bboxes, scores, labels, bbox_lengths):
+        if self.writer is None:
+            self.writer = VOCResultWriter(
+                os.path.join(self.output_eval,
+                             RESULT_FORMATS[self.output_format]))
+        im_ids = inputs.get('im_id', None)
+        if isinstance(im_ids, paddle.Tensor):
+            im_ids = im_ids.numpy()
+        bbox_idx = 0
+        for i, bbox_num in enumerate(bbox_lengths):
+            bbox_num = int(bbox_num)
+            im_id = None if im_ids is None else int(
+                np.array(im_ids[i]).reshape(-1)[0])
+            self.writer.write(im_id, bboxes[bbox_idx:bbox_idx + bbox_num],
+                              scores[bbox_idx:bbox_idx + bbox_num],
+                              labels[bbox_idx:bbox_idx + bbox_num])
+            bbox_idx += bbox_num
+
     def accumulate(self):
-        output = "bbox.json"
-        if self.output_eval:
-            output = os.path.join(self.output_eval, output)
+        if self.writer is not None:
+            self.writer.close()
+            logger.info('The bbox result of {} images is saved to {}.'.format(
+                self.writer.num_images, self.writer.path))
+            self.writer = None
+        elif self.output_eval and self.output_format == 'json':
+            output = os.path.join(self.output_eval, "bbox.json")
             with open(output, 'w') as f:
                 json.dump(self.results, f)
                 logger.info('The bbox result is saved to bbox.json.')
@@ -322,8 +359,16 @@ class VOCMetric(Metric):
 
     def log(self):
         map_stat = 100. * self.detection_map.get_map()
-        logger.info("mAP({:.2f}, {}) = {:.2f}%".format(self.overlap_thresh,
-                                                       self.map_type, map_stat))
+        threshs = self.detection_map.overlap_threshs
+        if len(threshs) == 1:
+            logger.info("mAP({:.2f}, {}) = {:.2f}%".format(
+                threshs[0], self.map_type, map_stat))
+            return
+        for thresh, mAP in zip(threshs, self.detection_map.mAPs):
+            logger.info("mAP({:.2f}, {}) = {:.2f}%".format(thresh, self.map_type,
+                                                           100. * mAP))
+        logger.info("mAP([{:.2f}:{:.2f}], {}) = {:.2f}%".format(
+            threshs[0], threshs[-1], self.map_type, map_stat))
 
     def get_results(self):
         return {'bbox': [self.detection_map.get_map()]}
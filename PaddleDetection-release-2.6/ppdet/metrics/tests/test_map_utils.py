@@ -0,0 +1,138 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+import os, sys
+# add python path of PaddleDetection to sys.path
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import unittest
+import numpy as np
+
+from ppdet.metrics.map_utils import (DetectionMAP, jaccard_overlap,
+                                     jaccard_overlap_matrix)
+
+CATID2NAME = {0: 'mouse', 1: 'other', 2: 'dog'}
+
+
+def make_images(seed, num_images=100, num_classes=3, normalized=False):
+    """
+    Random gt and predictions as passed by VOCMetric.update, predictions are
+    jittered gt boxes, some of them exact copies.
+    """
+    rng = np.random.RandomState(seed)
+    scale = 1. / 400 if normalized else 1.
+    images = []
+    for _ in range(num_images):
+        num_gt = rng.randint(0, 8)
+        xy = rng.rand(num_gt, 2) * 300
+        wh = rng.rand(num_gt, 2) * 100 + 1
+        gt_box = (np.concatenate([xy, xy + wh], axis=1) * scale).astype(
+            np.float32)
+        gt_label = rng.randint(0, num_classes, (num_gt, 1)).astype(np.int32)
+        difficult = (rng.rand(num_gt, 1) < 0.2).astype(np.int32)
+
+        num_pred = rng.randint(0, 20)
+        if num_gt > 0:
+            bbox = gt_box[rng.randint(0, num_gt, num_pred)]
+        else:
+            bbox = np.zeros((num_pred, 4), dtype=np.float32)
+        bbox = (bbox + rng.randn(num_pred, 4) * 8 * scale).astype(np.float32)
+        if num_pred > 2 and num_gt > 0:
+            bbox[0] = gt_box[0]
+        # repeated scores to check the order of ties
+        score = rng.choice([0.9, 0.5, 0.3, rng.rand()],
+                           num_pred).astype(np.float32)
+        label = rng.randint(0, num_classes, num_pred).astype(np.float32)
+        images.append((bbox, score, label, gt_box, gt_label, difficult))
+    return images
+
+
+class TestDetectionMAP(unittest.TestCase):
+    def test_overlap_matrix(self):
+        for normalized in [False, True]:
+            bbox, _, _, gt_box, _, _ = make_images(
+                0, num_images=1, normalized=normalized)[0]
+            bbox = np.concatenate([bbox, gt_box[:1] + 0.5])
+            overlap = jaccard_overlap_matrix(bbox, gt_box, normalized)
+            for i, b in enumerate(bbox):
+                for j, g in enumerate(gt_box):
+                    self.assertEqual(overlap[i, j],
+                                     jaccard_overlap(b.tolist(), g,
+                                                     normalized))
+
+    def test_same_as_reference(self):
+        for normalized in [False, True]:
+            for map_type in ['11point', 'integral']:
+                for evaluate_difficult in [False, True]:
+                    for overlap_thresh in [0.3, 0.5, 0.75]:
+                        for seed in range(3):
+                            self.check(
+                                make_images(
+                                    seed, normalized=normalized),
+                                overlap_thresh=overlap_thresh,
+                                map_type=map_type,
+                                is_bbox_normalized=normalized,
+                                evaluate_difficult=evaluate_difficult)
+
+    def test_multi_thresh(self):
+        threshs = [0.5 + 0.05 * i for i in range(10)]
+        for map_type in ['11point', 'integral']:
+            for evaluate_difficult in [False, True]:
+                images = make_images(0)
+                multi = self.evaluate(
+                    images,
+                    overlap_thresh=threshs,
+                    map_type=map_type,
+                    evaluate_difficult=evaluate_difficult)
+                for t, thresh in enumerate(threshs):
+                    single = self.evaluate(
+                        images,
+                        overlap_thresh=thresh,
+                        map_type=map_type,
+                        evaluate_difficult=evaluate_difficult,
+                        vectorized=False)
+                    self.assertEqual(multi.mAPs[t], single.mAP)
+                    self.assertEqual([aps[t] for aps in multi.class_aps],
+                                     [aps[0] for aps in single.class_aps])
+                self.assertAlmostEqual(multi.mAP, np.mean(multi.mAPs))
+
+    def evaluate(self, images, **kwargs):
+        detection_map = DetectionMAP(
+            len(CATID2NAME), catid2name=CATID2NAME, **kwargs)
+        for bbox, score, label, gt_box, gt_label, difficult in images:
+            if kwargs['evaluate_difficult']:
+                difficult = None
+            detection_map.update(bbox, score, label, gt_box, gt_label,
+                                 difficult)
+        detection_map.accumulate()
+        return detection_map
+
+    def check(self, images, **kwargs):
+        expect, out = [
+            self.evaluate(
+                images, vectorized=vectorized, **kwargs)
+            for vectorized in [False, True]
+        ]
+        self.assertEqual(expect.class_gt_counts, out.class_gt_counts)
+        self.assertEqual(expect.get_map(), out.get_map())
+        self.assertEqual(len(expect.eval_results), len(out.eval_results))
+        for e, o in zip(expect.eval_results, out.eval_results):
+            self.assertEqual(e, o)
+
+
+if __name__ == '__main__':
+    unittest.main()
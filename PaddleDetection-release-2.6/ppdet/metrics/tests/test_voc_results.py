@@ -0,0 +1,210 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+import os, sys
+# add python path of PaddleDetection to sys.path
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from ppdet.data.source.voc import VOCDataSet
+from ppdet.metrics import VOCMetric
+from ppdet.metrics.voc_results import VOCResultWriter, load_voc_results, \
+        voc_eval_results
+from ppdet.metrics.tests.test_map_utils import make_images
+
+
+def make_batches(images, batch_size=4):
+    """
+    Inputs and outputs of VOCMetric.update from make_images.
+    """
+    batches = []
+    for st in range(0, len(images), batch_size):
+        batch = images[st:st + batch_size]
+        max_gt = max(max(len(im[3]) for im in batch), 1)
+        inputs = {
+            'im_id': np.arange(
+                st, st + len(batch), dtype=np.int64)[:, None],
+            'gt_bbox': np.zeros(
+                (len(batch), max_gt, 4), dtype=np.float32),
+            'gt_class': np.zeros(
+                (len(batch), max_gt, 1), dtype=np.int32),
+            'difficult': np.zeros(
+                (len(batch), max_gt, 1), dtype=np.int32),
+        }
+        rows, nums = [], []
+        for i, (bbox, score, label, gt_box, gt_label, diff) in enumerate(
+                batch):
+            inputs['gt_bbox'][i, :len(gt_box)] = gt_box
+            inputs['gt_class'][i, :len(gt_box)] = gt_label
+            inputs['difficult'][i, :len(gt_box)] = diff
+            rows.append(
+                np.concatenate(
+                    [label[:, None], score[:, None], bbox], axis=1))
+            nums.append(len(bbox))
+        outputs = {
+            'bbox': np.concatenate(rows).astype(np.float32),
+            'bbox_num': np.array(
+                nums, dtype=np.int32)
+        }
+        batches.append((inputs, outputs))
+    return batches
+
+
+def write_voc_dataset(root, images, names=('mouse', 'other', 'dog')):
+    """
+    Write gt of make_images as a VOC dataset, im_id of each image is its
+    index.
+    """
+    os.makedirs(os.path.join(root, 'images'))
+    os.makedirs(os.path.join(root, 'annotations'))
+    lines = []
+    for i, (_, _, _, gt_box, gt_label, difficult) in enumerate(images):
+        name = '{:05d}'.format(i)
+        open(os.path.join(root, 'images', name + '.jpg'), 'w').close()
+        objs = ''.join(
+            '<object><name>{}</name><difficult>{}</difficult><bndbox>'
+            '<xmin>{!r}</xmin><ymin>{!r}</ymin><xmax>{!r}</xmax>'
+            '<ymax>{!r}</ymax></bndbox></object>'.format(names[int(
+                c)], int(d), *[float(v) for v in box])
+            for box, c, d in zip(gt_box, gt_label[:, 0], difficult[:, 0]))
+        with open(os.path.join(root, 'annotations', name + '.xml'), 'w') as f:
+            f.write('<annotation><id>{}</id><size><width>500</width><height>'
+                    '500</height></size>{}</annotation>'.format(i, objs))
+        lines.append('images/{0}.jpg annotations/{0}.xml'.format(name))
+    with open(os.path.join(root, 'val.txt'), 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    with open(os.path.join(root, 'label_list.txt'), 'w') as f:
+        f.write('\n'.join(names) + '\n')
+
+
+class TestVOCResults(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.label_list = os.path.join(self.root, 'label_list.txt')
+        with open(self.label_list, 'w') as f:
+            f.write('mouse\nother\ndog\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_writer_round_trip(self):
+        images = make_images(0, num_images=20)
+        for ext in ['jsonl', 'bin']:
+            path = os.path.join(self.root, 'bbox.' + ext)
+            writer = VOCResultWriter(path)
+            for im_id, (bbox, score, label, _, _, _) in enumerate(images):
+                writer.write(im_id, bbox, score, label)
+            # nothing visible before close
+            self.assertFalse(os.path.exists(path))
+            writer.close()
+            records = list(load_voc_results(path))
+            self.assertEqual(len(records), len(images))
+            for im_id, (rec, image) in enumerate(zip(records, images)):
+                bbox, score, label = image[:3]
+                self.assertEqual(rec['im_id'], im_id)
+                np.testing.assert_array_equal(rec['bbox'], bbox)
+                np.testing.assert_array_equal(rec['score'], score)
+                np.testing.assert_array_equal(rec['label'], label)
+
+    def test_metric_streaming(self):
+        images = make_images(1, num_images=30)
+        batches = make_batches(images)
+        maps = []
+        for output_format in ['json', 'jsonl', 'bin']:
+            output_eval = os.path.join(self.root, output_format)
+            os.makedirs(output_eval)
+            metric = VOCMetric(
+                self.label_list,
+                class_num=3,
+                output_eval=output_eval,
+                output_format=output_format)
+            for inputs, outputs in batches:
+                metric.update(inputs, outputs)
+            if output_format != 'json':
+                self.assertEqual(metric.results['bbox'], [])
+            metric.accumulate()
+            maps.append(metric.get_results()['bbox'][0])
+
+            records = list(
+                load_voc_results(
+                    os.path.join(output_eval, 'bbox.' + output_format)))
+            if output_format == 'json':
+                self.assertEqual(len(records), len(batches))
+                continue
+            self.assertEqual([r['im_id'] for r in records],
+                             list(range(len(images))))
+            for rec, image in zip(records, images):
+                np.testing.assert_array_equal(rec['bbox'], image[0])
+        self.assertEqual(maps[0], maps[1])
+        self.assertEqual(maps[0], maps[2])
+
+    def test_offline_eval(self):
+        images = make_images(2, num_images=40)
+        dataset_dir = os.path.join(self.root, 'voc')
+        write_voc_dataset(dataset_dir, images)
+        output_eval = os.path.join(self.root, 'output')
+        os.makedirs(output_eval)
+
+        settings = [(0.5, '11point', False), (0.7, 'integral', True),
+                    ([0.5, 0.75], 'integral', False)]
+        for overlap_thresh, map_type, evaluate_difficult in settings:
+            metric = VOCMetric(
+                self.label_list,
+                class_num=3,
+                overlap_thresh=overlap_thresh,
+                map_type=map_type,
+                evaluate_difficult=evaluate_difficult,
+                output_eval=output_eval,
+                output_format='bin')
+            for inputs, outputs in make_batches(images):
+                metric.update(inputs, outputs)
+            metric.accumulate()
+
+            dataset = VOCDataSet(
+                dataset_dir=dataset_dir,
+                anno_path='val.txt',
+                label_list='label_list.txt',
+                data_fields=['image', 'gt_bbox', 'gt_class', 'difficult'],
+                allow_empty=True,
+                anno_cache_dir='.anno_cache')
+            detection_map = voc_eval_results(
+                os.path.join(output_eval, 'bbox.bin'),
+                dataset,
+                class_num=3,
+                overlap_thresh=overlap_thresh,
+                map_type=map_type,
+                evaluate_difficult=evaluate_difficult)
+            self.assertEqual(detection_map.get_map(),
+                             metric.get_results()['bbox'][0])
+            self.assertEqual(detection_map.mAPs,
+                             metric.detection_map.mAPs)
+
+        # the score threshold drops low score results
+        detection_map = voc_eval_results(
+            os.path.join(output_eval, 'bbox.bin'),
+            dataset,
+            class_num=3,
+            score_thresh=1.)
+        self.assertEqual(detection_map.get_map(), 0.)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,321 @@
+# Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import numpy as np
+
+from .map_utils import DetectionMAP
+from ppdet.data.source.category import get_categories
+from ppdet.utils.logger import setup_logger
+logger = setup_logger(__name__)
+
+__all__ = [
+    'VOCResultWriter', 'load_voc_results', 'find_voc_results',
+    'voc_eval_results', 'RESULT_FORMATS'
+]
+
+# file format to the file name of VOCMetric results, 'json' is the legacy
+# bbox.json dumped at once by accumulate
+RESULT_FORMATS = {
+    'json': 'bbox.json',
+    'jsonl': 'bbox.jsonl',
+    'bin': 'bbox.bin',
+}
+
+BIN_MAGIC = b'PPDETVOC'
+BIN_VERSION = 1
+# im_id, number of boxes
+BIN_HEADER_DTYPE = np.dtype('<i8')
+# label, score, xmin, ymin, xmax, ymax, the same as the bbox output
+BIN_ROW_DTYPE = np.dtype('<f4')
+
+
+def _result_format(path):
+    ext = os.path.splitext(path)[-1].lstrip('.')
+    if ext not in RESULT_FORMATS:
+        raise ValueError("Unknown result file {}, supported extensions are "
+                         "{}".format(path, list(RESULT_FORMATS.keys())))
+    return ext
+
+
+class VOCResultWriter(object):
+    """
+    Write detection results of each image incrementally, so results of a
+    long evaluation are never held in memory. Results are written to a
+    temporary file and renamed to `path` by `close`, a file at `path` is
+    always complete.
+
+    Format is decided by the extension of `path`:
+        .jsonl: one json object per image, {"im_id": int, "bbox": [[xmin,
+            ymin, xmax, ymax], ...], "score": [...], "label": [...]}.
+        .bin: a header of magic and version, then per image int64 im_id and
+            number of boxes N followed by float32 [N, 6] rows of label,
+            score, xmin, ymin, xmax, ymax.
+
+    Args:
+        path (str): output file, ends with .jsonl or .bin.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.format = _result_format(path)
+        assert self.format != 'json', \
+            "bbox.json is written at once, use .jsonl or .bin to stream"
+        out_dir = os.path.dirname(path)
+        if out_dir and not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+        self._tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        self._file = open(self._tmp_path, 'wb')
+        if self.format == 'bin':
+            self._file.write(BIN_MAGIC)
+            self._file.write(
+                np.array(
+                    [BIN_VERSION], dtype=BIN_HEADER_DTYPE).tobytes())
+        self.num_images = 0
+        self.num_boxes = 0
+
+    def write(self, im_id, bbox, score, label):
+        """
+        Write results of one image.
+
+        Args:
+            im_id (int|None): image id, None is written as -1.
+            bbox (np.ndarray): boxes [N, 4] of xmin, ymin, xmax, ymax.
+            score (np.ndarray): scores [N].
+            label (np.ndarray): class ids [N].
+        """
+        im_id = -1 if im_id is None else int(im_id)
+        bbox = np.asarray(bbox, dtype=np.float32).reshape(-1, 4)
+        score = np.asarray(score, dtype=np.float32).reshape(-1)
+        label = np.asarray(label).reshape(-1)
+        if self.format == 'jsonl':
+            line = json.dumps({
+                'im_id': im_id,
+                'bbox': bbox.tolist(),
+                'score': score.tolist(),
+                'label': label.astype(np.int64).tolist()
+            })
+            self._file.write(line.encode('utf-8') + b'\n')
+        else:
+            rows = np.concatenate(
+                [
+                    label.astype(BIN_ROW_DTYPE)[:, None],
+                    score[:, None].astype(BIN_ROW_DTYPE), bbox
+                ],
+                axis=1)
+            self._file.write(
+                np.array(
+                    [im_id, len(rows)], dtype=BIN_HEADER_DTYPE).tobytes())
+            self._file.write(rows.astype(BIN_ROW_DTYPE).tobytes())
+        self.num_images += 1
+        self.num_boxes += len(bbox)
+
+    def close(self):
+        """
+        Finish the file and move it to `path`.
+        """
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        """
+        Drop results written so far, e.g. the evaluation is interrupted.
+        """
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+
+def load_voc_results(path):
+    """
+    Load detection results written by VOCMetric, yield one dict per image
+    with keys im_id (int, -1 if unknown), bbox (float32 [N, 4]), score
+    (float32 [N]) and label (int64 [N]).
+
+    The legacy bbox.json holds results of each batch without the number of
+    boxes of each image, so each batch is yielded as one record of im_id -1.
+    """
+    fmt = _result_format(path)
+    if fmt == 'json':
+        with open(path, 'r') as f:
+            results = json.load(f)
+        for bbox, score, label in zip(results['bbox'], results['score'],
+                                      results['label']):
+            yield _make_record(-1, bbox, score, label)
+    elif fmt == 'jsonl':
+        with open(path, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                res = json.loads(line)
+                yield _make_record(res['im_id'], res['bbox'], res['score'],
+                                   res['label'])
+    else:
+        for rec in _load_bin(path):
+            yield rec
+
+
+def _make_record(im_id, bbox, score, label):
+    return {
+        'im_id': int(im_id),
+        'bbox': np.asarray(
+            bbox, dtype=np.float32).reshape(-1, 4),
+        'score': np.asarray(
+            score, dtype=np.float32).reshape(-1),
+        'label': np.asarray(
+            label, dtype=np.float64).reshape(-1).astype(np.int64)
+    }
+
+
+def _load_bin(path):
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    header_size = BIN_HEADER_DTYPE.itemsize
+    start = len(BIN_MAGIC) + header_size
+    if data[:len(BIN_MAGIC)].tobytes() != BIN_MAGIC:
+        raise ValueError("{} is not a VOC result file".format(path))
+    version = data[len(BIN_MAGIC):start].view(BIN_HEADER_DTYPE)[0]
+    if version != BIN_VERSION:
+        raise ValueError("Unsupported version {} of {}".format(version, path))
+
+    offset = start
+    while offset < len(data):
+        im_id, num = data[offset:offset + 2 * header_size].view(
+            BIN_HEADER_DTYPE)
+        offset += 2 * header_size
+        size = int(num) * 6 * BIN_ROW_DTYPE.itemsize
+        rows = data[offset:offset + size].view(BIN_ROW_DTYPE).reshape(-1, 6)
+        if len(rows) != num:
+            raise ValueError("{} is truncated".format(path))
+        offset += size
+        yield {
+            'im_id': int(im_id),
+            'bbox': np.array(rows[:, 2:]),
+            'score': np.array(rows[:, 1]),
+            'label': rows[:, 0].astype(np.int64)
+        }
+
+
+def find_voc_results(directory=None):
+    """
+    Return the VOC result file in `directory`, bbox.bin, bbox.jsonl and the
+    legacy bbox.json are searched in order, or None if there is none.
+    """
+    for fmt in ('bin', 'jsonl', 'json'):
+        path = os.path.join(directory or '.', RESULT_FORMATS[fmt])
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def voc_eval_results(pred_file,
+                     dataset,
+                     class_num,
+                     overlap_thresh=0.5,
+                     map_type='11point',
+                     evaluate_difficult=False,
+                     classwise=False,
+                     score_thresh=0.):
+    """
+    VOC eval with already saved detection results, the model is not run.
+
+    Ground truths are read from the roidb of `dataset`, which is served from
+    its annotation cache if `anno_cache_dir` is set, and matched with the
+    results by im_id. Only images found in `pred_file` are evaluated, the
+    same as evaluating online. Ground truths are taken from the annotations
+    instead of the transformed samples, boxes resized by the eval reader and
+    scaled back may differ in the last bits.
+
+    Args:
+        pred_file (str): result file written by VOCMetric, bbox.jsonl,
+            bbox.bin or the legacy bbox.json. Results in bbox.json have no
+            im_id, they are matched with the roidb in order, which is only
+            correct if they were saved with batch size 1.
+        dataset (DetDataset): the VOC dataset evaluated, needs 'image' in
+            data_fields for im_id.
+        class_num (int): number of classes.
+        overlap_thresh (float|list): see DetectionMAP.
+        map_type (str): see DetectionMAP.
+        evaluate_difficult (bool): see DetectionMAP.
+        classwise (bool): whether to log per-category AP and draw PR curves.
+        score_thresh (float): drop results with lower score, e.g. the draw
+            threshold of deployment.
+
+    Returns:
+        DetectionMAP: the accumulated metric.
+    """
+    assert os.path.isfile(pred_file), \
+            "The result file {} does not exist".format(pred_file)
+    dataset.check_or_download_dataset()
+    dataset.parse_dataset()
+    roidbs = dataset.roidbs
+    assert len(roidbs) > 0 and 'im_id' in roidbs[0], \
+            "im_id is not in roidbs, add 'image' to data_fields of the dataset"
+    _, catid2name = get_categories('VOC', dataset.get_label_list())
+    detection_map = DetectionMAP(
+        class_num=class_num,
+        overlap_thresh=overlap_thresh,
+        map_type=map_type,
+        evaluate_difficult=evaluate_difficult,
+        catid2name=catid2name,
+        classwise=classwise)
+
+    results = load_voc_results(pred_file)
+    if _result_format(pred_file) == 'json':
+        results = list(results)
+        if len(results) != len(roidbs):
+            raise ValueError(
+                "{} has results of {} batches but the dataset has {} images, "
+                "results of bbox.json can only be matched with batch size 1, "
+                "evaluate again with --output_format jsonl".format(
+                    pred_file, len(results), len(roidbs)))
+        logger.warning('Results in {} have no im_id, they are matched with '
+                       'images in order.'.format(pred_file))
+        id_to_idx = None
+    else:
+        id_to_idx = {
+            int(np.asarray(rec['im_id']).reshape(-1)[0]): i
+            for i, rec in enumerate(roidbs)
+        }
+
+    num_images, num_missing = 0, 0
+    for i, res in enumerate(results):
+        idx = i if id_to_idx is None else id_to_idx.get(res['im_id'])
+        if idx is None:
+            num_missing += 1
+            continue
+        rec = roidbs[idx]
+        gt_bbox = rec['gt_bbox']
+        gt_class = rec['gt_class']
+        difficult = rec.get('difficult', np.zeros_like(gt_class))
+        keep = res['score'] >= score_thresh
+        detection_map.update(res['bbox'][keep], res['score'][keep],
+                             res['label'][keep], gt_bbox, gt_class, None
+                             if evaluate_difficult else difficult)
+        num_images += 1
+    if num_missing > 0:
+        logger.warning('{} images in {} are not found in the dataset and '
+                       'ignored.'.format(num_missing, pred_file))
+    logger.info('Evaluated results of {} images in {}.'.format(num_images,
+                                                              pred_file))
+    detection_map.accumulate()
+    return detection_map
@@ -634,6 +634,31 @@ def multiclass_nms(bboxs, num_classes, match_threshold=0.6, match_metric='iou'):
     return final_boxes
 
 
+def batched_nms(bboxs, num_classes, match_threshold=0.6, match_metric='iou'):
+    """ NMS of all classes in one pass, boxes of each class are shifted by
+        class id times the extent of all boxes so boxes of different classes
+        never overlap. Same as np.concatenate(multiclass_nms(...)) except
+        the rounding of shifted coordinates and the order of equal scores.
+        Args:
+            bboxs: shape [N, 6], [class, score, x1, y1, x2, y2]
+            num_classes: boxes of class out of [0, num_classes) are dropped
+            match_metric: 'iou' or 'ios'
+            match_threshold: overlap thresh for match metric.
+    """
+    bboxs = bboxs[(bboxs[:, 0] >= 0) & (bboxs[:, 0] < num_classes)]
+    out_dtype = np.result_type(np.int64, bboxs.dtype)
+    if bboxs.shape[0] == 0:
+        return np.zeros((0, bboxs.shape[1]), dtype=out_dtype)
+    coords = bboxs[:, 2:]
+    extent = coords.max() - coords.min() + 2
+    shifted = bboxs[:, 1:].copy()
+    shifted[:, 1:] += (bboxs[:, :1] * extent).astype(bboxs.dtype)
+    keep = _nms_keep(shifted, match_threshold, match_metric)
+    # grouped by class as multiclass_nms
+    keep = keep[np.argsort(bboxs[keep, 0], kind='stable')]
+    return bboxs[keep].astype(out_dtype)
+
+
 def nms(dets, match_threshold=0.6, match_metric='iou'):
     """ Apply NMS to avoid detecting too many overlapping bounding boxes.
         Args:
@@ -641,6 +666,56 @@ def nms(dets, match_threshold=0.6, match_metric='iou'):
             match_metric: 'iou' or 'ios'
             match_threshold: overlap thresh for match metric.
     """
+    if dets.shape[0] == 0:
+        return dets[[], :]
+    keep = _nms_keep(dets, match_threshold, match_metric)
+    dets = dets[keep, :]
+    return dets
+
+
+def _nms_keep(dets, match_threshold, match_metric):
+    """ Indices of dets kept by greedy NMS in ascending order. Each kept box
+        is matched with all remaining boxes at once, in the same precision
+        as the scalar loop (e.g. float32 boxes are matched in float64).
+    """
+    if match_metric not in ('iou', 'ios'):
+        raise ValueError()
+    x1 = dets[:, 1]
+    y1 = dets[:, 2]
+    x2 = dets[:, 3]
+    y2 = dets[:, 4]
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    order = dets[:, 0].argsort()[::-1]
+    dtype = np.asarray(dets.dtype.type(0) + 1).dtype
+
+    suppressed = np.zeros((dets.shape[0]), dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        while order.size > 1:
+            i, rest = order[0], order[1:]
+            w = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])
+                 ).astype(dtype) + 1
+            h = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])
+                 ).astype(dtype) + 1
+            inter = np.where(w > 0, w, 0.) * np.where(h > 0, h, 0.)
+            if match_metric == 'iou':
+                union = (areas[i] + areas[rest]).astype(dtype) - inter
+                match_value = inter / union
+            else:
+                smaller = np.minimum(areas[i], areas[rest]).astype(dtype)
+                match_value = inter / smaller
+            matched = match_value >= match_threshold
+            suppressed[rest[matched]] = True
+            order = rest[~matched]
+    return np.where(~suppressed)[0]
+
+
+def _nms_reference(dets, match_threshold=0.6, match_metric='iou'):
+    """ The scalar loop of nms, kept as the reference of tests.
+        Args:
+            dets: shape [N, 5], [score, x1, y1, x2, y2]
+            match_metric: 'iou' or 'ios'
+            match_threshold: overlap thresh for match metric.
+    """
     if dets.shape[0] == 0:
         return dets[[], :]
     scores = dets[:, 0]
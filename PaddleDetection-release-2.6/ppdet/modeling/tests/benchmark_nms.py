@@ -0,0 +1,84 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Micro-benchmark of the NMS used to merge results of sliced images, e.g.
+
+    python ppdet/modeling/tests/benchmark_nms.py --num_boxes 100 500 2000
+"""
+
+from __future__ import print_function
+import os, sys
+# add python path of PaddleDetection to sys.path
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import time
+import argparse
+import numpy as np
+
+from ppdet.modeling.post_process import multiclass_nms, batched_nms, \
+        _nms_reference
+from ppdet.modeling.tests.test_nms import make_dets
+
+
+def timeit(func, dets, repeat):
+    costs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(dets)
+        costs.append(time.perf_counter() - start)
+    return min(costs) * 1000
+
+
+def reference_multiclass_nms(dets, num_classes, match_threshold,
+                             match_metric):
+    final_boxes = []
+    for c in range(num_classes):
+        r = _nms_reference(dets[dets[:, 0] == c, 1:], match_threshold,
+                           match_metric)
+        final_boxes.append(
+            np.concatenate([np.full((r.shape[0], 1), c), r], 1))
+    return final_boxes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--num_boxes', type=int, nargs='+', default=[100, 300, 1000, 3000])
+    parser.add_argument('--num_classes', type=int, default=2)
+    parser.add_argument('--match_threshold', type=float, default=0.6)
+    parser.add_argument('--match_metric', type=str, default='ios')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    nc, thresh, metric = args.num_classes, args.match_threshold, \
+            args.match_metric
+    for num_boxes in args.num_boxes:
+        dets = make_dets(0, num_boxes=num_boxes, num_classes=nc)
+        loop_ms = timeit(
+            lambda d: reference_multiclass_nms(d, nc, thresh, metric), dets,
+            args.repeat)
+        vec_ms = timeit(lambda d: multiclass_nms(d, nc, thresh, metric),
+                        dets, args.repeat)
+        batched_ms = timeit(lambda d: batched_nms(d, nc, thresh, metric),
+                            dets, args.repeat)
+        print('{} boxes: loop {:.2f} ms, vectorized {:.2f} ms ({:.1f}x), '
+              'batched {:.2f} ms ({:.1f}x)'.format(
+                  num_boxes, loop_ms, vec_ms, loop_ms / vec_ms, batched_ms,
+                  loop_ms / batched_ms))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os, sys
+# add python path of PaddleDetection to sys.path
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import importlib.util
+import unittest
+import numpy as np
+
+from ppdet.modeling.post_process import nms, multiclass_nms, batched_nms, \
+        _nms_reference
+
+
+def load_deploy_utils():
+    path = os.path.join(parent_path, 'deploy', 'python', 'utils.py')
+    spec = importlib.util.spec_from_file_location('deploy_utils', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_dets(seed,
+              num_boxes=200,
+              num_classes=3,
+              dtype=np.float32,
+              integer=False,
+              distinct_scores=False):
+    """
+    Random [class, score, x1, y1, x2, y2] boxes of clustered objects as
+    merged from sliced images, with repeated scores and exact duplicates.
+    """
+    rng = np.random.RandomState(seed)
+    centers = rng.rand(max(num_boxes // 8, 1), 2) * 600
+    ctr = centers[rng.randint(0, len(centers), num_boxes)]
+    ctr = ctr + rng.randn(num_boxes, 2) * 10
+    wh = rng.rand(num_boxes, 2) * 80 + 5
+    boxes = np.concatenate([ctr - wh / 2, ctr + wh / 2], axis=1)
+    if integer:
+        boxes = np.round(boxes)
+    if distinct_scores:
+        score = rng.permutation(num_boxes) / float(num_boxes)
+    else:
+        score = rng.choice([0.9, 0.6, 0.3, 0.1], num_boxes) + \
+                (rng.rand(num_boxes) < 0.5) * rng.rand(num_boxes)
+    label = rng.randint(0, num_classes, num_boxes)
+    dets = np.concatenate(
+        [label[:, None], score[:, None], boxes], axis=1).astype(dtype)
+    if num_boxes > 4:
+        dets[1] = dets[0]
+        dets[3, 2:] = dets[2, 2:]
+    return dets
+
+
+class TestNMS(unittest.TestCase):
+    def test_same_as_reference(self):
+        deploy_nms = load_deploy_utils().nms
+        for seed in range(20):
+            for dtype in [np.float32, np.float64]:
+                dets = make_dets(
+                    seed, num_boxes=[0, 1, 2, 30, 300][seed % 5],
+                    dtype=dtype, integer=seed % 2 == 0)[:, 1:]
+                for metric in ['iou', 'ios']:
+                    for thresh in [0.3, 0.5, 0.6, 0.9]:
+                        expect = _nms_reference(dets, thresh, metric)
+                        for func in [nms, deploy_nms]:
+                            out = func(dets, thresh, metric)
+                            self.assertEqual(out.dtype, expect.dtype)
+                            np.testing.assert_array_equal(out, expect)
+
+    def test_exact_threshold(self):
+        # iou of the two boxes is exactly 0.5 in float64, as in the loop
+        dets = np.array(
+            [[0.9, 0, 0, 9, 9], [0.8, 0, 0, 9, 19]], dtype=np.float32)
+        for thresh in [0.5, np.nextafter(0.5, 1)]:
+            np.testing.assert_array_equal(
+                nms(dets, thresh), _nms_reference(dets, thresh))
+
+    def test_batched(self):
+        deploy_utils = load_deploy_utils()
+        for seed in range(10):
+            dets = make_dets(seed, integer=True, distinct_scores=True)
+            for metric in ['iou', 'ios']:
+                expect = np.concatenate(
+                    multiclass_nms(dets, 3, 0.5, metric))
+                for func in [batched_nms, deploy_utils.batched_nms]:
+                    out = func(dets, 3, 0.5, metric)
+                    self.assertEqual(out.dtype, expect.dtype)
+                    np.testing.assert_array_equal(out, expect)
+        # boxes out of num_classes are dropped
+        dets = make_dets(0, num_classes=4)
+        out = batched_nms(dets, 3)
+        self.assertTrue((out[:, 0] < 3).all())
+        self.assertEqual(batched_nms(dets[:0], 3).shape, (0, 6))
+
+
+if __name__ == '__main__':
+    unittest.main()
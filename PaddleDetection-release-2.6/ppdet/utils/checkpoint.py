@@ -17,9 +17,14 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import copy
 import errno
 import os
+import re
+import pickle
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import paddle
 import paddle.nn as nn
@@ -241,7 +246,8 @@ def save_model(model,
                save_dir,
                save_name,
                last_epoch,
-               ema_model=None):
+               ema_model=None,
+               writer=None):
     """
     save model into disk.
 
@@ -253,26 +259,196 @@ def save_model(model,
         save_name (str): the path to be saved.
         last_epoch (int): the epoch index.
         ema_model (dict|None): the ema_model state_dict to save parameters.
+        writer (CheckpointWriter|None): if set, states are copied to host
+            and written by the writer in background.
     """
     if paddle.distributed.get_rank() != 0:
         return
     assert isinstance(model, dict), ("model is not a instance of dict, "
                                      "please call model.state_dict() to get.")
-    if not os.path.exists(save_dir):
-        os.makedirs(save_dir)
-    save_path = os.path.join(save_dir, save_name)
-    # save model
+    states = {}
     if ema_model is None:
-        paddle.save(model, save_path + ".pdparams")
+        states['.pdparams'] = model
     else:
         assert isinstance(ema_model,
                           dict), ("ema_model is not a instance of dict, "
                                   "please call model.state_dict() to get.")
         # Exchange model and ema_model to save
-        paddle.save(ema_model, save_path + ".pdparams")
-        paddle.save(model, save_path + ".pdema")
+        states['.pdparams'] = ema_model
+        states['.pdema'] = model
     # save optimizer
     state_dict = optimizer.state_dict()
     state_dict['last_epoch'] = last_epoch
-    paddle.save(state_dict, save_path + ".pdopt")
+    states['.pdopt'] = state_dict
+
+    if writer is not None:
+        writer.save(save_dir, save_name, states)
+        return
+    if not os.path.exists(save_dir):
+        os.makedirs(save_dir)
+    save_path = os.path.join(save_dir, save_name)
+    for ext, state in states.items():
+        paddle.save(state, save_path + ext)
     logger.info("Save checkpoint: {}".format(save_dir))
+
+
+def _host_state_dict(state_dict):
+    """
+    Copy tensors of `state_dict` to host, in the layout paddle.save pickles
+    it, so the copy is written to the same file later.
+    """
+    if not _is_state_dict(state_dict):
+        # e.g. states of optimizer with last_epoch, pickled as any object
+        return _host_copy(state_dict)
+    saved, name_table = {}, {}
+    for key, value in state_dict.items():
+        if isinstance(value, paddle.Tensor):
+            saved[key] = np.array(value.cpu())
+            name_table[key] = value.name
+        else:
+            saved[key] = copy.deepcopy(value)
+    saved['StructuredToParameterName@@'] = name_table
+    return saved
+
+
+def _is_state_dict(obj):
+    # values are tensors or dicts without tensors, the same as paddle.save
+    for value in obj.values():
+        if isinstance(value, dict):
+            if _contains_tensor(value):
+                return False
+        elif not isinstance(value, paddle.Tensor):
+            return False
+    return True
+
+
+def _contains_tensor(obj):
+    if isinstance(obj, paddle.Tensor):
+        return True
+    if isinstance(obj, dict):
+        return any(_contains_tensor(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_contains_tensor(v) for v in obj)
+    return False
+
+
+def _host_copy(obj):
+    if isinstance(obj, paddle.Tensor):
+        # paddle.save pickles a tensor as (name, data), which paddle.load
+        # turns back to a tensor
+        return (obj.name, np.array(obj.cpu()))
+    if isinstance(obj, dict):
+        return type(obj)((k, _host_copy(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_host_copy(v) for v in obj)
+    return copy.deepcopy(obj)
+
+
+def _save_atomic(obj, path):
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as f:
+            # the protocol of paddle.save
+            pickle.dump(obj, f, protocol=4)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class CheckpointWriter(object):
+    """
+    Write checkpoints in a background thread, the caller only waits for the
+    states to be copied to host memory.
+
+    Files are written to a temporary file and renamed, .pdparams last, so a
+    .pdparams file is always complete and the .pdopt (and .pdema) beside it
+    are of the same save. Errors of a background write are raised by the
+    next `save` or `wait`.
+
+    Args:
+        max_inflight (int): max number of checkpoints held in host memory
+            and not written yet, `save` blocks until one is written if
+            exceeded.
+        keep_last (int): keep only the last `keep_last` checkpoints of
+            numbered names (saved every snapshot_epoch), -1 to keep all.
+            model_final and best_model are always kept.
+    """
+
+    # .pdparams last, it marks the checkpoint as complete
+    WRITE_ORDER = ('.pdema', '.pdopt', '.pdparams')
+
+    def __init__(self, max_inflight=1, keep_last=-1):
+        assert max_inflight > 0, "max_inflight should be positive"
+        self.keep_last = keep_last
+        self._slots = threading.BoundedSemaphore(max_inflight)
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='ppdet_checkpoint')
+        self._futures = []
+
+    def save(self, save_dir, save_name, states):
+        """
+        Copy `states`, a dict of file extension to state dict, to host and
+        write them to `save_dir`/`save_name` + extension in background.
+        """
+        self._check()
+        self._slots.acquire()
+        try:
+            states = {
+                ext: _host_state_dict(state)
+                for ext, state in states.items()
+            }
+            future = self._executor.submit(self._write, save_dir, save_name,
+                                           states)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda f: self._slots.release())
+        self._futures.append(future)
+
+    def _write(self, save_dir, save_name, states):
+        if not os.path.exists(save_dir):
+            os.makedirs(save_dir)
+        save_path = os.path.join(save_dir, save_name)
+        for ext in sorted(states, key=self._order):
+            _save_atomic(states[ext], save_path + ext)
+        logger.info("Save checkpoint: {}".format(save_path))
+        if self.keep_last >= 0 and save_name.isdigit():
+            self._remove_old(save_dir)
+
+    def _order(self, ext):
+        return self.WRITE_ORDER.index(ext) if ext in self.WRITE_ORDER else -1
+
+    def _remove_old(self, save_dir):
+        epochs = sorted(
+            int(m.group(1))
+            for m in map(re.compile(r'^(\d+)\.pdparams$').match,
+                         os.listdir(save_dir)) if m)
+        stale = epochs[:-self.keep_last] if self.keep_last > 0 else epochs
+        for epoch in stale:
+            # .pdparams first, a checkpoint without it is not loaded
+            for ext in self.WRITE_ORDER[::-1]:
+                path = os.path.join(save_dir, '{}{}'.format(epoch, ext))
+                if os.path.exists(path):
+                    os.remove(path)
+            logger.info("Remove old checkpoint: {}".format(
+                os.path.join(save_dir, str(epoch))))
+
+    def _check(self):
+        done = [f for f in self._futures if f.done()]
+        self._futures = [f for f in self._futures if not f.done()]
+        for f in done:
+            f.result()
+
+    def wait(self):
+        """
+        Block until all checkpoints are written.
+        """
+        futures, self._futures = self._futures, []
+        for f in futures:
+            f.result()
+
+    def close(self):
+        self.wait()
+        self._executor.shutdown()
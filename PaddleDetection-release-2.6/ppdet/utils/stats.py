@@ -14,6 +14,7 @@
 
 import collections
 import numpy as np
+import paddle
 
 __all__ = ['SmoothedValue', 'TrainingStats']
 
@@ -62,10 +63,26 @@ class SmoothedValue(object):
 
 
 class TrainingStats(object):
-    def __init__(self, window_size, delimiter=' '):
+    """
+    Smoothed training losses of the last `window_size` steps.
+
+    Args:
+        window_size (int): number of steps the median is taken over.
+        delimiter (str): delimiter of the log string.
+        deferred (bool): keep loss tensors of each step on device and copy
+            them to host in one transfer when the stats are read by `get` or
+            `log` (or `window_size` steps are pending), instead of a
+            device-to-host sync per loss per step. The reported values are
+            the same.
+    """
+
+    def __init__(self, window_size, delimiter=' ', deferred=False):
         self.meters = None
         self.window_size = window_size
         self.delimiter = delimiter
+        self.deferred = deferred
+        # [(float64 tensor of the tensor losses, [python float or None])]
+        self._pending = []
 
     def update(self, stats):
         if self.meters is None:
@@ -73,10 +90,40 @@ class TrainingStats(object):
                 k: SmoothedValue(self.window_size)
                 for k in stats.keys()
             }
-        for k, v in self.meters.items():
-            v.update(float(stats[k]))
+        if not self.deferred:
+            for k, v in self.meters.items():
+                v.update(float(stats[k]))
+            return
+
+        values = [stats[k] for k in self.meters]
+        tensors = [
+            v.detach().astype('float64').reshape([-1]) for v in values
+            if isinstance(v, paddle.Tensor)
+        ]
+        row = paddle.concat(tensors) if tensors else None
+        scalars = [
+            None if isinstance(v, paddle.Tensor) else float(v) for v in values
+        ]
+        self._pending.append((row, scalars))
+        if len(self._pending) >= self.window_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Copy the pending losses to host and update the meters.
+        """
+        if not self._pending:
+            return
+        rows = [row for row, _ in self._pending if row is not None]
+        host = iter(paddle.stack(rows).numpy()) if rows else None
+        for row, scalars in self._pending:
+            values = iter(next(host)) if row is not None else None
+            for meter, v in zip(self.meters.values(), scalars):
+                meter.update(float(next(values)) if v is None else v)
+        self._pending = []
 
     def get(self, extras=None):
+        self.flush()
         stats = collections.OrderedDict()
         if extras:
             for k, v in extras.items():
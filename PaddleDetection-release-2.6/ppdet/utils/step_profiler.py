@@ -0,0 +1,283 @@
+# Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import csv
+import json
+import time
+import collections
+import numpy as np
+import paddle
+
+from ppdet.utils.logger import setup_logger
+logger = setup_logger(__name__)
+
+__all__ = ['StepProfiler', 'PHASES']
+
+# phases of a train step in order, 'other' is the time not marked
+PHASES = ('data', 'forward', 'backward', 'optimizer', 'ema', 'callback',
+          'other')
+
+FIELDS = ('epoch', 'step', 'time', 'step_ms') + tuple(
+    '{}_ms'.format(p) for p in PHASES) + ('queue', 'queue_capacity',
+                                           'inflight', 'worker_util')
+
+try:
+    _CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+except (AttributeError, ValueError, OSError):
+    _CLOCK_TICKS = None
+
+
+def _cpu_seconds(pid):
+    """
+    CPU time (user + system) of process `pid` from /proc, None if unknown.
+    """
+    if _CLOCK_TICKS is None:
+        return None
+    try:
+        with open('/proc/{}/stat'.format(pid), 'rb') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # fields after the command name, which may contain spaces
+    fields = stat[stat.rfind(b')') + 2:].split()
+    return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+
+
+class StepProfiler(object):
+    """
+    Always-on, low overhead profile of train steps.
+
+    Each step is split into the wall time of the phases in PHASES: `begin`
+    takes the data wait since the last step ended, `mark` adds the time
+    since the previous mark to a phase, and `end` closes the step. The
+    DataLoader is sampled at each step for the batches ready in its queue,
+    the batches in flight and the CPU utilization of its workers (Linux
+    only).
+
+    Host to device copies are made by the buffered reader of the
+    DataLoader in background, their wait is part of 'data'. Paddle runs
+    kernels asynchronously, so without `sync` the time of device work is
+    taken by the phase that waits for it (e.g. 'optimizer' or 'callback'
+    when losses are logged), set `sync` to synchronize the device at each
+    mark for exact phases at some cost of speed.
+
+    The last `capacity` steps are kept in a ring buffer and written to
+    `output` (.jsonl or .csv) at the end of each epoch, so the file holds at
+    most `capacity` rows. A stall report of the epoch is logged by
+    `epoch_end`.
+
+    Args:
+        loader (BaseDataLoader|None): the train loader sampled each step.
+        output (str|None): file of the steps, None to keep them in memory.
+        capacity (int): number of last steps kept.
+        sync (bool): whether to synchronize the device at each mark.
+        stall_ratio (float): a step is stalled if its data wait is longer
+            than this ratio of the step.
+        enable (bool): False to make every method a no-op.
+    """
+
+    def __init__(self,
+                 loader=None,
+                 output=None,
+                 capacity=10000,
+                 sync=False,
+                 stall_ratio=0.2,
+                 enable=True):
+        self.loader = loader
+        self.output = output
+        self.sync = sync and paddle.is_compiled_with_cuda()
+        self.stall_ratio = stall_ratio
+        self.enable = enable
+        if output is not None:
+            ext = os.path.splitext(output)[-1]
+            assert ext in ('.jsonl', '.csv'), \
+                "step profile should be .jsonl or .csv, got {}".format(output)
+        self.rows = collections.deque(maxlen=capacity)
+        self._index = {p: i for i, p in enumerate(PHASES)}
+        self._times = np.zeros(len(PHASES))
+        self._tic = None
+        self._last = None
+        self._step = None
+        self._workers_cpu = {}
+        self._reset_epoch()
+
+    def _reset_epoch(self):
+        self._epoch_times = np.zeros(len(PHASES))
+        self._epoch_data = []
+        self._epoch_queue = []
+        self._epoch_util = []
+        self._epoch_stalled = 0
+
+    def begin(self, epoch_id, step_id, tic):
+        """
+        Begin step `step_id`, `tic` is the time.time() the previous step
+        ended, the time since then is the data wait.
+        """
+        if not self.enable:
+            return
+        now = time.time()
+        self._times[:] = 0.
+        self._times[self._index['data']] = now - tic
+        self._tic = tic
+        self._last = now
+        self._step = (epoch_id, step_id)
+
+    def mark(self, phase):
+        """
+        Add the time since the previous mark to `phase`.
+        """
+        if not self.enable or self._last is None:
+            return
+        if self.sync:
+            paddle.device.synchronize()
+        now = time.time()
+        self._times[self._index[phase]] += now - self._last
+        self._last = now
+
+    def end(self):
+        """
+        End the step, return the time.time() it ended.
+        """
+        now = time.time()
+        if not self.enable or self._last is None:
+            return now
+        self._times[self._index['other']] += now - self._last
+        step_time = now - self._tic
+        queue, capacity, inflight, util = self._sample_loader(now)
+
+        times = self._times
+        self._epoch_times += times
+        data_time = times[self._index['data']]
+        self._epoch_data.append(data_time)
+        if data_time > self.stall_ratio * step_time:
+            self._epoch_stalled += 1
+        if queue is not None:
+            self._epoch_queue.append((queue, capacity))
+        if util is not None:
+            self._epoch_util.append(util)
+
+        epoch_id, step_id = self._step
+        self.rows.append((epoch_id, step_id, round(self._tic, 3),
+                          round(step_time * 1000, 3)) + tuple(
+                              round(float(t) * 1000, 3) for t in times) +
+                         (queue, capacity, inflight, None if util is None else
+                          round(util, 3)))
+        self._last = None
+        return now
+
+    def _sample_loader(self, now):
+        it = getattr(self.loader, 'loader', self.loader)
+        queue = capacity = inflight = util = None
+        blocking_queue = getattr(it, '_blocking_queue', None)
+        if blocking_queue is not None:
+            try:
+                queue = int(blocking_queue.size())
+                capacity = int(blocking_queue.capacity())
+            except Exception:
+                pass
+        if hasattr(it, '_send_idx') and hasattr(it, '_rcvd_idx'):
+            inflight = int(it._send_idx - it._rcvd_idx)
+
+        workers = getattr(it, '_workers', None) or []
+        cpu_wall, busy, num = 0., 0., 0
+        new_cpu = {}
+        for worker in workers:
+            cpu = _cpu_seconds(worker.pid)
+            if cpu is None:
+                continue
+            new_cpu[worker.pid] = (cpu, now)
+            if worker.pid in self._workers_cpu:
+                last_cpu, last_now = self._workers_cpu[worker.pid]
+                busy += cpu - last_cpu
+                cpu_wall += now - last_now
+                num += 1
+        # workers are restarted with the iterator of each epoch
+        self._workers_cpu = new_cpu
+        if num > 0 and cpu_wall > 0:
+            util = busy / cpu_wall
+        return queue, capacity, inflight, util
+
+    def epoch_end(self, epoch_id):
+        """
+        Log the stall report of the epoch and write the steps kept.
+        """
+        if not self.enable:
+            return
+        num_steps = len(self._epoch_data)
+        if num_steps > 0:
+            logger.info(self.report(epoch_id))
+        self._reset_epoch()
+        self.flush()
+
+    def report(self, epoch_id):
+        """
+        Return the stall report of the steps of the current epoch.
+        """
+        num_steps = len(self._epoch_data)
+        if num_steps == 0:
+            return 'Step profile of epoch {}: no steps'.format(epoch_id)
+        total = self._epoch_times.sum()
+        step_ms = total * 1000 / num_steps
+        phases = ', '.join('{} {:.1f}ms ({:.1%})'.format(
+            p, t * 1000 / num_steps, t / total if total > 0 else 0.)
+                           for p, t in zip(PHASES, self._epoch_times))
+        data = np.array(self._epoch_data) * 1000
+        p50, p95 = np.percentile(data, [50, 95])
+        lines = [
+            'Step profile of epoch {}, {} steps: {:.1f}ms/step, {}'.format(
+                epoch_id, num_steps, step_ms, phases),
+            'data wait p50 {:.1f}ms p95 {:.1f}ms, {:.1%} of steps stalled '
+            '(data wait > {:.0%} of the step)'.format(
+                p50, p95, self._epoch_stalled / num_steps, self.stall_ratio)
+        ]
+        loader = []
+        if self._epoch_queue:
+            queue = np.array(self._epoch_queue, dtype=np.float64)
+            loader.append('ready batches {:.1f}/{:.0f} on average, empty in '
+                          '{:.1%} of steps'.format(queue[:, 0].mean(), queue[:, 1]
+                                                   .max(), (queue[:, 0] == 0)
+                                                   .mean()))
+        if self._epoch_util:
+            loader.append('DataLoader worker utilization {:.1%}'.format(
+                np.mean(self._epoch_util)))
+        if loader:
+            lines.append(', '.join(loader))
+        data_share = self._epoch_times[self._index['data']] / total \
+                if total > 0 else 0.
+        if data_share > self.stall_ratio:
+            lines.append('input bound: {:.1%} of the time waits for data, '
+                         'consider more worker_num, cached decoding or '
+                         'lighter transforms'.format(data_share))
+        return '\n'.join(lines)
+
+    def flush(self):
+        """
+        Write the steps kept to `output`, replacing the file atomically.
+        """
+        if not self.enable or self.output is None:
+            return
+        out_dir = os.path.dirname(self.output)
+        if out_dir and not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+        tmp_path = '{}.{}.tmp'.format(self.output, os.getpid())
+        with open(tmp_path, 'w', newline='') as f:
+            if self.output.endswith('.csv'):
+                writer = csv.writer(f)
+                writer.writerow(FIELDS)
+                writer.writerows(self.rows)
+            else:
+                for row in self.rows:
+                    f.write(json.dumps(dict(zip(FIELDS, row))) + '\n')
+        os.replace(tmp_path, self.output)
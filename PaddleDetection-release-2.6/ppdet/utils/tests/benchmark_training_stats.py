@@ -0,0 +1,143 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Benchmark of the train step time with losses logged eagerly (a device to
+host copy of every loss every step) and deferred (one copy every log_iter
+steps), e.g.
+
+    python ppdet/utils/tests/benchmark_training_stats.py \
+        -c configs/picodet/runs/L1_picodet_1gpu.yml --steps 200
+    python ppdet/utils/tests/benchmark_training_stats.py \
+        -c configs/yolov3/runs/Y1_yolov3_1of3_1gpu.yml --steps 200 --use_vdl
+
+A few batches are loaded once and reused, so the data pipeline is not
+timed. With --use_vdl losses are also written by VisualDLWriter as in the
+runs of scripts/, eagerly every step or deferred every log_iter steps.
+"""
+
+from __future__ import print_function
+import os, sys
+# add python path of PaddleDetection to sys.path
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import tempfile
+import time
+
+import numpy as np
+import paddle
+
+from ppdet.core.workspace import load_config, merge_config
+from ppdet.engine import Trainer
+from ppdet.engine.callbacks import VisualDLWriter
+from ppdet.utils.cli import ArgsParser
+from ppdet.utils.stats import TrainingStats
+import ppdet.utils.check as check
+
+
+def synchronize():
+    if paddle.is_compiled_with_cuda():
+        paddle.device.cuda.synchronize()
+
+
+def timeit(trainer, batches, steps, deferred, vdl=None):
+    model, optimizer = trainer.model, trainer.optimizer
+    log_iter = trainer.cfg.log_iter
+    stats = TrainingStats(log_iter, deferred=deferred)
+    synchronize()
+    start = time.perf_counter()
+    for step_id in range(steps):
+        data = batches[step_id % len(batches)]
+        outputs = model(data)
+        outputs['loss'].backward()
+        optimizer.step()
+        optimizer.clear_grad()
+        stats.update(outputs)
+        if vdl is not None:
+            if deferred:
+                vdl.on_step_end({
+                    'mode': 'train',
+                    'step_id': step_id,
+                    'training_staus': stats
+                })
+            else:
+                # VisualDLWriter before deferred logging, a copy every step
+                for name, value in stats.get().items():
+                    vdl.vdl_writer.add_scalar(name, value, step_id)
+        if step_id % log_iter == 0:
+            stats.log()
+    stats.log()
+    synchronize()
+    return (time.perf_counter() - start) * 1000 / steps
+
+
+def main():
+    parser = ArgsParser()
+    parser.description = __doc__
+    parser.add_argument('--steps', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument(
+        '--num_batches',
+        type=int,
+        default=4,
+        help='number of batches loaded and reused')
+    parser.add_argument(
+        '--epoch_id',
+        type=int,
+        default=0,
+        help='epoch of the batches, e.g. to time steps after the static '
+        'assigner epochs of PicoDet')
+    parser.add_argument(
+        '--use_vdl',
+        action='store_true',
+        help='also write losses to VisualDL, as the runs of scripts/ do')
+    args = parser.parse_args()
+
+    cfg = load_config(args.config)
+    merge_config(args.opt)
+    paddle.set_device('gpu' if cfg.get('use_gpu', False) else 'cpu')
+    check.check_config(cfg)
+
+    trainer = Trainer(cfg, mode='train')
+    trainer.model.train()
+    vdl = None
+    if args.use_vdl:
+        cfg['vdl_log_dir'] = tempfile.mkdtemp()
+        vdl = VisualDLWriter(trainer)
+    batches = []
+    for data in trainer.loader:
+        data['epoch_id'] = args.epoch_id
+        batches.append(data)
+        if len(batches) >= args.num_batches:
+            break
+
+    timeit(trainer, batches, args.warmup, deferred=False, vdl=vdl)
+    costs = {False: [], True: []}
+    for _ in range(args.repeat):
+        for deferred in (False, True):
+            costs[deferred].append(
+                timeit(trainer, batches, args.steps, deferred, vdl))
+    eager, deferred = np.median(costs[False]), np.median(costs[True])
+    print('{}: batch_size {}, log_iter {}, {} steps x {}{}'.format(
+        args.config, cfg.TrainReader['batch_size'], cfg.log_iter, args.steps,
+        args.repeat, ', VisualDL' if vdl is not None else ''))
+    print('eager    {:8.2f} ms/step'.format(eager))
+    print('deferred {:8.2f} ms/step, speedup {:.3f}x'.format(
+        deferred, eager / deferred))
+
+
+if __name__ == '__main__':
+    main()
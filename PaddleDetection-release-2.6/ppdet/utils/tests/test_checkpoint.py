@@ -0,0 +1,143 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+import os, sys
+# add python path of PaddleDetection to sys.path
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import paddle
+
+from ppdet.utils.checkpoint import save_model, load_weight, CheckpointWriter
+
+
+def build_model():
+    paddle.seed(0)
+    model = paddle.nn.Sequential(
+        paddle.nn.Linear(4, 8), paddle.nn.ReLU(), paddle.nn.Linear(8, 2))
+    lr = paddle.optimizer.lr.StepDecay(0.1, step_size=2)
+    optimizer = paddle.optimizer.Momentum(
+        learning_rate=lr, parameters=model.parameters())
+    train_step(model, optimizer)
+    return model, optimizer
+
+
+def train_step(model, optimizer):
+    model(paddle.rand([3, 4])).sum().backward()
+    optimizer.step()
+    optimizer.clear_grad()
+
+
+class TestCheckpointWriter(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def read(self, name):
+        with open(os.path.join(self.root, name), 'rb') as f:
+            return f.read()
+
+    def test_same_as_sync(self):
+        model, optimizer = build_model()
+        ema = paddle.nn.Linear(4, 2).state_dict()
+        save_model(
+            model.state_dict(),
+            optimizer,
+            os.path.join(self.root, 'sync'),
+            'model_final',
+            3,
+            ema_model=ema)
+        writer = CheckpointWriter()
+        save_model(
+            model.state_dict(),
+            optimizer,
+            os.path.join(self.root, 'async'),
+            'model_final',
+            3,
+            ema_model=ema,
+            writer=writer)
+        writer.close()
+        for ext in ('.pdparams', '.pdema'):
+            self.assertEqual(
+                self.read('sync/model_final' + ext),
+                self.read('async/model_final' + ext))
+        sync = paddle.load(os.path.join(self.root, 'sync/model_final.pdopt'))
+        saved = paddle.load(
+            os.path.join(self.root, 'async/model_final.pdopt'))
+        self.assertEqual(list(saved.keys()), list(sync.keys()))
+        for k, v in sync.items():
+            if isinstance(v, paddle.Tensor):
+                self.assertEqual(saved[k].name, v.name)
+                np.testing.assert_array_equal(saved[k].numpy(), v.numpy())
+            else:
+                self.assertEqual(saved[k], v)
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.root, 'async'))),
+            ['model_final.pdema', 'model_final.pdopt', 'model_final.pdparams'])
+
+    def test_snapshot(self):
+        model, optimizer = build_model()
+        expect = {k: v.numpy() for k, v in model.state_dict().items()}
+        writer = CheckpointWriter()
+        save_model(
+            model.state_dict(), optimizer, self.root, '0', 1, writer=writer)
+        # training goes on while the checkpoint is written
+        train_step(model, optimizer)
+        writer.wait()
+        loaded = paddle.load(os.path.join(self.root, '0.pdparams'))
+        for k, v in expect.items():
+            np.testing.assert_array_equal(loaded[k].numpy(), v)
+
+        new_model, new_optimizer = build_model()
+        last_epoch = load_weight(new_model,
+                                 os.path.join(self.root, '0'), new_optimizer)
+        self.assertEqual(last_epoch, 1)
+        for k, v in new_model.state_dict().items():
+            np.testing.assert_array_equal(v.numpy(), expect[k])
+
+    def test_keep_last(self):
+        model, optimizer = build_model()
+        writer = CheckpointWriter(max_inflight=2, keep_last=2)
+        for name in ['0', 'best_model', '1', '2', '10', 'model_final']:
+            save_model(
+                model.state_dict(), optimizer, self.root, name, 1, writer=writer)
+        writer.close()
+        self.assertEqual(
+            sorted(os.listdir(self.root)),
+            sorted('{}{}'.format(name, ext)
+                   for name in ['2', '10', 'best_model', 'model_final']
+                   for ext in ('.pdparams', '.pdopt')))
+
+    def test_error(self):
+        model, optimizer = build_model()
+        save_dir = os.path.join(self.root, 'file')
+        open(save_dir, 'w').close()
+        writer = CheckpointWriter()
+        save_model(
+            model.state_dict(), optimizer, save_dir, '0', 1, writer=writer)
+        with self.assertRaises(OSError):
+            writer.wait()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+import os, sys
+# add python path of PaddleDetection to sys.path
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import unittest
+
+import numpy as np
+import paddle
+
+from ppdet.utils.stats import TrainingStats
+
+
+def make_outputs(rng, num_steps):
+    outputs = []
+    for _ in range(num_steps):
+        loss_cls = paddle.to_tensor(rng.rand(1).astype('float32'))
+        loss_box = paddle.to_tensor(np.float32(rng.rand() * 10))
+        loss_half = paddle.to_tensor(rng.rand(1).astype('float16'))
+        outputs.append({
+            'loss': loss_cls + loss_box,
+            'loss_cls': loss_cls,
+            'loss_box': loss_box,
+            'loss_half': loss_half,
+            'num_pos': float(rng.randint(100)),
+        })
+    return outputs
+
+
+class TestTrainingStats(unittest.TestCase):
+    def check_same(self, window_size, num_steps, log_iter):
+        rng = np.random.RandomState(window_size + num_steps)
+        eager = TrainingStats(window_size)
+        deferred = TrainingStats(window_size, deferred=True)
+        for step_id, outputs in enumerate(make_outputs(rng, num_steps)):
+            eager.update(outputs)
+            deferred.update(outputs)
+            self.assertLessEqual(len(deferred._pending), window_size)
+            if step_id % log_iter == 0:
+                self.assertEqual(deferred.log(), eager.log())
+        self.assertEqual(deferred.get(), eager.get())
+        for k, meter in eager.meters.items():
+            other = deferred.meters[k]
+            self.assertEqual(list(other.deque), list(meter.deque))
+            self.assertEqual(other.total, meter.total)
+            self.assertEqual(other.count, meter.count)
+
+    def test_same_as_eager(self):
+        self.check_same(window_size=20, num_steps=97, log_iter=20)
+        self.check_same(window_size=20, num_steps=97, log_iter=7)
+        self.check_same(window_size=5, num_steps=50, log_iter=100)
+        self.check_same(window_size=1, num_steps=10, log_iter=1)
+
+    def test_no_graph_kept(self):
+        x = paddle.ones([1])
+        x.stop_gradient = False
+        stats = TrainingStats(10, deferred=True)
+        stats.update({'loss': (x * 2).sum()})
+        row, _ = stats._pending[0]
+        self.assertTrue(row.stop_gradient)
+        self.assertEqual(stats.get(), {'loss': '2.000000'})
+        self.assertEqual(stats._pending, [])
+
+    def test_extras(self):
+        stats = TrainingStats(10, deferred=True)
+        stats.update({'loss': paddle.to_tensor([0.5])})
+        self.assertEqual(
+            stats.log(extras={'lr': 0.1}), 'lr: 0.1 loss: 0.500000')
+
+
+if __name__ == '__main__':
+    unittest.main()
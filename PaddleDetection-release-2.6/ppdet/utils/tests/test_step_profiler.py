@@ -0,0 +1,150 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+import os, sys
+# add python path of PaddleDetection to sys.path
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+import csv
+import json
+import shutil
+import tempfile
+import time
+import unittest
+
+from unittest import mock
+
+import numpy as np
+import paddle
+
+from ppdet.utils import step_profiler
+from ppdet.utils.step_profiler import StepProfiler, PHASES
+
+
+class ToyDataset(paddle.io.Dataset):
+    def __len__(self):
+        return 32
+
+    def __getitem__(self, idx):
+        return np.full([3, 4, 4], idx, dtype='float32')
+
+
+class FakeWorker(object):
+    def __init__(self, pid):
+        self.pid = pid
+
+
+class FakeLoader(object):
+    def __init__(self, pids):
+        self._workers = [FakeWorker(pid) for pid in pids]
+
+
+def run_steps(prof, loader, epoch_id, num_steps, step_sleep):
+    tic = time.time()
+    for step_id, data in enumerate(loader):
+        if step_id >= num_steps:
+            break
+        prof.begin(epoch_id, step_id, tic)
+        time.sleep(step_sleep)
+        prof.mark('forward')
+        prof.mark('backward')
+        prof.mark('optimizer')
+        tic = prof.end()
+
+
+class TestStepProfiler(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_phases(self):
+        output = os.path.join(self.root, 'profile.jsonl')
+        prof = StepProfiler(output=output, capacity=5)
+        tic = time.time()
+        for step_id in range(8):
+            time.sleep(0.02)
+            prof.begin(0, step_id, tic)
+            time.sleep(0.01)
+            prof.mark('forward')
+            prof.mark('ema')
+            tic = prof.end()
+        report = prof.report(0)
+        self.assertIn('8 steps', report)
+        self.assertIn('input bound', report)
+        prof.epoch_end(0)
+
+        with open(output) as f:
+            rows = [json.loads(line) for line in f]
+        # ring buffer of the last steps
+        self.assertEqual([r['step'] for r in rows], [3, 4, 5, 6, 7])
+        for r in rows:
+            self.assertGreaterEqual(r['data_ms'], 15)
+            self.assertGreaterEqual(r['forward_ms'], 8)
+            self.assertAlmostEqual(
+                sum(r['{}_ms'.format(p)] for p in PHASES),
+                r['step_ms'],
+                delta=0.1)
+            self.assertIsNone(r['queue'])
+
+    def test_loader(self):
+        output = os.path.join(self.root, 'profile.csv')
+        prof = StepProfiler(output=output)
+        loader = paddle.io.DataLoader(
+            ToyDataset(), batch_size=2, num_workers=2)
+        it = iter(loader)
+        prof.loader = it
+        run_steps(prof, it, 0, 12, 0.)
+        report = prof.report(0)
+        prof.epoch_end(0)
+        with open(output) as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), 12)
+        self.assertTrue(all(r['queue'] != '' for r in rows))
+        self.assertTrue(all(int(r['queue_capacity']) > 0 for r in rows))
+        if sys.platform.startswith('linux'):
+            self.assertIn('worker utilization', report)
+
+    def test_worker_util(self):
+        prof = StepProfiler(loader=FakeLoader([11, 12]))
+        cpu = {11: 1.0, 12: 2.0}
+        with mock.patch.object(step_profiler, '_cpu_seconds', cpu.get):
+            self.assertIsNone(prof._sample_loader(100.)[3])
+            # one worker busy all the time, the other idle
+            cpu[11] += 2.0
+            self.assertAlmostEqual(prof._sample_loader(102.)[3], 0.5)
+            # a restarted worker is not compared with the old one
+            prof.loader = FakeLoader([13])
+            cpu[13] = 5.0
+            self.assertIsNone(prof._sample_loader(103.)[3])
+            cpu[13] += 0.5
+            self.assertAlmostEqual(prof._sample_loader(104.)[3], 0.5)
+
+    def test_disable(self):
+        output = os.path.join(self.root, 'profile.jsonl')
+        prof = StepProfiler(output=output, enable=False)
+        tic = time.time()
+        prof.begin(0, 0, tic)
+        prof.mark('forward')
+        self.assertGreaterEqual(prof.end(), tic)
+        prof.epoch_end(0)
+        self.assertFalse(os.path.exists(output))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+"""
+多实验并行调度器
+================
+供 run_experiments_round2.py / run_lightweight.py / run_yolov3.py 共用：
+把 RUNS 当作任务队列，按每个任务的资源需求把可以并行的实验装到空闲 GPU 上。
+
+资源需求（RUNS 中每个实验的字段）：
+  num_gpus  需要的卡数（默认 1），分布式实验 >1
+  mem_gb    每张卡需要的显存 GB（可选）。不写则独占整卡；写了则可与其他
+            写了 mem_gb 的实验共用一张卡，只要显存装得下
+
+调度规则：
+  - 按 RUNS 顺序排队，排在前面的放不下时，后面放得下的先跑（回填）
+  - 每轮调度用 nvidia-smi 查询空闲显存：独占任务要求卡上几乎没有占用，
+    共享任务要求空闲显存 ≥ mem_gb，外部进程占用的卡不会被分配
+  - 分配到的物理卡通过 CUDA_VISIBLE_DEVICES 传给训练进程，分布式实验的
+    launch 日志写到 output/{run_name}/log/，多个实验互不覆盖 workerlog.0
+
+断点续跑：
+  - 队列状态写入 output/{launcher}_queue.json（原子替换），替代 DONE 标志文件；
+    已有 DONE 标志的实验在首次读取时记为已完成
+  - 训练进程 start_new_session=True，调度器退出后继续运行，退出码由外层
+    shell 写入 output/{run_name}/exit_code
+  - 重新启动时：仍在运行的实验被接管；已退出的按 exit_code 收尾；没有
+    exit_code 的（机器重启、kill -9）重新排队；失败的实验重新排队
+
+测试（无 GPU 也可运行）：
+  --dry-run 使用模拟的 GPU（--sim-gpus / --sim-mem-gb），每个实验只 sleep
+  --sim-seconds 秒，状态、日志与汇总 CSV 写到 output/dry_run/，不影响真实结果
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+BASE_DIR = Path(__file__).resolve().parent.parent   # PaddleDetection-release-2.6/
+PYTHON = sys.executable
+OUTPUT_DIR = BASE_DIR / "output"
+DRY_RUN_DIR = OUTPUT_DIR / "dry_run"
+
+STATE_VERSION = 1
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+# 独占任务要求卡上其他进程占用的显存不超过此值（驱动、显示等常驻占用）
+IDLE_MEM_GB = 1.0
+
+# 模拟训练：打印将要执行的命令并 sleep
+SIM_SCRIPT = (
+    "import os, sys, time\n"
+    "seconds, code = float(sys.argv[1]), int(sys.argv[2])\n"
+    "print(f\"[dry-run] CUDA_VISIBLE_DEVICES={os.environ['CUDA_VISIBLE_DEVICES']}\", flush=True)\n"
+    "print('[dry-run] ' + ' '.join(sys.argv[3:]), flush=True)\n"
+    "time.sleep(seconds)\n"
+    "sys.exit(code)\n"
+)
+
+
+# ──────────────────────────────────────────────
+# 设备
+# ──────────────────────────────────────────────
+def query_gpus(indices=None) -> list:
+    """用 nvidia-smi 查询 GPU，返回 [{"index", "total_gb", "free_gb"}]。"""
+    out = subprocess.run(
+        ["nvidia-smi", "--query-gpu=index,memory.total,memory.free",
+         "--format=csv,noheader,nounits"],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    gpus = []
+    for line in out.strip().splitlines():
+        index, total, free = [x.strip() for x in line.split(",")]
+        if indices is not None and int(index) not in indices:
+            continue
+        gpus.append({
+            "index": int(index),
+            "total_gb": float(total) / 1024,
+            "free_gb": float(free) / 1024,
+        })
+    return gpus
+
+
+def simulated_gpus(num: int, mem_gb: float) -> list:
+    return [{"index": i, "total_gb": mem_gb, "free_gb": mem_gb}
+            for i in range(num)]
+
+
+def parse_indices(spec):
+    if spec is None or spec.strip() in ("", "all"):
+        return None
+    return {int(x) for x in spec.split(",") if x.strip()}
+
+
+def gpus_needed(run: dict) -> int:
+    return int(run.get("num_gpus", 1))
+
+
+# ──────────────────────────────────────────────
+# 进程
+# ──────────────────────────────────────────────
+def process_start_time(pid: int):
+    """进程启动时刻（/proc 中的 jiffies），用于识别 PID 复用，未知时为 None。"""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # 命令名可能包含空格，从最后一个 ')' 之后取字段
+    return int(stat[stat.rfind(b")") + 2:].split()[19])
+
+
+def process_alive(pid, start_time=None) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    if start_time is not None:
+        return process_start_time(pid) == start_time
+    return True
+
+
+# ──────────────────────────────────────────────
+# 日志解析
+# ──────────────────────────────────────────────
+def extract_metrics(run_dir: Path) -> tuple:
+    """从 train.log 或分布式 log/workerlog.0 中提取 best_mAP（%）和 eval FPS。"""
+    best_ap = None
+    fps = None
+    # 分布式训练时实际日志写入 launch 的 log_dir，非分布式写入 train.log
+    for candidate in [run_dir / "train.log", run_dir / "log" / "workerlog.0"]:
+        try:
+            with open(candidate, "r", errors="replace") as f:
+                for line in f:
+                    m = re.search(r"Best test bbox ap is ([\d]+\.[\d]+)", line)
+                    if m:
+                        best_ap = float(m.group(1))
+                    m = re.search(r"average FPS: ([\d.]+)", line)
+                    if m:
+                        fps = float(m.group(1))
+        except FileNotFoundError:
+            pass
+    best_map = round(best_ap * 100, 2) if best_ap is not None else None
+    return best_map, fps
+
+
+# ──────────────────────────────────────────────
+# 命令行参数
+# ──────────────────────────────────────────────
+def add_scheduler_args(parser):
+    group = parser.add_argument_group("调度")
+    group.add_argument(
+        "--max-parallel", type=int, default=0,
+        help="最多同时运行的实验数，0 为不限（只受 GPU 限制）",
+    )
+    group.add_argument(
+        "--gpus", default=None,
+        help="可用的物理 GPU，逗号分隔（默认 CUDA_VISIBLE_DEVICES 或全部）",
+    )
+    group.add_argument(
+        "--poll", type=float, default=30,
+        help="检查实验状态的间隔秒数（dry-run 下为 0.5）",
+    )
+    group.add_argument(
+        "--rerun", default=None,
+        help="重新运行已完成的实验，逗号分隔的 ID（例：--rerun C2）",
+    )
+    group.add_argument(
+        "--status", action="store_true",
+        help="只打印队列状态，不启动实验",
+    )
+    group.add_argument(
+        "--dry-run", action="store_true",
+        help="模拟 GPU，只 sleep 不训练，状态与汇总写到 output/dry_run/",
+    )
+    group.add_argument("--sim-gpus", type=int, default=2,
+                       help="dry-run 模拟的 GPU 数")
+    group.add_argument("--sim-mem-gb", type=float, default=24,
+                       help="dry-run 模拟的每卡显存 GB")
+    group.add_argument("--sim-seconds", type=float, default=5,
+                       help="dry-run 中每个实验的模拟时长（秒）")
+    group.add_argument("--sim-fail", default=None,
+                       help="dry-run 中模拟失败的实验 ID，逗号分隔")
+
+
+# ──────────────────────────────────────────────
+# 调度器
+# ──────────────────────────────────────────────
+class ExperimentScheduler:
+    """
+    把 runs 作为任务队列装到空闲 GPU 上并行运行。
+
+    build_cmd(run, gpus, log_dir) 返回训练命令，gpus 为分配到的物理卡
+    （"0,1"），log_dir 为分布式 launch 的日志目录；on_finish(run, result)
+    在每个实验结束后调用一次，result 包含 exit_code、duration_h、run_dir、
+    log_path 与 gpus。
+    """
+
+    def __init__(self, runs, name, build_cmd, on_finish, args):
+        self.runs = list(runs)
+        self.build_cmd = build_cmd
+        self.on_finish = on_finish
+        self.max_parallel = args.max_parallel
+        self.dry_run = args.dry_run
+        self.output_dir = DRY_RUN_DIR if self.dry_run else OUTPUT_DIR
+        self.state_path = self.output_dir / f"{name}_queue.json"
+        self.poll_interval = 0.5 if self.dry_run else args.poll
+        self.sim_seconds = args.sim_seconds
+        self.sim_fail = {x.strip() for x in (args.sim_fail or "").split(",")
+                         if x.strip()}
+
+        if self.dry_run:
+            self.devices = simulated_gpus(args.sim_gpus, args.sim_mem_gb)
+            self.indices = None
+        else:
+            self.indices = parse_indices(
+                args.gpus or os.environ.get("CUDA_VISIBLE_DEVICES"))
+            self.devices = None  # 启动时再查询，--status 不需要 GPU
+
+        self._procs = {}
+        self.state = self._load_state()
+        rerun = {x.strip() for x in (args.rerun or "").split(",") if x.strip()}
+        for run in self.runs:
+            job = self.state["jobs"].get(run["id"])
+            if job is None:
+                # 迁移：旧启动器写的 DONE 标志视为已完成
+                done = (self.output_dir / run["name"] / "DONE").exists()
+                job = {"name": run["name"], "status": DONE if done else PENDING}
+                self.state["jobs"][run["id"]] = job
+            if run["id"] in rerun and job["status"] != RUNNING:
+                job["status"] = PENDING
+            elif job["status"] == FAILED:
+                job["status"] = PENDING
+
+    # ── 状态持久化 ──
+    def _load_state(self):
+        if self.state_path.exists():
+            with open(self.state_path) as f:
+                state = json.load(f)
+            if state.get("version") == STATE_VERSION:
+                return state
+            print(f"[WARN] 队列状态版本不符，忽略: {self.state_path}")
+        return {"version": STATE_VERSION, "jobs": {}}
+
+    def _save_state(self):
+        self.state["updated"] = datetime.now().isoformat()
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_name(self.state_path.name + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.state, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.state_path)
+
+    def _lock(self):
+        """同一个队列只允许一个调度器，返回持有的锁文件。"""
+        if fcntl is None:
+            return None
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.state_path.with_name(self.state_path.name + ".lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            print(f"[ERROR] 另一个调度器正在使用 {self.state_path}")
+            sys.exit(1)
+        return lock_file
+
+    def job(self, run: dict) -> dict:
+        return self.state["jobs"][run["id"]]
+
+    def run_dir(self, run: dict) -> Path:
+        return self.output_dir / run["name"]
+
+    def status(self, run: dict) -> str:
+        """计划表中显示的状态。"""
+        job = self.job(run)
+        if job["status"] == DONE:
+            return "已完成"
+        if job["status"] == RUNNING:
+            if process_alive(job.get("pid"), job.get("pid_start")):
+                return f"运行中 GPU {job['gpus']} PID {job['pid']}"
+            return "已中断，待收尾"
+        if job.get("exit_code") not in (None, 0):
+            return f"待运行（上次失败 exit_code={job['exit_code']}）"
+        return "待运行"
+
+    # ── 设备分配 ──
+    def _free_memory(self):
+        if self.dry_run:
+            return {d["index"]: d["total_gb"] for d in self.devices}
+        return {d["index"]: d["free_gb"] for d in query_gpus(self.indices)}
+
+    def _claims(self):
+        """运行中的实验占用的卡：index -> [mem_gb 或 None（独占）]。"""
+        claims = {d["index"]: [] for d in self.devices}
+        for run in self.runs:
+            job = self.job(run)
+            if job["status"] != RUNNING:
+                continue
+            for index in job["devices"]:
+                if index in claims:
+                    claims[index].append(run.get("mem_gb"))
+        return claims
+
+    def _check_fits(self, run: dict):
+        """返回实验永远无法运行的原因，能运行时为 None。"""
+        need = gpus_needed(run)
+        if need > len(self.devices):
+            return f"需要 {need} 张卡，可用 {len(self.devices)} 张"
+        mem = run.get("mem_gb")
+        if mem is not None and mem > max(d["total_gb"] for d in self.devices):
+            return f"需要 {mem} GB 显存，超过单卡容量"
+        return None
+
+    def _place(self, run: dict, free: dict, claims: dict):
+        """为实验挑选空闲的卡，放不下时返回 None。"""
+        mem = run.get("mem_gb")
+        candidates = []
+        for dev in self.devices:
+            index, total = dev["index"], dev["total_gb"]
+            claim = claims[index]
+            if mem is None:
+                # 独占：没有本调度器的实验，也没有外部进程占用
+                idle = total - IDLE_MEM_GB if not self.dry_run else total
+                ok = not claim and free[index] >= idle
+            else:
+                # 共享：卡上的实验都声明了 mem_gb，且实测空闲显存足够
+                used = sum(claim) if None not in claim else total
+                ok = used + mem <= total and free[index] >= mem
+            if ok:
+                candidates.append((-len(claim), index))
+        if len(candidates) < gpus_needed(run):
+            return None
+        # 优先装到已被共享的卡上，把整卡留给独占实验
+        candidates.sort()
+        return sorted(index for _, index in candidates[:gpus_needed(run)])
+
+    # ── 启动与收尾 ──
+    def _launch(self, run: dict, devices: list):
+        name = run["name"]
+        job = self.job(run)
+        run_dir = self.run_dir(run)
+        log_path = run_dir / "train.log"
+        exit_path = run_dir / "exit_code"
+        run_dir.mkdir(parents=True, exist_ok=True)
+        if exit_path.exists():
+            exit_path.unlink()
+
+        gpus = ",".join(str(i) for i in devices)
+        log_dir = os.path.relpath(run_dir / "log", BASE_DIR)
+        cmd = self.build_cmd(run, gpus, log_dir)
+        cmd_str = " ".join(cmd)
+        if self.dry_run:
+            code = 1 if run["id"] in self.sim_fail else 0
+            cmd = [PYTHON, "-c", SIM_SCRIPT, str(self.sim_seconds), str(code)] + cmd
+
+        env = os.environ.copy()
+        env["CUDA_VISIBLE_DEVICES"] = gpus
+        env["NCCL_IB_DISABLE"] = "1"          # TCP fallback 静默
+
+        print(f"\n{'='*64}")
+        print(f"[START] {run['id']} - {name}  ({run['desc']})")
+        print(f"  配置: {run['cfg']}")
+        print(f"  GPU:  {gpus}")
+        print(f"  日志: tail -f {log_path}")
+        print(f"  VDL:  visualdl --logdir {run_dir}/vdl_log --host 0.0.0.0 --port 8040")
+        print(f"{'='*64}")
+
+        log_file = open(log_path, "w", buffering=1)
+        log_file.write(f"# 启动时间:  {datetime.now().isoformat()}\n")
+        log_file.write(f"# 轮次:      {run['id']} - {name}\n")
+        log_file.write(f"# 描述:      {run['desc']}\n")
+        log_file.write(f"# GPU:       {gpus}\n")
+        log_file.write(f"# 命令:      {cmd_str}\n")
+        log_file.write(f"# {'='*58}\n\n")
+        log_file.flush()
+
+        # 外层 shell 在训练结束后写入退出码，调度器重启后仍能收尾
+        proc = subprocess.Popen(
+            ["/bin/sh", "-c",
+             '"$@"; code=$?; echo $code > "$0.tmp" && mv "$0.tmp" "$0"; exit $code',
+             str(exit_path)] + cmd,
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            cwd=str(BASE_DIR),
+            start_new_session=True,    # 子进程加入独立 session，调度器退出不影响它
+            env=env,
+        )
+        log_file.close()
+        (run_dir / "train.pid").write_text(str(proc.pid))
+        print(f"  PID:  {proc.pid}  (kill: kill -- -{proc.pid})")
+
+        self._procs[run["id"]] = proc
+        job.update({
+            "status": RUNNING,
+            "devices": devices,
+            "gpus": gpus,
+            "pid": proc.pid,
+            "pid_start": process_start_time(proc.pid),
+            "start_time": time.time(),
+            "exit_code": None,
+            "attempts": job.get("attempts", 0) + 1,
+        })
+        self._save_state()
+
+    def _poll(self, run: dict) -> bool:
+        """检查运行中的实验，已结束时收尾并返回 True。"""
+        job = self.job(run)
+        proc = self._procs.get(run["id"])
+        exit_path = self.run_dir(run) / "exit_code"
+        if proc is not None:
+            ret = proc.poll()
+            if ret is None:
+                return False
+            del self._procs[run["id"]]
+        elif process_alive(job.get("pid"), job.get("pid_start")):
+            return False
+        else:
+            ret = None
+
+        if exit_path.exists() and exit_path.read_text().strip():
+            ret = int(exit_path.read_text())
+        if ret is None:
+            # 调度器接管的实验在没有退出码时中断（如机器重启），重新排队
+            print(f"\n[REQUEUE] {run['name']}  进程 {job.get('pid')} 已不存在且没有退出码")
+            job.update({"status": PENDING, "pid": None})
+            self._save_state()
+            return True
+
+        duration_h = (time.time() - job["start_time"]) / 3600
+        job.update({
+            "status": DONE if ret == 0 else FAILED,
+            "exit_code": ret,
+            "end_time": time.time(),
+            "duration_h": round(duration_h, 2),
+            "pid": None,
+        })
+        # 先落盘状态：收尾中途崩溃时宁可重复一行汇总，也不重复训练
+        self._save_state()
+        log_path = self.run_dir(run) / "train.log"
+        if ret == 0:
+            print(f"\n[DONE] {run['id']} - {run['name']}  耗时 = {duration_h:.2f}h")
+        else:
+            print(f"\n[FAIL] {run['id']} - {run['name']}  exit_code={ret}  耗时={duration_h:.2f}h")
+            print(f"  查看日志: tail -n 40 {log_path}")
+        self.on_finish(run, {
+            "exit_code": ret,
+            "duration_h": duration_h,
+            "run_dir": self.run_dir(run),
+            "log_path": log_path,
+            "gpus": job["gpus"],
+        })
+        return True
+
+    def _schedule(self):
+        pending = [r for r in self.runs if self.job(r)["status"] == PENDING]
+        running = [r for r in self.runs if self.job(r)["status"] == RUNNING]
+        if not pending:
+            return
+        if self.max_parallel > 0 and len(running) >= self.max_parallel:
+            return
+        free = self._free_memory()
+        claims = self._claims()
+        for run in pending:
+            devices = self._place(run, free, claims)
+            if devices is None:
+                continue
+            self._launch(run, devices)
+            # 新启动的实验还没申请显存，按声明扣除，避免同一轮重复分配
+            mem = run.get("mem_gb")
+            for index in devices:
+                claims[index].append(mem)
+                free[index] = 0. if mem is None else free[index] - mem
+            running.append(run)
+            if self.max_parallel > 0 and len(running) >= self.max_parallel:
+                break
+
+    def run(self) -> bool:
+        """运行队列直到所有实验结束，全部成功时返回 True。"""
+        if self.devices is None:
+            try:
+                self.devices = query_gpus(self.indices)
+            except (OSError, subprocess.CalledProcessError) as e:
+                print(f"[ERROR] nvidia-smi 查询 GPU 失败（{e}），无 GPU 时可用 --dry-run 测试")
+                sys.exit(1)
+        lock = self._lock()
+        print(f"可用 GPU: " + ", ".join(
+            f"{d['index']}（{d['total_gb']:.0f}GB）" for d in self.devices))
+
+        for run in self.runs:
+            job = self.job(run)
+            reason = self._check_fits(run)
+            if job["status"] == PENDING and reason:
+                print(f"[FAIL] {run['id']} - {run['name']}  {reason}")
+                job.update({"status": FAILED, "exit_code": None})
+        self._save_state()
+
+        try:
+            while True:
+                for run in self.runs:
+                    if self.job(run)["status"] == RUNNING:
+                        self._poll(run)
+                self._schedule()
+                if not any(self.job(r)["status"] in (PENDING, RUNNING)
+                           for r in self.runs):
+                    break
+                time.sleep(self.poll_interval)
+        except KeyboardInterrupt:
+            self._save_state()
+            print(f"\n调度器退出，运行中的实验继续，重新启动本脚本即可接管（{self.state_path}）")
+            return False
+        finally:
+            if lock is not None:
+                lock.close()
+        return all(self.job(r)["status"] == DONE for r in self.runs)
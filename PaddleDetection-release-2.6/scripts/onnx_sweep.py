@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+ONNX 模型精度-延迟对比（FP32 vs INT8）
+======================================
+对一组 ONNX 模型（如 onnx_quantize.py 生成的 INT8 QDQ 模型与原 FP32 模型）：
+  - 在 VOC 验证集（默认 dataset/mouse_other_voc/val.txt）上按 infer_cfg.yml
+    的真实预处理推理，用 ppdet 的 DetectionMAP 计算 mAP
+  - 在多个线程数下测量预热后的推理延迟 p50/p95/p99 与吞吐
+  - 结果写入一张对比表 output/onnx_sweep.csv（与 round2_summary.csv 同目录）
+
+推理复用 deploy/python/infer.py 的 OnnxDetector（预处理、IOBinding、固定
+batch 模型的分块），因此与部署时的行为一致。
+
+用法：
+  cd /hy-tmp/paddle_detection_mouse/PaddleDetection-release-2.6
+
+  python scripts/onnx_sweep.py \
+    --models fp32=../Mobile_Deployment/models/yolov3_mouse_fp32.onnx \
+             int8=../Mobile_Deployment/models/yolov3_mouse_int8_qdq.onnx \
+    --threads 1,2,4
+
+  # 只测延迟（不跑 mAP）
+  python scripts/onnx_sweep.py --models a.onnx b.onnx --skip_eval
+"""
+
+import argparse
+import csv
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent   # PaddleDetection-release-2.6/
+SUMMARY_CSV = BASE_DIR / "output" / "onnx_sweep.csv"
+DEFAULT_MODEL_DIR = BASE_DIR.parent / "Mobile_Deployment" / "models"
+
+sys.path.insert(0, str(BASE_DIR))
+sys.path.insert(0, str(BASE_DIR / "deploy" / "python"))
+
+CSV_FIELDS = [
+    "model", "onnx_file", "size_mb", "mAP", "map_type", "eval_images", "threads",
+    "batch_size", "p50_ms", "p95_ms", "p99_ms", "mean_ms", "throughput_fps",
+    "speedup", "timestamp",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="ONNX 模型精度-延迟对比")
+    parser.add_argument(
+        "--models", nargs="+", required=True,
+        help="待比较的模型，name=path 或 path（name 取文件名），第一个作为速度基准",
+    )
+    parser.add_argument(
+        "--model_dir", default=str(DEFAULT_MODEL_DIR),
+        help="infer_cfg.yml 所在目录（预处理与类别），默认 Mobile_Deployment/models",
+    )
+    parser.add_argument("--dataset_dir", default="dataset/mouse_other_voc",
+                        help="VOC 数据集目录")
+    parser.add_argument("--anno_path", default="val.txt",
+                        help="验证集列表（相对 dataset_dir）")
+    parser.add_argument("--label_list", default="label_list.txt",
+                        help="类别列表（相对 dataset_dir）")
+    parser.add_argument("--num_images", type=int, default=-1,
+                        help="只评估前 N 张图片，-1 为全部")
+    parser.add_argument("--map_type", default="integral",
+                        choices=["11point", "integral"],
+                        help="mAP 计算方式，默认与 configs/datasets/mouse_other_voc.yml 一致")
+    parser.add_argument("--overlap_thresh", type=float, default=0.5,
+                        help="mAP 的 IoU 阈值")
+    parser.add_argument("--threads", default="1,2,4",
+                        help="测速的线程数，逗号分隔")
+    parser.add_argument("--batch_size", type=int, default=1,
+                        help="每次推理的图片数，固定 batch 的模型会按其 batch 分块")
+    parser.add_argument("--bench_images", type=int, default=32,
+                        help="测速时循环使用的已预处理图片数")
+    parser.add_argument("--warmup", type=int, default=10,
+                        help="每个线程数下的预热次数（不计时）")
+    parser.add_argument("--repeats", type=int, default=100,
+                        help="每个线程数下计时的推理次数")
+    parser.add_argument("--skip_eval", action="store_true",
+                        help="不计算 mAP，只测速")
+    parser.add_argument("--device", default="CPU", choices=["CPU", "GPU"])
+    parser.add_argument("--output", default=str(SUMMARY_CSV),
+                        help="对比表 CSV 路径")
+    return parser.parse_args()
+
+
+def parse_models(specs):
+    models = []
+    for spec in specs:
+        name, sep, path = spec.partition("=")
+        if not sep:
+            name, path = Path(spec).stem, spec
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"ONNX 模型不存在: {path}")
+        models.append((name, path))
+    return models
+
+
+def load_val_roidbs(args):
+    from ppdet.data.source.voc import VOCDataSet
+
+    dataset = VOCDataSet(
+        dataset_dir=str(BASE_DIR / args.dataset_dir)
+        if not os.path.isabs(args.dataset_dir) else args.dataset_dir,
+        anno_path=args.anno_path,
+        label_list=args.label_list,
+        data_fields=["image", "gt_bbox", "gt_class", "difficult"],
+        sample_num=args.num_images,
+        allow_empty=True)
+    dataset.parse_dataset()
+    return list(dataset.roidbs)
+
+
+def evaluate(detector, roidbs, args, labels):
+    """按 batch 在验证集上推理并返回 (mAP, 每张图预处理+推理平均耗时 ms)。"""
+    from ppdet.metrics.map_utils import DetectionMAP
+
+    detection_map = DetectionMAP(
+        class_num=len(labels),
+        catid2name=dict(enumerate(labels)),
+        overlap_thresh=args.overlap_thresh,
+        map_type=args.map_type,
+        evaluate_difficult=False)
+    bs = args.batch_size
+    t0 = time.perf_counter()
+    for st in range(0, len(roidbs), bs):
+        recs = roidbs[st:st + bs]
+        inputs = detector.create_batch_inputs([r["im_file"] for r in recs])
+        detector.set_inputs(inputs)
+        result = detector.predict()
+        boxes, start = result["boxes"], 0
+        for rec, num in zip(recs, result["boxes_num"]):
+            det = boxes[start:start + int(num)]
+            start += int(num)
+            # 无检测结果时导出的 NMS 会输出 label 为 -1 的占位框
+            det = det[(det[:, 0] >= 0) & (det[:, 0] < len(labels))]
+            detection_map.update(det[:, 2:], det[:, 1], det[:, 0],
+                                 rec["gt_bbox"], rec["gt_class"],
+                                 rec["difficult"])
+    cost_ms = (time.perf_counter() - t0) * 1000 / max(len(roidbs), 1)
+    detection_map.accumulate()
+    return detection_map.get_map() * 100, cost_ms
+
+
+def benchmark(detector, batches, args):
+    """预热后逐次计时 set_inputs + predict，返回每次推理耗时（秒）。"""
+    for i in range(args.warmup):
+        detector.set_inputs(batches[i % len(batches)])
+        detector.predict()
+    costs = np.zeros(args.repeats, dtype=np.float64)
+    for i in range(args.repeats):
+        inputs = batches[i % len(batches)]
+        t0 = time.perf_counter()
+        detector.set_inputs(inputs)
+        detector.predict()
+        costs[i] = time.perf_counter() - t0
+    return costs
+
+
+def write_rows(rows, output):
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp = output.with_name(output.name + ".tmp")
+    with open(tmp, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp, output)
+
+
+def print_table(rows):
+    print(f"\n{'='*86}")
+    print("ONNX 模型精度-延迟对比")
+    print(f"{'='*86}")
+    print(f"{'模型':<14} {'大小MB':>7} {'mAP':>7} {'线程':>4} "
+          f"{'p50ms':>8} {'p95ms':>8} {'p99ms':>8} {'FPS':>8} {'加速比':>7}")
+    print("-" * 86)
+    for row in rows:
+        mAP = "-" if row["mAP"] is None else f"{row['mAP']:.2f}"
+        print(f"{row['model']:<14} {row['size_mb']:>7.2f} {mAP:>7} "
+              f"{row['threads']:>4} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+              f"{row['p99_ms']:>8.2f} {row['throughput_fps']:>8.1f} "
+              f"{row['speedup']:>6.2f}x")
+
+
+def main():
+    args = parse_args()
+    from infer import OnnxDetector
+
+    models = parse_models(args.models)
+    threads = [int(t) for t in args.threads.split(",") if t.strip()]
+    roidbs = load_val_roidbs(args)
+    if len(roidbs) == 0:
+        raise ValueError(f"验证集为空: {args.dataset_dir}/{args.anno_path}")
+    print(f"验证集: {len(roidbs)} 张图片，模型: {[m[0] for m in models]}，"
+          f"线程: {threads}")
+
+    # 测速输入只预处理一次，所有模型与线程数共用
+    bs = args.batch_size
+    # 验证集图片不足一个 batch 时循环补齐，保证至少有一个完整 batch
+    num_bench = max(min(args.bench_images, len(roidbs)), bs)
+    bench_files = [roidbs[i % len(roidbs)]["im_file"] for i in range(num_bench)]
+
+    batches = None
+    rows, base_p50 = [], {}
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for name, onnx_file in models:
+        size_mb = os.path.getsize(onnx_file) / 1024 / 1024
+        mAP, eval_images = None, 0
+        for t in threads:
+            detector = OnnxDetector(
+                args.model_dir,
+                onnx_file=onnx_file,
+                device=args.device,
+                batch_size=bs,
+                cpu_threads=t)
+            if batches is None:
+                batches = [
+                    detector.create_batch_inputs(bench_files[st:st + bs])
+                    for st in range(0, len(bench_files) - bs + 1, bs)
+                ]
+            if not args.skip_eval and mAP is None:
+                # 结果与线程数无关，只在第一个线程数下评估
+                mAP, cost_ms = evaluate(detector, roidbs, args,
+                                        detector.pred_config.labels)
+                eval_images = len(roidbs)
+                print(f"[{name}] mAP@{args.overlap_thresh}({args.map_type}) = {mAP:.2f}  "
+                      f"（预处理+推理 {cost_ms:.2f} ms/张）")
+
+            costs = benchmark(detector, batches, args)
+            p50, p95, p99 = np.percentile(costs, [50, 95, 99]) * 1000
+            base_p50.setdefault(t, p50)
+            rows.append({
+                "model": name,
+                "onnx_file": onnx_file,
+                "size_mb": round(size_mb, 2),
+                "mAP": None if mAP is None else round(mAP, 2),
+                "map_type": None if mAP is None else args.map_type,
+                "eval_images": eval_images,
+                "threads": t,
+                "batch_size": bs,
+                "p50_ms": round(p50, 3),
+                "p95_ms": round(p95, 3),
+                "p99_ms": round(p99, 3),
+                "mean_ms": round(costs.mean() * 1000, 3),
+                "throughput_fps": round(bs * len(costs) / costs.sum(), 2),
+                # 相对第一个模型在相同线程数下的 p50
+                "speedup": round(base_p50[t] / p50, 3),
+                "timestamp": timestamp,
+            })
+            print(f"[{name}] threads={t}  p50={p50:.2f}ms  p95={p95:.2f}ms  "
+                  f"p99={p99:.2f}ms  FPS={rows[-1]['throughput_fps']}")
+            del detector
+
+    write_rows(rows, args.output)
+    print_table(rows)
+    print(f"\n完整 CSV: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,8 +13,11 @@
 特性：
   - 训练日志写入 output/{run_name}/train.log
   - VisualDL 日志写入 output/{run_name}/vdl_log/
-  - DONE 标志文件：重启脚本自动跳过已完成轮次
-  - 每轮结束后自动运行 eval --classwise，结果追加至 output/round2_summary.csv
+  - 实验由 experiment_scheduler 按卡数并行调度到空闲 GPU（如 C2 单卡与其他
+    单卡实验同时跑），不再固定 GPU 编号
+  - 队列状态 output/round2_queue.json：重启脚本自动跳过已完成实验、接管
+    仍在运行的实验（替代 DONE 标志文件）
+  - 每轮结束后结果追加至 output/round2_summary.csv
   - start_new_session=True：父进程退出子进程继续运行
 
 用法：
@@ -32,6 +35,16 @@
   # 从指定实验开始（跳过前面已完成的）
   python scripts/run_experiments_round2.py --from B2
 
+  # 最多同时跑 2 个实验 / 只用 0、1 号卡
+  python scripts/run_experiments_round2.py --max-parallel 2 --gpus 0,1
+
+  # 查看队列状态；重新运行已完成的 C2
+  python scripts/run_experiments_round2.py --status
+  python scripts/run_experiments_round2.py --groups C --rerun C2
+
+  # 无 GPU 时测试调度（模拟 2 张卡，每个实验 sleep 5 秒）
+  python scripts/run_experiments_round2.py --dry-run --sim-gpus 2
+
   # 运行 B1 anchor 聚类（不训练，仅分析）
   python scripts/run_experiments_round2.py --anchor-cluster
 
@@ -48,14 +61,14 @@
 
 import argparse
 import csv
-import os
-import re
 import subprocess
 import sys
-import time
 from datetime import datetime
 from pathlib import Path
 
+from experiment_scheduler import (DRY_RUN_DIR, ExperimentScheduler,
+                                  add_scheduler_args, extract_metrics)
+
 BASE_DIR = Path(__file__).resolve().parent.parent   # PaddleDetection-release-2.6/
 PYTHON = sys.executable
 SUMMARY_CSV = BASE_DIR / "output" / "round2_summary.csv"
@@ -69,7 +82,7 @@ RUNS = [
         "group":       "A",
         "name":        "M1_picodet_m_2gpu",
         "cfg":         "configs/picodet/runs/M1_picodet_m_2gpu.yml",
-        "gpus":        "0,1",
+        "num_gpus":    2,
         "distributed": True,
         "slim":        False,
         "desc":        "PicoDet-M 双卡 bs=96 lr=0.24 300e",
@@ -80,7 +93,7 @@ RUNS = [
         "group":       "A",
         "name":        "A2_ppyoloe_s_mouse_voc",
         "cfg":         "configs/ppyoloe/runs/ppyoloe_s_mouse_voc.yml",
-        "gpus":        "0,1",
+        "num_gpus":    2,
         "distributed": True,
         "slim":        False,
         "desc":        "PP-YOLOE+-S 双卡 bs=16 lr=0.001 30e",
@@ -91,7 +104,7 @@ RUNS = [
         "group":       "B",
         "name":        "Y5_yolov3_full_2gpu_120e",
         "cfg":         "configs/yolov3/runs/Y5_yolov3_full_2gpu_120e.yml",
-        "gpus":        "0,1",
+        "num_gpus":    2,
         "distributed": True,
         "slim":        False,
         "desc":        "YOLOv3-MV1 双卡 bs=16 lr=0.0025 120e+自定义anchors（Y5，已失败）",
@@ -102,7 +115,7 @@ RUNS = [
         "group":       "B",
         "name":        "Y6_yolov3_custom_anchor_300e",
         "cfg":         "configs/yolov3/runs/Y6_yolov3_custom_anchor_300e.yml",
-        "gpus":        "0,1",
+        "num_gpus":    2,
         "distributed": True,
         "slim":        False,
         "desc":        "YOLOv3 backbone-only pretrain + 自定义anchor 300e（修复Y5）",
@@ -113,7 +126,7 @@ RUNS = [
         "group":       "C",
         "name":        "C1_picodet_s_qat",
         "cfg":         "configs/picodet/runs/C1_picodet_s_qat.yml",
-        "gpus":        "0,1",
+        "num_gpus":    2,
         "distributed": True,
         "slim":        True,
         # 自定义 slim_cfg：覆盖 pretrain_weights 为 L1 best_model（非 COCO 权重）
@@ -126,7 +139,7 @@ RUNS = [
         "group":       "C",
         "name":        "C2_yolov3_fpgm_prune",
         "cfg":         "configs/yolov3/runs/C2_yolov3_fpgm_prune.yml",
-        "gpus":        "0",
+        "num_gpus":    1,
         "distributed": False,
         "slim":        True,
         # 自定义 slim_cfg：覆盖 pretrain_weights 为 Y4 best_model
@@ -139,7 +152,7 @@ RUNS = [
         "group":       "C",
         "name":        "C3_yolov3_distill",
         "cfg":         "configs/yolov3/runs/C3_yolov3_distill.yml",
-        "gpus":        "0,1",
+        "num_gpus":    2,
         "distributed": True,
         "slim":        True,
         # 官方蒸馏 slim_cfg：R34 Teacher COCO 权重
@@ -162,7 +175,7 @@ EVAL_TARGETS = [
 # ──────────────────────────────────────────────
 # 命令构造
 # ──────────────────────────────────────────────
-def build_train_cmd(run: dict) -> list:
+def build_train_cmd(run: dict, gpus: str, log_dir: str) -> list:
     name = run["name"]
     cfg  = run["cfg"]
     vdl  = f"output/{name}/vdl_log"
@@ -170,7 +183,8 @@ def build_train_cmd(run: dict) -> list:
     if run["distributed"]:
         cmd = [
             PYTHON, "-m", "paddle.distributed.launch",
-            "--gpus", run["gpus"],
+            "--gpus", gpus,
+            "--log_dir", log_dir,
             "tools/train.py",
             "-c", cfg,
             "--eval",
@@ -207,30 +221,6 @@ def build_eval_cmd(run: dict, classwise: bool = True) -> list:
     return cmd
 
 
-# ──────────────────────────────────────────────
-# 日志解析
-# ──────────────────────────────────────────────
-def extract_metrics(log_path: Path) -> tuple:
-    """从训练日志提取 best_mAP（%）和 eval FPS。"""
-    best_ap = None
-    fps = None
-    workerlog = BASE_DIR / "log" / "workerlog.0"
-    for candidate in [log_path, workerlog]:
-        try:
-            with open(candidate, "r", errors="replace") as f:
-                for line in f:
-                    m = re.search(r"Best test bbox ap is ([\d]+\.[\d]+)", line)
-                    if m:
-                        best_ap = float(m.group(1))
-                    m = re.search(r"average FPS: ([\d.]+)", line)
-                    if m:
-                        fps = float(m.group(1))
-        except FileNotFoundError:
-            pass
-    best_map = round(best_ap * 100, 2) if best_ap is not None else None
-    return best_map, fps
-
-
 # ──────────────────────────────────────────────
 # 结果持久化
 # ──────────────────────────────────────────────
@@ -254,72 +244,13 @@ def append_summary(run: dict, best_map, fps, duration_h: float, exit_code: int):
 
 
 # ──────────────────────────────────────────────
-# 单轮训练
+# 单轮收尾
 # ──────────────────────────────────────────────
-def run_one(run: dict) -> bool:
-    name      = run["name"]
-    run_dir   = BASE_DIR / "output" / name
-    done_flag = run_dir / "DONE"
-    log_path  = run_dir / "train.log"
-    pid_path  = run_dir / "train.pid"
-
-    if done_flag.exists():
-        print(f"\n[SKIP] {name}（已完成，删除 {done_flag} 可重新运行）")
-        return True
-
-    run_dir.mkdir(parents=True, exist_ok=True)
-    cmd = build_train_cmd(run)
-    cmd_str = " ".join(cmd)
-
-    env = os.environ.copy()
-    env["CUDA_VISIBLE_DEVICES"] = run["gpus"]
-    env["NCCL_IB_DISABLE"] = "1"
-
-    print(f"\n{'='*64}")
-    print(f"[START] {run['id']} - {name}  ({run['desc']})")
-    print(f"  配置: {run['cfg']}")
-    print(f"  GPU:  {run['gpus']}")
-    print(f"  日志: tail -f {log_path}")
-    print(f"  VDL:  visualdl --logdir {run_dir}/vdl_log --host 0.0.0.0 --port 8040")
-    print(f"{'='*64}")
-
-    t0 = time.time()
-    log_file = open(log_path, "w", buffering=1)
-    log_file.write(f"# 启动时间:  {datetime.now().isoformat()}\n")
-    log_file.write(f"# 轮次:      {run['id']} - {name}\n")
-    log_file.write(f"# 描述:      {run['desc']}\n")
-    log_file.write(f"# 命令:      {cmd_str}\n")
-    log_file.write(f"# {'='*58}\n\n")
-    log_file.flush()
-
-    proc = subprocess.Popen(
-        cmd,
-        stdout=log_file,
-        stderr=subprocess.STDOUT,
-        cwd=str(BASE_DIR),
-        start_new_session=True,
-        env=env,
-    )
-
-    pid_path.write_text(str(proc.pid))
-    print(f"  PID:  {proc.pid}  (kill: kill {proc.pid})")
-
-    ret = proc.wait()
-    duration_h = (time.time() - t0) / 3600
-    log_file.close()
-
-    best_map, fps = extract_metrics(log_path)
-    append_summary(run, best_map, fps, duration_h, ret)
-
-    if ret == 0:
-        done_flag.touch()
-        print(f"\n[DONE] {name}")
-        print(f"  mAP@0.5 = {best_map}%  |  FPS = {fps}  |  耗时 = {duration_h:.2f}h")
-        return True
-    else:
-        print(f"\n[FAIL] {name}  exit_code={ret}  耗时={duration_h:.2f}h")
-        print(f"  查看日志: tail -n 40 {log_path}")
-        return False
+def finish_run(run: dict, result: dict):
+    best_map, fps = extract_metrics(result["run_dir"])
+    append_summary(run, best_map, fps, result["duration_h"], result["exit_code"])
+    if result["exit_code"] == 0:
+        print(f"  mAP@0.5 = {best_map}%  |  FPS = {fps}")
 
 
 # ──────────────────────────────────────────────
@@ -434,6 +365,7 @@ def print_summary():
 # 入口
 # ──────────────────────────────────────────────
 def main():
+    global SUMMARY_CSV
     parser = argparse.ArgumentParser(description="第二轮实验启动器（A/B/C 组）")
     parser.add_argument(
         "--groups", default=None,
@@ -456,7 +388,10 @@ def main():
         "--classwise-eval", action="store_true",
         help="对所有已完成实验运行 per-class eval（不训练）",
     )
+    add_scheduler_args(parser)
     args = parser.parse_args()
+    if args.dry_run:
+        SUMMARY_CSV = DRY_RUN_DIR / SUMMARY_CSV.name
 
     print(f"\n第二轮实验启动器（A/B/C 组）")
     print(f"时间:    {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -486,29 +421,26 @@ def main():
                 break
             skip_ids.add(r["id"])
 
+    runs = [r for r in RUNS
+            if not (allowed_groups and r["group"] not in allowed_groups)
+            and r["id"] not in skip_ids]
+    scheduler = ExperimentScheduler(runs, "round2", build_train_cmd, finish_run, args)
+
     print("\n实验计划：")
     for r in RUNS:
         if allowed_groups and r["group"] not in allowed_groups:
             status = "跳过（--groups 过滤）"
         elif r["id"] in skip_ids:
             status = f"跳过（--from {args.start_from}）"
-        elif (BASE_DIR / "output" / r["name"] / "DONE").exists():
-            status = "已完成"
         else:
-            status = "待运行"
-        print(f"  {r['id']} [{r['group']}]: {r['desc']:<35}  [{status}]")
+            status = scheduler.status(r)
+        print(f"  {r['id']} [{r['group']}] {r['num_gpus']}卡: {r['desc']:<35}  [{status}]")
+    if args.status:
+        return
 
     print()
-    for run in RUNS:
-        if allowed_groups and run["group"] not in allowed_groups:
-            continue
-        if run["id"] in skip_ids:
-            print(f"[SKIP] {run['name']}（--from 跳过）")
-            continue
-        success = run_one(run)
-        if not success:
-            print(f"\n训练失败，中止后续轮次。（如需继续，使用 --from {run['id']}）")
-            break
+    if not scheduler.run():
+        print(f"\n存在失败或未完成的实验，修复后重新运行本脚本即可继续（已完成的自动跳过）")
 
     print_summary()
 
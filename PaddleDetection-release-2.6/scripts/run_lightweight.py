@@ -12,14 +12,20 @@ PicoDet-S 四轮训练启动器
   - 训练日志写入 output/{run_name}/train.log（开头附带完整启动命令）
   - VisualDL 日志写入 output/{run_name}/vdl_log/
   - start_new_session=True：父进程被 kill 后子进程独立存活
-  - train.pid 记录 PID，方便手动监控 / 终止
-  - DONE 标志文件：重启脚本自动跳过已完成轮次
+  - train.pid 记录 PID，方便手动监控 / 终止（kill -- -PID 结束整个进程组）
+  - 轮次由 experiment_scheduler 按卡数并行调度到空闲 GPU，单卡轮次不再
+    空占另一张卡
+  - 队列状态 output/lightweight_queue.json：重启脚本自动跳过已完成轮次、接管
+    仍在运行的轮次（替代 DONE 标志文件）
   - 每轮结束后自动运行 eval 并写入 output/lightweight_summary.csv
 
 用法：
   cd /hy-tmp/paddle_detection_mouse/PaddleDetection-release-2.6
-  python scripts/run_lightweight.py              # 顺序跑完所有轮次
-  python scripts/run_lightweight.py --from L3    # 从 L3 开始跑
+  python scripts/run_lightweight.py                   # 并行跑完所有轮次
+  python scripts/run_lightweight.py --from L3         # 从 L3 开始跑
+  python scripts/run_lightweight.py --max-parallel 2  # 最多同时跑 2 轮
+  python scripts/run_lightweight.py --status          # 查看队列状态
+  python scripts/run_lightweight.py --dry-run         # 无 GPU 时模拟调度
 
 监控（启动后可关闭本终端）：
   tail -f output/L1_picodet_1gpu/train.log
@@ -28,14 +34,13 @@ PicoDet-S 四轮训练启动器
 
 import argparse
 import csv
-import os
-import re
-import subprocess
 import sys
-import time
 from datetime import datetime
 from pathlib import Path
 
+from experiment_scheduler import (DRY_RUN_DIR, ExperimentScheduler,
+                                  add_scheduler_args, extract_metrics)
+
 # ──────────────────────────────────────────────
 # 路径与环境
 # ──────────────────────────────────────────────
@@ -51,7 +56,7 @@ RUNS = [
         "id":          "L1",
         "name":        "L1_picodet_1gpu",
         "cfg":         "configs/picodet/runs/L1_picodet_1gpu.yml",
-        "gpus":        "0",
+        "num_gpus":    1,
         "distributed": False,
         "desc":        "单卡 bs=32 lr=0.08 300e",
     },
@@ -59,7 +64,7 @@ RUNS = [
         "id":          "L2",
         "name":        "L2_picodet_2gpu",
         "cfg":         "configs/picodet/runs/L2_picodet_2gpu.yml",
-        "gpus":        "0,1",
+        "num_gpus":    2,
         "distributed": True,
         "desc":        "双卡 bs=64 lr=0.16 300e（官方推荐）",
     },
@@ -67,7 +72,7 @@ RUNS = [
         "id":          "L3",
         "name":        "L3_picodet_bs96",
         "cfg":         "configs/picodet/runs/L3_picodet_bs96.yml",
-        "gpus":        "0,1",
+        "num_gpus":    2,
         "distributed": True,
         "desc":        "双卡 bs=96 lr=0.24 300e（大 bs）",
     },
@@ -75,7 +80,7 @@ RUNS = [
         "id":          "L4",
         "name":        "L4_picodet_600e",
         "cfg":         "configs/picodet/runs/L4_picodet_600e.yml",
-        "gpus":        "0,1",
+        "num_gpus":    2,
         "distributed": True,
         "desc":        "双卡 bs=64 lr=0.16 600e（加长）",
     },
@@ -85,7 +90,7 @@ RUNS = [
 # ──────────────────────────────────────────────
 # 命令构造
 # ──────────────────────────────────────────────
-def build_train_cmd(run: dict) -> list:
+def build_train_cmd(run: dict, gpus: str, log_dir: str) -> list:
     name = run["name"]
     cfg  = run["cfg"]
     vdl  = f"output/{name}/vdl_log"
@@ -93,7 +98,8 @@ def build_train_cmd(run: dict) -> list:
     if run["distributed"]:
         cmd = [
             PYTHON, "-m", "paddle.distributed.launch",
-            "--gpus", run["gpus"],
+            "--gpus", gpus,
+            "--log_dir", log_dir,
             "tools/train.py",
             "-c", cfg,
             "--eval",
@@ -123,32 +129,6 @@ def build_eval_cmd(run: dict) -> list:
     ]
 
 
-# ──────────────────────────────────────────────
-# 日志解析
-# ──────────────────────────────────────────────
-def extract_metrics(log_path: Path) -> tuple:
-    """从 train.log 或分布式 workerlog.0 中提取 best_mAP（%）和 eval FPS。"""
-    best_ap = None
-    fps = None
-    # 分布式训练时实际日志写入 log/workerlog.0，非分布式写入 train.log
-    workerlog = BASE_DIR / "log" / "workerlog.0"
-    candidates = [log_path, workerlog]
-    for candidate in candidates:
-        try:
-            with open(candidate, "r", errors="replace") as f:
-                for line in f:
-                    m = re.search(r"Best test bbox ap is ([\d]+\.[\d]+)", line)
-                    if m:
-                        best_ap = float(m.group(1))
-                    m = re.search(r"average FPS: ([\d.]+)", line)
-                    if m:
-                        fps = float(m.group(1))
-        except FileNotFoundError:
-            pass
-    best_map = round(best_ap * 100, 2) if best_ap is not None else None
-    return best_map, fps
-
-
 # ──────────────────────────────────────────────
 # 结果持久化
 # ──────────────────────────────────────────────
@@ -175,74 +155,13 @@ def append_summary(run: dict, best_map, fps, duration_h: float, exit_code: int):
 
 
 # ──────────────────────────────────────────────
-# 单轮训练
+# 单轮收尾
 # ──────────────────────────────────────────────
-def run_one(run: dict) -> bool:
-    name     = run["name"]
-    run_dir  = BASE_DIR / "output" / name
-    done_flag = run_dir / "DONE"
-    log_path  = run_dir / "train.log"
-    pid_path  = run_dir / "train.pid"
-
-    # 已完成则跳过
-    if done_flag.exists():
-        print(f"\n[SKIP] {name}（已完成，删除 {done_flag} 可重新运行）")
-        return True
-
-    run_dir.mkdir(parents=True, exist_ok=True)
-    cmd = build_train_cmd(run)
-    cmd_str = " ".join(cmd)
-
-    env = os.environ.copy()
-    env["CUDA_VISIBLE_DEVICES"] = run["gpus"]
-    env["NCCL_IB_DISABLE"] = "1"          # TCP fallback 静默
-
-    print(f"\n{'='*64}")
-    print(f"[START] {name}  ({run['desc']})")
-    print(f"  配置: {run['cfg']}")
-    print(f"  GPU:  {run['gpus']}")
-    print(f"  日志: tail -f {log_path}")
-    print(f"  VDL:  visualdl --logdir {run_dir}/vdl_log --host 0.0.0.0 --port 8040")
-    print(f"{'='*64}")
-
-    t0 = time.time()
-
-    log_file = open(log_path, "w", buffering=1)
-    log_file.write(f"# 启动时间:  {datetime.now().isoformat()}\n")
-    log_file.write(f"# 轮次:      {name}\n")
-    log_file.write(f"# 描述:      {run['desc']}\n")
-    log_file.write(f"# 命令:      {cmd_str}\n")
-    log_file.write(f"# {'='*58}\n\n")
-    log_file.flush()
-
-    proc = subprocess.Popen(
-        cmd,
-        stdout=log_file,
-        stderr=subprocess.STDOUT,
-        cwd=str(BASE_DIR),
-        start_new_session=True,    # 子进程加入独立 session，父进程死亡不影响它
-        env=env,
-    )
-
-    pid_path.write_text(str(proc.pid))
-    print(f"  PID:  {proc.pid}  (kill: kill {proc.pid})")
-
-    ret = proc.wait()
-    duration_h = (time.time() - t0) / 3600
-    log_file.close()
-
-    best_map, fps = extract_metrics(log_path)
-    append_summary(run, best_map, fps, duration_h, ret)
-
-    if ret == 0:
-        done_flag.touch()
-        print(f"\n[DONE] {name}")
-        print(f"  mAP@0.5 = {best_map}%  |  FPS = {fps}  |  耗时 = {duration_h:.2f}h")
-        return True
-    else:
-        print(f"\n[FAIL] {name}  exit_code={ret}  耗时={duration_h:.2f}h")
-        print(f"  查看日志: tail -n 40 {log_path}")
-        return False
+def finish_run(run: dict, result: dict):
+    best_map, fps = extract_metrics(result["run_dir"])
+    append_summary(run, best_map, fps, result["duration_h"], result["exit_code"])
+    if result["exit_code"] == 0:
+        print(f"  mAP@0.5 = {best_map}%  |  FPS = {fps}")
 
 
 # ──────────────────────────────────────────────
@@ -276,28 +195,21 @@ def print_summary():
 # 入口
 # ──────────────────────────────────────────────
 def main():
+    global SUMMARY_CSV
     parser = argparse.ArgumentParser(description="PicoDet-S 四轮训练启动器")
     parser.add_argument(
         "--from", dest="start_from", default=None,
         choices=[r["id"] for r in RUNS],
         help="从指定轮次开始（例：--from L3）",
     )
+    add_scheduler_args(parser)
     args = parser.parse_args()
+    if args.dry_run:
+        SUMMARY_CSV = DRY_RUN_DIR / SUMMARY_CSV.name
 
     print(f"\nPicoDet-S 四轮训练启动器")
     print(f"时间:    {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"工作目录: {BASE_DIR}")
-    print(f"\n轮次计划:")
-    skip = args.start_from is not None
-    for r in RUNS:
-        if r["id"] == args.start_from:
-            skip = False
-        status = "跳过（--from）" if skip else ("已完成" if (BASE_DIR / "output" / r["name"] / "DONE").exists() else "待运行")
-        print(f"  {r['id']}: {r['desc']:28}  [{status}]")
-        if r["id"] == args.start_from:
-            skip = False  # 第一次处理完再置 False 无效，上面已经处理
-
-    # 重新决定跳过逻辑
     skip_ids = set()
     if args.start_from:
         for r in RUNS:
@@ -305,15 +217,19 @@ def main():
                 break
             skip_ids.add(r["id"])
 
+    runs = [r for r in RUNS if r["id"] not in skip_ids]
+    scheduler = ExperimentScheduler(runs, "lightweight", build_train_cmd, finish_run, args)
+
+    print(f"\n轮次计划:")
+    for r in RUNS:
+        status = "跳过（--from）" if r["id"] in skip_ids else scheduler.status(r)
+        print(f"  {r['id']}: {r['desc']:28}  [{status}]")
+    if args.status:
+        return
+
     print()
-    for run in RUNS:
-        if run["id"] in skip_ids:
-            print(f"[SKIP] {run['name']}（--from {args.start_from} 指定跳过）")
-            continue
-        success = run_one(run)
-        if not success:
-            print(f"\n训练失败，中止后续轮次。")
-            break
+    if not scheduler.run():
+        print(f"\n存在失败或未完成的轮次，重新运行本脚本即可继续（已完成的自动跳过）。")
 
     print_summary()
 
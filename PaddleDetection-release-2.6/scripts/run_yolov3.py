@@ -15,15 +15,21 @@ YOLOv3-MobileNetV1 四轮训练启动器
   - 训练日志写入 output/{run_name}/train.log
   - VisualDL 日志写入 output/{run_name}/vdl_log/
   - start_new_session=True：父进程被 kill 后子进程独立存活
-  - train.pid 记录 PID，方便手动监控 / 终止
-  - DONE 标志文件：重启脚本自动跳过已完成轮次
+  - train.pid 记录 PID，方便手动监控 / 终止（kill -- -PID 结束整个进程组）
+  - 轮次由 experiment_scheduler 按卡数并行调度到空闲 GPU，单卡轮次不再
+    空占另一张卡
+  - 队列状态 output/yolov3_queue.json：重启脚本自动跳过已完成轮次、接管
+    仍在运行的轮次（替代 DONE 标志文件）
   - 每轮结束后自动运行 eval 并写入 output/yolov3_summary.csv
 
 用法：
   cd /hy-tmp/paddle_detection_mouse/PaddleDetection-release-2.6
-  python scripts/prepare_1of3_dataset.py   # 仅首次需要
-  python scripts/run_yolov3.py             # 顺序跑完所有轮次
-  python scripts/run_yolov3.py --from Y3   # 从 Y3 开始跑
+  python scripts/prepare_1of3_dataset.py          # 仅首次需要
+  python scripts/run_yolov3.py                    # 并行跑完所有轮次
+  python scripts/run_yolov3.py --from Y3          # 从 Y3 开始跑
+  python scripts/run_yolov3.py --max-parallel 2   # 最多同时跑 2 轮
+  python scripts/run_yolov3.py --status           # 查看队列状态
+  python scripts/run_yolov3.py --dry-run          # 无 GPU 时模拟调度
 
 监控（启动后可关闭本终端）：
   tail -f output/Y1_yolov3_1of3_1gpu/train.log
@@ -32,14 +38,13 @@ YOLOv3-MobileNetV1 四轮训练启动器
 
 import argparse
 import csv
-import os
-import re
-import subprocess
 import sys
-import time
 from datetime import datetime
 from pathlib import Path
 
+from experiment_scheduler import (DRY_RUN_DIR, ExperimentScheduler,
+                                  add_scheduler_args, extract_metrics)
+
 # ──────────────────────────────────────────────
 # 路径与环境
 # ──────────────────────────────────────────────
@@ -55,7 +60,7 @@ RUNS = [
         "id":          "Y1",
         "name":        "Y1_yolov3_1of3_1gpu",
         "cfg":         "configs/yolov3/runs/Y1_yolov3_1of3_1gpu.yml",
-        "gpus":        "0",
+        "num_gpus":    1,
         "distributed": False,
         "dataset":     "1of3",
         "desc":        "1/3数据 单卡 lr=0.00125 80e（baseline）",
@@ -64,7 +69,7 @@ RUNS = [
         "id":          "Y2",
         "name":        "Y2_yolov3_1of3_2gpu",
         "cfg":         "configs/yolov3/runs/Y2_yolov3_1of3_2gpu.yml",
-        "gpus":        "0,1",
+        "num_gpus":    2,
         "distributed": True,
         "dataset":     "1of3",
         "desc":        "1/3数据 双卡 lr=0.0025  80e",
@@ -73,7 +78,7 @@ RUNS = [
         "id":          "Y3",
         "name":        "Y3_yolov3_full_1gpu",
         "cfg":         "configs/yolov3/runs/Y3_yolov3_full_1gpu.yml",
-        "gpus":        "0",
+        "num_gpus":    1,
         "distributed": False,
         "dataset":     "full",
         "desc":        "全量数据 单卡 lr=0.00125 80e",
@@ -82,7 +87,7 @@ RUNS = [
         "id":          "Y4",
         "name":        "Y4_yolov3_full_2gpu",
         "cfg":         "configs/yolov3/runs/Y4_yolov3_full_2gpu.yml",
-        "gpus":        "0,1",
+        "num_gpus":    2,
         "distributed": True,
         "dataset":     "full",
         "desc":        "全量数据 双卡 lr=0.0025  80e",
@@ -106,7 +111,7 @@ def check_prerequisites():
 # ──────────────────────────────────────────────
 # 命令构造
 # ──────────────────────────────────────────────
-def build_train_cmd(run: dict) -> list:
+def build_train_cmd(run: dict, gpus: str, log_dir: str) -> list:
     name = run["name"]
     cfg  = run["cfg"]
     vdl  = f"output/{name}/vdl_log"
@@ -114,7 +119,8 @@ def build_train_cmd(run: dict) -> list:
     if run["distributed"]:
         cmd = [
             PYTHON, "-m", "paddle.distributed.launch",
-            "--gpus", run["gpus"],
+            "--gpus", gpus,
+            "--log_dir", log_dir,
             "tools/train.py",
             "-c", cfg,
             "--eval",
@@ -144,31 +150,6 @@ def build_eval_cmd(run: dict) -> list:
     ]
 
 
-# ──────────────────────────────────────────────
-# 日志解析
-# ──────────────────────────────────────────────
-def extract_metrics(log_path: Path) -> tuple:
-    """从 train.log 或分布式 workerlog.0 中提取 best_mAP（%）和 eval FPS。"""
-    best_ap = None
-    fps = None
-    workerlog = BASE_DIR / "log" / "workerlog.0"
-    candidates = [log_path, workerlog]
-    for candidate in candidates:
-        try:
-            with open(candidate, "r", errors="replace") as f:
-                for line in f:
-                    m = re.search(r"Best test bbox ap is ([\d]+\.[\d]+)", line)
-                    if m:
-                        best_ap = float(m.group(1))
-                    m = re.search(r"average FPS: ([\d.]+)", line)
-                    if m:
-                        fps = float(m.group(1))
-        except FileNotFoundError:
-            pass
-    best_map = round(best_ap * 100, 2) if best_ap is not None else None
-    return best_map, fps
-
-
 # ──────────────────────────────────────────────
 # 结果持久化
 # ──────────────────────────────────────────────
@@ -195,74 +176,13 @@ def append_summary(run: dict, best_map, fps, duration_h: float, exit_code: int):
 
 
 # ──────────────────────────────────────────────
-# 单轮训练
+# 单轮收尾
 # ──────────────────────────────────────────────
-def run_one(run: dict) -> bool:
-    name      = run["name"]
-    run_dir   = BASE_DIR / "output" / name
-    done_flag = run_dir / "DONE"
-    log_path  = run_dir / "train.log"
-    pid_path  = run_dir / "train.pid"
-
-    if done_flag.exists():
-        print(f"\n[SKIP] {name}（已完成，删除 {done_flag} 可重新运行）")
-        return True
-
-    run_dir.mkdir(parents=True, exist_ok=True)
-    cmd = build_train_cmd(run)
-    cmd_str = " ".join(cmd)
-
-    env = os.environ.copy()
-    env["CUDA_VISIBLE_DEVICES"] = run["gpus"]
-    env["NCCL_IB_DISABLE"] = "1"
-
-    print(f"\n{'='*64}")
-    print(f"[START] {name}  ({run['desc']})")
-    print(f"  配置:  {run['cfg']}")
-    print(f"  GPU:   {run['gpus']}")
-    print(f"  数据:  {run['dataset']}")
-    print(f"  日志:  tail -f {log_path}")
-    print(f"  VDL:   visualdl --logdir {run_dir}/vdl_log --host 0.0.0.0 --port 8040")
-    print(f"{'='*64}")
-
-    t0 = time.time()
-
-    log_file = open(log_path, "w", buffering=1)
-    log_file.write(f"# 启动时间:  {datetime.now().isoformat()}\n")
-    log_file.write(f"# 轮次:      {name}\n")
-    log_file.write(f"# 描述:      {run['desc']}\n")
-    log_file.write(f"# 命令:      {cmd_str}\n")
-    log_file.write(f"# {'='*58}\n\n")
-    log_file.flush()
-
-    proc = subprocess.Popen(
-        cmd,
-        stdout=log_file,
-        stderr=subprocess.STDOUT,
-        cwd=str(BASE_DIR),
-        start_new_session=True,
-        env=env,
-    )
-
-    pid_path.write_text(str(proc.pid))
-    print(f"  PID:  {proc.pid}  (kill: kill {proc.pid})")
-
-    ret = proc.wait()
-    duration_h = (time.time() - t0) / 3600
-    log_file.close()
-
-    best_map, fps = extract_metrics(log_path)
-    append_summary(run, best_map, fps, duration_h, ret)
-
-    if ret == 0:
-        done_flag.touch()
-        print(f"\n[DONE] {name}")
-        print(f"  mAP@0.5 = {best_map}%  |  FPS = {fps}  |  耗时 = {duration_h:.2f}h")
-        return True
-    else:
-        print(f"\n[FAIL] {name}  exit_code={ret}  耗时={duration_h:.2f}h")
-        print(f"  查看日志: tail -n 40 {log_path}")
-        return False
+def finish_run(run: dict, result: dict):
+    best_map, fps = extract_metrics(result["run_dir"])
+    append_summary(run, best_map, fps, result["duration_h"], result["exit_code"])
+    if result["exit_code"] == 0:
+        print(f"  mAP@0.5 = {best_map}%  |  FPS = {fps}")
 
 
 # ──────────────────────────────────────────────
@@ -296,19 +216,24 @@ def print_summary():
 # 入口
 # ──────────────────────────────────────────────
 def main():
+    global SUMMARY_CSV
     parser = argparse.ArgumentParser(description="YOLOv3 四轮训练启动器")
     parser.add_argument(
         "--from", dest="start_from", default=None,
         choices=[r["id"] for r in RUNS],
         help="从指定轮次开始（例：--from Y3）",
     )
+    add_scheduler_args(parser)
     args = parser.parse_args()
+    if args.dry_run:
+        SUMMARY_CSV = DRY_RUN_DIR / SUMMARY_CSV.name
 
     print(f"\nYOLOv3-MobileNetV1 四轮训练启动器")
     print(f"时间:    {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"工作目录: {BASE_DIR}")
 
-    check_prerequisites()
+    if not args.dry_run:
+        check_prerequisites()
 
     skip_ids = set()
     if args.start_from:
@@ -317,25 +242,19 @@ def main():
                 break
             skip_ids.add(r["id"])
 
+    runs = [r for r in RUNS if r["id"] not in skip_ids]
+    scheduler = ExperimentScheduler(runs, "yolov3", build_train_cmd, finish_run, args)
+
     print(f"\n轮次计划:")
     for r in RUNS:
-        if r["id"] in skip_ids:
-            status = "跳过（--from）"
-        elif (BASE_DIR / "output" / r["name"] / "DONE").exists():
-            status = "已完成"
-        else:
-            status = "待运行"
+        status = "跳过（--from）" if r["id"] in skip_ids else scheduler.status(r)
         print(f"  {r['id']}: {r['desc']:38}  [{status}]")
+    if args.status:
+        return
 
     print()
-    for run in RUNS:
-        if run["id"] in skip_ids:
-            print(f"[SKIP] {run['name']}（--from {args.start_from} 指定跳过）")
-            continue
-        success = run_one(run)
-        if not success:
-            print(f"\n训练失败，中止后续轮次。")
-            break
+    if not scheduler.run():
+        print(f"\n存在失败或未完成的轮次，重新运行本脚本即可继续（已完成的自动跳过）。")
 
     print_summary()
 
@@ -34,6 +34,7 @@ from ppdet.utils.check import check_gpu, check_npu, check_xpu, check_mlu, check_
 from ppdet.utils.cli import ArgsParser, merge_args
 from ppdet.engine import Trainer, init_parallel_env
 from ppdet.metrics.coco_utils import json_eval_results
+from ppdet.metrics.voc_results import find_voc_results, voc_eval_results
 from ppdet.slim import build_slim_model
 
 from ppdet.utils.logger import setup_logger
@@ -54,6 +55,19 @@ def parse_args():
         default=False,
         help='Whether to re eval with already exists bbox.json or mask.json')
 
+    parser.add_argument(
+        "--pred_file",
+        default=None,
+        type=str,
+        help="VOC result file to re eval in json_eval mode, default is "
+        "bbox.bin, bbox.jsonl or bbox.json in output_eval.")
+
+    parser.add_argument(
+        "--draw_threshold",
+        type=float,
+        default=0.,
+        help="Score threshold of results in VOC json_eval mode.")
+
     parser.add_argument(
         "--slim_config",
         default=None,
@@ -77,6 +91,14 @@ def parse_args():
         default=False,
         help='Whether to save the evaluation results only')
 
+    parser.add_argument(
+        "--output_format",
+        type=str,
+        default='jsonl',
+        choices=['json', 'jsonl', 'bin'],
+        help="Format of VOC results saved to output_eval, 'jsonl' and 'bin' "
+        "are written while evaluating, 'json' is the legacy bbox.json.")
+
     parser.add_argument(
         "--amp",
         action='store_true',
@@ -121,7 +143,35 @@ def parse_args():
     return args
 
 
+def run_voc_json_eval(FLAGS, cfg):
+    pred_file = FLAGS.pred_file or find_voc_results(FLAGS.output_eval)
+    assert pred_file is not None, \
+        "No VOC result file found in {}".format(FLAGS.output_eval or '.')
+    logger.info("In json_eval mode, PaddleDetection will evaluate {} with "
+                "ground truths of EvalDataset directly.".format(pred_file))
+    detection_map = voc_eval_results(
+        pred_file,
+        cfg['EvalDataset'],
+        class_num=cfg.num_classes,
+        overlap_thresh=cfg.get('overlap_thresh', 0.5),
+        map_type=cfg.map_type,
+        evaluate_difficult=cfg.get('evaluate_difficult', False),
+        classwise=FLAGS.classwise,
+        score_thresh=FLAGS.draw_threshold)
+    map_stat = 100. * detection_map.get_map()
+    threshs = detection_map.overlap_threshs
+    for thresh, mAP in zip(threshs, detection_map.mAPs):
+        logger.info("mAP({:.2f}, {}) = {:.2f}%".format(thresh, cfg.map_type,
+                                                       100. * mAP))
+    if len(threshs) > 1:
+        logger.info("mAP([{:.2f}:{:.2f}], {}) = {:.2f}%".format(
+            threshs[0], threshs[-1], cfg.map_type, map_stat))
+
+
 def run(FLAGS, cfg):
+    if FLAGS.json_eval and cfg.metric == 'VOC':
+        run_voc_json_eval(FLAGS, cfg)
+        return
     if FLAGS.json_eval:
         logger.info(
             "In json_eval mode, PaddleDetection will evaluate json files in "
@@ -99,6 +99,12 @@ def parse_args():
         type=float,
         default=[0.25, 0.25],
         help="Overlap height ratio of the sliced image.")
+    parser.add_argument(
+        "--slice_batch_size",
+        type=int,
+        default=8,
+        help="Number of slices in each batch of slice_infer, slices of "
+        "different images are packed into the same batch.")
     parser.add_argument(
         "--combine_method",
         type=str,
@@ -177,7 +183,8 @@ def run(FLAGS, cfg):
             draw_threshold=FLAGS.draw_threshold,
             output_dir=FLAGS.output_dir,
             save_results=FLAGS.save_results,
-            visualize=FLAGS.visualize)
+            visualize=FLAGS.visualize,
+            slice_batch_size=FLAGS.slice_batch_size)
     else:
         trainer.predict(
             images,
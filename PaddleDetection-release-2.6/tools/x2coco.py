@@ -15,7 +15,9 @@
 # limitations under the License.
 
 import argparse
+import functools
 import glob
+import importlib.util
 import json
 import os
 import os.path as osp
@@ -32,6 +34,17 @@ categories_list = []
 labels_list = []
 
 
+def _load_anno_reader():
+    # load the stdlib-only reader by path, importing ppdet would pull paddle
+    path = osp.join(
+        osp.dirname(osp.abspath(__file__)), '..', 'ppdet', 'data', 'source',
+        'anno_reader.py')
+    spec = importlib.util.spec_from_file_location('anno_reader', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
 class MyEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, np.integer):
@@ -247,7 +260,25 @@ def voc_get_coco_annotation(obj, label2id):
     return anno
 
 
-def voc_xmls_to_cocojson(annotation_paths, label2id, output_dir, output_file):
+def voc_xml_to_coco(im_id_path, label2id):
+    im_id, a_path = im_id_path
+    # Read annotation xml
+    ann_tree = ET.parse(a_path)
+    ann_root = ann_tree.getroot()
+
+    img_info = voc_get_image_info(ann_root, im_id)
+    anns = [
+        voc_get_coco_annotation(
+            obj=obj, label2id=label2id) for obj in ann_root.findall('object')
+    ]
+    return img_info, anns
+
+
+def voc_xmls_to_cocojson(annotation_paths,
+                         label2id,
+                         output_dir,
+                         output_file,
+                         num_workers=None):
     output_json_dict = {
         "images": [],
         "type": "instances",
@@ -255,22 +286,19 @@ def voc_xmls_to_cocojson(annotation_paths, label2id, output_dir, output_file):
         "categories": []
     }
     bnd_id = 1  # bounding box start id
-    im_id = 0
     print('Start converting !')
-    for a_path in tqdm(annotation_paths):
-        # Read annotation xml
-        ann_tree = ET.parse(a_path)
-        ann_root = ann_tree.getroot()
-
-        img_info = voc_get_image_info(ann_root, im_id)
+    records = _load_anno_reader().parallel_map(
+        functools.partial(
+            voc_xml_to_coco, label2id=label2id),
+        enumerate(annotation_paths),
+        num_workers=num_workers)
+    for img_info, anns in tqdm(records, total=len(annotation_paths)):
         output_json_dict['images'].append(img_info)
 
-        for obj in ann_root.findall('object'):
-            ann = voc_get_coco_annotation(obj=obj, label2id=label2id)
-            ann.update({'image_id': im_id, 'id': bnd_id})
+        for ann in anns:
+            ann.update({'image_id': img_info['id'], 'id': bnd_id})
             output_json_dict['annotations'].append(ann)
             bnd_id = bnd_id + 1
-        im_id += 1
 
     for label, label_id in label2id.items():
         category_info = {'supercategory': 'none', 'id': label_id, 'name': label}
@@ -411,6 +439,12 @@ def main():
         type=str,
         default='voc.json',
         help='In Voc format dataset, path to output json file')
+    parser.add_argument(
+        '--num_workers',
+        type=int,
+        default=None,
+        help='Number of processes to parse voc xml files, default is the '
+        'number of cpu cores.')
     parser.add_argument(
         '--widerface_root_dir',
         help='The root_path for wider face dataset, which contains `wider_face_split`, `WIDER_train` and `WIDER_val`.And the json file will save in this path',
@@ -432,7 +466,8 @@ def main():
             annotation_paths=ann_paths,
             label2id=label2id,
             output_dir=args.output_dir,
-            output_file=args.voc_out_name)
+            output_file=args.voc_out_name,
+            num_workers=args.num_workers)
     elif args.dataset_type == "widerface":
         assert args.widerface_root_dir
         widerface_to_cocojson(args.widerface_root_dir)
@@ -21,16 +21,33 @@
   - XML 内部的 <filename>, <folder>, <path>, <name> 全部更新
   - 生成 train.txt / val.txt / label_list.txt
 
+增量合并（默认）：
+  - 输出目录下的 merge_manifest.json 记录每个配对的源路径、内容哈希与分配的输出名
+  - 再次运行时只复制（或硬链接）新增 / 内容变化的配对，已有的 mouse_NNNNN 编号不变，
+    新数据接在各类别最大编号之后；源中已删除的配对从输出中移除
+  - 源文件 mtime/size 未变时不重新计算哈希，复制与写 XML 在线程池中并行
+  - 每个配对的 train/val 划分记录在 manifest 中，已有配对始终保持原划分；
+    首次生成 manifest 时沿用现有 train.txt / val.txt（旧版随机划分），
+    只有新增配对按图片内容哈希划分
+
+用法：
+  python Scripts/merge_dataset.py               # 增量合并
+  python Scripts/merge_dataset.py --link        # 图片用硬链接代替复制
+  python Scripts/merge_dataset.py --rebuild     # 清空输出目录，从头重新编号
+
 输出目录：dataset/mouse_other_voc/
 """
 
 import os
 import sys
+import json
 import shutil
 import glob
-import random
+import hashlib
+import argparse
 import xml.etree.ElementTree as ET
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 # ============================================================
 # 路径定义
@@ -47,6 +64,9 @@ SRC_RAW_VOC = os.path.join(PROJECT_ROOT, "RawData/dog_mouse_other_voc")
 OUT_DIR = os.path.join(PADDLE_DIR, "dataset/mouse_other_voc")
 OUT_IMAGES = os.path.join(OUT_DIR, "images")
 OUT_ANNOTATIONS = os.path.join(OUT_DIR, "annotations")
+MANIFEST_PATH = os.path.join(OUT_DIR, "merge_manifest.json")
+MANIFEST_VERSION = 1
+LABELS = ["mouse", "other"]
 
 # ============================================================
 # 工具函数
@@ -175,7 +195,189 @@ def collect_data():
     return data
 
 
+# ============================================================
+# 增量合并
+# ============================================================
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="合并数据源为 mouse + other 数据集（增量）")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="清空输出目录与 manifest，从头重新编号")
+    parser.add_argument("--link", action="store_true",
+                        help="图片用硬链接代替复制（跨文件系统时自动退回复制）")
+    parser.add_argument("--workers", type=int, default=min(32, (os.cpu_count() or 1) * 4),
+                        help="哈希与复制的线程数")
+    parser.add_argument("--val_ratio", type=float, default=0.2,
+                        help="新增配对的验证集比例（按图片内容哈希划分）")
+    return parser.parse_args()
+
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_stat(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def load_manifest():
+    """返回 {源图片路径: entry}，manifest 不存在或版本不符时为空"""
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") != MANIFEST_VERSION:
+        print(f"  manifest 版本不符，忽略: {MANIFEST_PATH}")
+        return {}
+    return {e["src_img"]: e for e in data["entries"]}
+
+
+def save_manifest(entries):
+    tmp = MANIFEST_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION,
+                   "entries": sorted(entries, key=lambda e: e["name"])},
+                  f, ensure_ascii=False, indent=1)
+    os.replace(tmp, MANIFEST_PATH)
+
+
+def load_split_lists():
+    """读取输出目录中现有的 train.txt / val.txt，返回 {输出名: "train"/"val"}"""
+    splits = {}
+    for split in ("train", "val"):
+        path = os.path.join(OUT_DIR, f"{split}.txt")
+        if not os.path.exists(path):
+            continue
+        with open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    img = line.split()[0]
+                    splits[os.path.splitext(os.path.basename(img))[0]] = split
+    return splits
+
+
+def output_paths(name):
+    return (os.path.join(OUT_IMAGES, f"{name}.jpg"),
+            os.path.join(OUT_ANNOTATIONS, f"{name}.xml"))
+
+
+def export_pair(entry, link=False):
+    """复制（或硬链接）图片并写入更新后的 XML，均先写临时文件再替换"""
+    dst_img, dst_ann = output_paths(entry["name"])
+    tmp_img = dst_img + ".tmp"
+    if os.path.exists(tmp_img):
+        os.remove(tmp_img)
+    if link:
+        try:
+            os.link(entry["src_img"], tmp_img)
+        except OSError:
+            shutil.copy2(entry["src_img"], tmp_img)
+    else:
+        shutil.copy2(entry["src_img"], tmp_img)
+    os.replace(tmp_img, dst_img)
+
+    # 对于 dog->other 的情况，需要把 XML 里的 <name>dog</name> 改成 <name>other</name>
+    tree = update_xml(entry["src_ann"], os.path.basename(dst_img), new_label=entry["label"])
+    tmp_ann = dst_ann + ".tmp"
+    tree.write(tmp_ann, encoding="utf-8", xml_declaration=True)
+    os.replace(tmp_ann, dst_ann)
+
+
+def plan_merge(data, manifest, pool):
+    """
+    对比数据源与 manifest，返回 (entries, to_export, removed, unchanged)：
+      entries   - 本次合并后的全部条目
+      to_export - 需要（重新）导出的条目（新增或内容变化）
+      removed   - 源已删除、需要从输出中移除的旧条目
+    """
+    items = [(label, img, ann, source)
+             for label in LABELS
+             for img, ann, _, source in data[label]]
+    stats = list(pool.map(lambda it: (file_stat(it[1]), file_stat(it[2])), items))
+
+    # 只对 mtime/size 变化或新出现的配对计算哈希
+    need_hash = []
+    for i, ((label, img, ann, _), (img_st, ann_st)) in enumerate(zip(items, stats)):
+        old = manifest.get(img)
+        if old is None or old["label"] != label or old["src_ann"] != ann or \
+                old["img_stat"] != img_st or old["ann_stat"] != ann_st:
+            need_hash.append(i)
+    hashes = dict(zip(need_hash, pool.map(
+        lambda i: (file_sha1(items[i][1]), file_sha1(items[i][2])), need_hash)))
+
+    # 新配对按收集顺序接在各类别已用的最大编号之后
+    next_id = {label: 1 for label in LABELS}
+    for e in manifest.values():
+        label, num = e["name"].rsplit("_", 1)
+        next_id[label] = max(next_id.get(label, 1), int(num) + 1)
+
+    entries, to_export, seen = [], [], set()
+    unchanged = 0
+    for i, ((label, img, ann, source), (img_st, ann_st)) in enumerate(zip(items, stats)):
+        old = manifest.get(img)
+        if old is not None and old["label"] != label:
+            old = None
+        entry = dict(old) if old else {"src_img": img, "label": label}
+        entry.update(src_ann=ann, source=source, img_stat=img_st, ann_stat=ann_st)
+        if i in hashes:
+            entry["img_sha1"], entry["ann_sha1"] = hashes[i]
+        if old is None:
+            entry["name"] = f"{label}_{next_id[label]:05d}"
+            next_id[label] += 1
+        changed = old is None or entry["img_sha1"] != old["img_sha1"] or \
+            entry["ann_sha1"] != old["ann_sha1"] or entry["src_ann"] != old["src_ann"]
+        if changed or not all(os.path.exists(p) for p in output_paths(entry["name"])):
+            to_export.append(entry)
+        else:
+            unchanged += 1
+        entries.append(entry)
+        seen.add(entry["name"])
+
+    removed = [e for e in manifest.values() if e["name"] not in seen]
+    return entries, to_export, removed, unchanged
+
+
+def remove_orphans(names):
+    """删除输出目录中不属于 manifest 的 mouse_/other_ 文件（旧的全量构建或已删除的源）"""
+    count = 0
+    for directory, ext in ((OUT_IMAGES, ".jpg"), (OUT_ANNOTATIONS, ".xml")):
+        for fname in os.listdir(directory):
+            base, e = os.path.splitext(fname)
+            if e == ext and base.split("_", 1)[0] in LABELS and base not in names:
+                os.remove(os.path.join(directory, fname))
+                count += 1
+    return count
+
+
+def split_train_val(entries, val_ratio, prev_splits=None, legacy_splits=None):
+    """
+    划分 train/val，并把结果写回 entry["split"]（随 manifest 保存）：
+      - entry 已有 split（manifest 中记录过）时保持不变
+      - prev_splits    {源图片路径: split}，--rebuild 前 manifest 中的划分
+      - legacy_splits  {输出名: split}，尚无 manifest 时现有 train.txt / val.txt 的划分
+      - 以上都没有的新配对按图片内容哈希划分
+    """
+    prev_splits = prev_splits or {}
+    legacy_splits = legacy_splits or {}
+    train, val = [], []
+    threshold = int(val_ratio * (1 << 32))
+    for e in sorted(entries, key=lambda e: e["name"]):
+        if e.get("split") not in ("train", "val"):
+            split = prev_splits.get(e["src_img"]) or legacy_splits.get(e["name"])
+            if split is None:
+                split = "val" if int(e["img_sha1"][:8], 16) < threshold else "train"
+            e["split"] = split
+        (val if e["split"] == "val" else train).append((e["name"], e["label"]))
+    return train, val
+
+
 def main():
+    args = parse_args()
     print("=" * 60)
     print("数据集集中整理脚本")
     print("=" * 60)
@@ -192,68 +394,50 @@ def main():
     print(f"  合计: {len(data['mouse']) + len(data['other'])} 对")
 
     # ----------------------------------------------------------
-    # Step 2: 创建输出目录
+    # Step 2: 准备输出目录与 manifest
     # ----------------------------------------------------------
-    print(f"\n[Step 2] 创建输出目录: {OUT_DIR}")
-    if os.path.exists(OUT_DIR):
-        print(f"  警告: 输出目录已存在，将清空重建")
+    print(f"\n[Step 2] 输出目录: {OUT_DIR}")
+    # 已有划分：manifest 记录的按源路径保留；还没有 manifest 时沿用现有 train.txt / val.txt
+    prev_manifest = load_manifest()
+    prev_splits = {src: e["split"] for src, e in prev_manifest.items() if "split" in e}
+    legacy_splits = {} if prev_manifest else load_split_lists()
+    if legacy_splits:
+        print(f"  沿用现有 train.txt / val.txt 划分: {len(legacy_splits)} 条")
+    if args.rebuild and os.path.exists(OUT_DIR):
+        print(f"  --rebuild: 清空重建")
         shutil.rmtree(OUT_DIR)
     os.makedirs(OUT_IMAGES, exist_ok=True)
     os.makedirs(OUT_ANNOTATIONS, exist_ok=True)
+    manifest = load_manifest()
+    print(f"  manifest 已记录: {len(manifest)} 对")
 
     # ----------------------------------------------------------
-    # Step 3: 复制并重命名文件
+    # Step 3: 只导出新增 / 变化的配对
     # ----------------------------------------------------------
-    print("\n[Step 3] 复制并重命名文件...")
-
-    all_entries = []  # [(new_basename, label), ...]
-
-    for label in ["mouse", "other"]:
-        items = data[label]
-        print(f"\n  处理 [{label}]: {len(items)} 个文件")
-
-        for idx, (img_path, ann_path, orig_name, source) in enumerate(items, start=1):
-            # 统一命名: mouse_00001 / other_00001
-            new_basename = f"{label}_{idx:05d}"
-            new_img_name = f"{new_basename}.jpg"
-            new_ann_name = f"{new_basename}.xml"
-
-            # 复制图片
-            dst_img = os.path.join(OUT_IMAGES, new_img_name)
-            shutil.copy2(img_path, dst_img)
-
-            # 处理 XML: 更新文件名和标签
-            # 对于 dog->other 的情况，需要把 XML 里的 <name>dog</name> 改成 <name>other</name>
-            if source == "dataset-dog":
-                tree = update_xml(ann_path, new_img_name, new_label="other")
-            else:
-                tree = update_xml(ann_path, new_img_name, new_label=label)
-
-            dst_ann = os.path.join(OUT_ANNOTATIONS, new_ann_name)
-            tree.write(dst_ann, encoding="utf-8", xml_declaration=True)
-
-            all_entries.append((new_basename, label))
-
-            if idx % 500 == 0:
-                print(f"    已处理 {idx}/{len(items)} ...")
-
-        print(f"    {label} 完成: {len(items)} 个文件")
+    print("\n[Step 3] 对比数据源并导出变化的文件...")
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        entries, to_export, removed, unchanged = plan_merge(data, manifest, pool)
+        new_count = sum(1 for e in to_export if e["src_img"] not in manifest)
+        print(f"  新增: {new_count}  更新: {len(to_export) - new_count}  "
+              f"未变: {unchanged}  删除: {len(removed)}")
+
+        for done, _ in enumerate(pool.map(lambda e: export_pair(e, args.link), to_export), start=1):
+            if done % 500 == 0:
+                print(f"    已导出 {done}/{len(to_export)} ...")
+    orphans = remove_orphans({e["name"] for e in entries})
+    if orphans:
+        print(f"  移除多余文件: {orphans}")
 
     # ----------------------------------------------------------
     # Step 4: 生成 train.txt / val.txt
     # ----------------------------------------------------------
     print("\n[Step 4] 生成数据集划分文件...")
 
-    random.seed(42)
-    random.shuffle(all_entries)
-
-    total = len(all_entries)
-    train_ratio = 0.8
-    val_ratio = 0.2
-    train_count = int(total * train_ratio)
-
-    train_entries = all_entries[:train_count]
-    val_entries = all_entries[train_count:]
+    train_entries, val_entries = split_train_val(
+        entries, args.val_ratio, prev_splits, legacy_splits)
+    total = len(entries)
+    save_manifest(entries)
+    print(f"  写入: {MANIFEST_PATH}")
 
     # 统计各划分中的类别分布
     def count_labels(entries):
@@ -269,14 +453,14 @@ def main():
     # 写 train.txt (格式: ./images/xxx.jpg ./annotations/xxx.xml)
     train_path = os.path.join(OUT_DIR, "train.txt")
     with open(train_path, "w") as f:
-        for basename, _ in sorted(train_entries):
+        for basename, _ in train_entries:
             f.write(f"./images/{basename}.jpg ./annotations/{basename}.xml\n")
     print(f"  写入: {train_path}")
 
     # 写 val.txt
     val_path = os.path.join(OUT_DIR, "val.txt")
     with open(val_path, "w") as f:
-        for basename, _ in sorted(val_entries):
+        for basename, _ in val_entries:
             f.write(f"./images/{basename}.jpg ./annotations/{basename}.xml\n")
     print(f"  写入: {val_path}")
 
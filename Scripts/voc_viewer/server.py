@@ -6,27 +6,30 @@ VOC 标注查看器 + 模型推理 Web 服务
 
 用法:
     cd /hy-tmp/paddle_detection_mouse/PaddleDetection-release-2.6
-    python ../Scripts/voc_viewer/server.py [--port 8765]
+    python ../Scripts/voc_viewer/server.py [--port 8765] [--infer-workers 2] [--model-cache 2]
 
 功能:
     1. 浏览 VOC 格式数据集 (images/ + annotations/)
     2. 选择已训练模型，对数据集图片 / 上传图片执行推理
     3. 所有 tools/infer.py 参数均可通过 Web 界面配置
+    4. 推理由常驻进程池执行，已加载的模型按 LRU 缓存，检测结果以 JSON 返回由浏览器绘制
+    5. 文件列表分页加载（标注索引按 mtime 增量更新），缩略图按需生成并缓存到磁盘
 """
 
 import os
 import sys
 import json
-import glob
 import argparse
+import importlib.util
 import mimetypes
-import subprocess
 import tempfile
 import shutil
 import time
 import socket
 import xml.etree.ElementTree as ET
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
 from urllib.parse import parse_qs, urlparse, unquote
 from pathlib import Path
 import threading
@@ -48,6 +51,12 @@ os.makedirs(INFER_OUTPUT_DIR, exist_ok=True)
 UPLOAD_DIR = os.path.join(PADDLE_DET_ROOT, "output", "_web_uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# 缩略图与标注索引缓存目录（按需创建）
+THUMB_DIR = os.path.join(PADDLE_DET_ROOT, "output", "_web_thumbs")
+INDEX_DIR = os.path.join(PADDLE_DET_ROOT, "output", "_web_index")
+
+IMG_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp"}
+
 
 def parse_voc_xml(xml_path):
     """解析 VOC XML 标注文件"""
@@ -78,34 +87,173 @@ def parse_voc_xml(xml_path):
     return result
 
 
-def scan_dataset(dataset_path):
-    """扫描数据集目录"""
-    img_dir = os.path.join(dataset_path, "images")
-    ann_dir = os.path.join(dataset_path, "annotations")
-    if not os.path.isdir(img_dir):
-        return {"error": f"images/ 目录不存在: {img_dir}", "items": []}
-    items = []
-    img_extensions = {".jpg", ".jpeg", ".png", ".bmp"}
-    for fname in sorted(os.listdir(img_dir)):
-        ext = os.path.splitext(fname)[1].lower()
-        if ext not in img_extensions:
-            continue
-        base = os.path.splitext(fname)[0]
-        xml_name = base + ".xml"
-        has_annotation = os.path.exists(os.path.join(ann_dir, xml_name))
-        items.append({"image": fname, "annotation": xml_name if has_annotation else None, "basename": base})
-    labels = {}
-    annotated = 0
-    for item in items:
-        if item["annotation"]:
-            annotated += 1
-            try:
-                data = parse_voc_xml(os.path.join(ann_dir, item["annotation"]))
-                for obj in data["objects"]:
-                    labels[obj["name"]] = labels.get(obj["name"], 0) + 1
-            except:
-                pass
-    return {"path": dataset_path, "total_images": len(items), "annotated": annotated, "labels": labels, "items": items}
+def parallel_map(func, items):
+    """按顺序返回 func(item)，多进程解析（复用 ppdet/data/source/anno_reader.py）"""
+    reader = os.path.join(PADDLE_DET_ROOT, "ppdet", "data", "source", "anno_reader.py")
+    if not os.path.isfile(reader):
+        return map(func, items)
+    # 按路径加载，不 import ppdet（避免引入 paddle 依赖）
+    spec = importlib.util.spec_from_file_location("anno_reader", reader)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.parallel_map(func, items)
+
+
+def parse_voc_labels(xml_path):
+    """返回 XML 中的类别名列表，解析失败返回 None（在子进程中执行）"""
+    try:
+        return [obj["name"] for obj in parse_voc_xml(xml_path)["objects"]]
+    except Exception:
+        return None
+
+
+class AnnotationIndex:
+    """数据集的标注索引
+
+    记录每个 XML 的 (mtime_ns, size, 类别名列表)，刷新时只重新解析新增或被修改的
+    XML，并持久化到 output/_web_index/，服务重启后也无需全量解析。两次刷新间隔
+    不足 REFRESH_INTERVAL 秒时直接复用上次结果，保证翻页期间列表稳定。
+    """
+
+    VERSION = 1
+    REFRESH_INTERVAL = 2.0
+
+    def __init__(self, dataset_path):
+        self.dataset_path = dataset_path
+        self.cache_file = os.path.join(
+            INDEX_DIR, os.path.relpath(dataset_path, DATASET_ROOT).replace(os.sep, "__") + ".json")
+        self.lock = threading.Lock()
+        self.entries = {}   # xml 文件名 -> [mtime_ns, size, labels]
+        self.items = []
+        self.stats = {}
+        self.refreshed = 0
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION:
+                self.entries = data["entries"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def refresh(self):
+        """返回 (items, stats)，只解析变化的 XML"""
+        with self.lock:
+            if time.time() - self.refreshed < self.REFRESH_INTERVAL:
+                return self.items, self.stats
+            img_dir = os.path.join(self.dataset_path, "images")
+            ann_dir = os.path.join(self.dataset_path, "annotations")
+            if not os.path.isdir(img_dir):
+                return [], {"error": f"images/ 目录不存在: {img_dir}"}
+            images = sorted(e.name for e in os.scandir(img_dir)
+                            if os.path.splitext(e.name)[1].lower() in IMG_EXTENSIONS)
+            xml_stats = {}
+            if os.path.isdir(ann_dir):
+                for e in os.scandir(ann_dir):
+                    if e.name.endswith(".xml"):
+                        st = e.stat()
+                        xml_stats[e.name] = [st.st_mtime_ns, st.st_size]
+
+            changed = [n for n, st in xml_stats.items() if self.entries.get(n, [None, None])[:2] != st]
+            removed = [n for n in self.entries if n not in xml_stats]
+            paths = [os.path.join(ann_dir, n) for n in changed]
+            for name, labels in zip(changed, parallel_map(parse_voc_labels, paths)):
+                self.entries[name] = xml_stats[name] + [labels]
+            for name in removed:
+                del self.entries[name]
+            if changed or removed:
+                self._save()
+
+            items, labels = [], {}
+            for fname in images:
+                base = os.path.splitext(fname)[0]
+                xml_name = base + ".xml"
+                has_annotation = xml_name in xml_stats
+                items.append({"image": fname, "annotation": xml_name if has_annotation else None, "basename": base})
+                if has_annotation:
+                    for name in self.entries[xml_name][2] or []:
+                        labels[name] = labels.get(name, 0) + 1
+            self.items = items
+            self.stats = {"path": self.dataset_path, "total_images": len(items),
+                          "annotated": sum(1 for it in items if it["annotation"]), "labels": labels}
+            self.refreshed = time.time()
+            return self.items, self.stats
+
+    def _save(self):
+        os.makedirs(INDEX_DIR, exist_ok=True)
+        tmp = f"{self.cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "entries": self.entries}, f, ensure_ascii=False)
+        os.replace(tmp, self.cache_file)
+
+
+annotation_indexes = {}
+annotation_indexes_lock = threading.Lock()
+
+
+def scan_dataset(dataset_path, offset=0, limit=0, prefixes=(), query=""):
+    """扫描数据集目录，返回按文件名前缀 / 关键字过滤后的第 offset 起 limit 项（limit<=0 为全部）"""
+    with annotation_indexes_lock:
+        index = annotation_indexes.get(dataset_path)
+        if index is None:
+            index = annotation_indexes[dataset_path] = AnnotationIndex(dataset_path)
+    items, stats = index.refresh()
+    if "error" in stats:
+        return {"error": stats["error"], "items": []}
+    if prefixes:
+        items = [it for it in items if it["basename"].startswith(tuple(prefixes))]
+    if query:
+        items = [it for it in items if query in it["basename"].lower()]
+    page = items[offset:offset + limit] if limit > 0 else items[offset:]
+    return dict(stats, total=len(items), offset=offset, items=page)
+
+
+# ──────────── 缩略图缓存 ────────────
+# 缩略图按需由线程池生成并写入 output/_web_thumbs/，文件 mtime 与原图一致，
+# 原图修改后自动重新生成；同一张图的并发请求只生成一次。
+THUMB_SIZES = (96, 160, 320)
+thumb_pool = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1))
+thumb_futures = {}
+thumb_lock = threading.Lock()
+HAS_PIL = importlib.util.find_spec("PIL") is not None
+
+
+def make_thumbnail(src, dst, size):
+    from PIL import Image, ImageOps
+    st = os.stat(src)
+    with Image.open(src) as im:
+        im.draft("RGB", (size, size))  # JPEG 直接按缩小比例解码
+        im = ImageOps.exif_transpose(im)
+        im.thumbnail((size, size))
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp = f"{dst}.{threading.get_ident()}.tmp"
+        im.convert("RGB").save(tmp, "JPEG", quality=85)
+    os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+    os.replace(tmp, dst)
+
+
+def get_thumbnail(src, dataset, name, size):
+    """返回缩略图路径（不存在或已过期时生成），无 PIL 时返回原图"""
+    if not HAS_PIL:
+        return src
+    dst = os.path.join(THUMB_DIR, dataset, str(size), name + ".jpg")
+    try:
+        if os.stat(dst).st_mtime_ns == os.stat(src).st_mtime_ns:
+            return dst
+    except FileNotFoundError:
+        pass
+    with thumb_lock:
+        future = thumb_futures.get(dst)
+        if future is None:
+            future = thumb_futures[dst] = thumb_pool.submit(make_thumbnail, src, dst, size)
+    try:
+        future.result()
+        return dst
+    except Exception:
+        return src
+    finally:
+        with thumb_lock:
+            if thumb_futures.get(dst) is future:
+                del thumb_futures[dst]
 
 
 def list_datasets():
@@ -117,7 +265,7 @@ def list_datasets():
         full = os.path.join(DATASET_ROOT, name)
         if os.path.isdir(full) and os.path.isdir(os.path.join(full, "images")):
             img_count = len([f for f in os.listdir(os.path.join(full, "images"))
-                             if os.path.splitext(f)[1].lower() in {".jpg", ".jpeg", ".png", ".bmp"}])
+                             if os.path.splitext(f)[1].lower() in IMG_EXTENSIONS])
             datasets.append({"name": name, "image_count": img_count})
     return {"root": DATASET_ROOT, "datasets": datasets}
 
@@ -163,100 +311,316 @@ def list_slim_configs():
     return {"slim_configs": slims}
 
 
-# ──────────── 推理任务管理 ────────────
+# ──────────── 常驻推理进程池 ────────────
+# 每个 worker 进程常驻 Paddle，并按 (config, weights, ...) 以 LRU 缓存已加载权重的
+# Trainer，重复推理只需一次前向；检测结果以 JSON 返回，由浏览器绘制。
 infer_lock = threading.Lock()
-infer_status = {"running": False, "log": "", "result_image": None, "exit_code": None}
+infer_jobs = {}          # job_id -> 任务状态
+MAX_FINISHED_JOBS = 50   # 保留的已结束任务数
+
 
+def model_key(params):
+    """Trainer 缓存键：配置、权重（含修改时间，权重被覆盖后重新加载）、slim 配置与 -o 选项"""
+    weights = params.get("weights", "")
+    weights_path = os.path.join(PADDLE_DET_ROOT, weights)
+    mtime = os.path.getmtime(weights_path) if os.path.isfile(weights_path) else 0
+    return (params["config"], weights, mtime, params.get("slim_config") or "",
+            " ".join((params.get("extra_opts") or "").split()))
 
-def run_inference(params):
-    """在子进程中执行 tools/infer.py"""
-    global infer_status
-    with infer_lock:
-        infer_status = {"running": True, "log": "Starting inference...\n", "result_image": None, "exit_code": None}
 
-    # 构建命令
-    cmd = [sys.executable, "tools/infer.py"]
-    cmd += ["-c", params["config"]]
+def _build_trainer(params):
+    """与 tools/infer.py 相同的方式构建 Trainer 并加载权重（在 worker 进程中执行）"""
+    import paddle
+    from ppdet.core.workspace import load_config, merge_config
+    from ppdet.engine import Trainer
+    from ppdet.slim import build_slim_model
+    from ppdet.utils.check import check_config
+    from ppdet.utils.cli import ArgsParser
 
-    # -o 参数: 每个 key=value 必须作为独立的 list 元素传给 -o
-    opt_items = []
+    opts = []
     if params.get("weights"):
-        opt_items.append(f"weights={params['weights']}")
-    if params.get("extra_opts"):
-        # 用户输入如 "use_gpu=True num_classes=2"，按空格拆成多个独立项
-        for part in params["extra_opts"].strip().split():
-            if part:
-                opt_items.append(part)
-    if opt_items:
-        cmd += ["-o"] + opt_items
-
-    # 推理目标
-    if params.get("infer_img"):
-        cmd += ["--infer_img", params["infer_img"]]
-    elif params.get("infer_dir"):
-        cmd += ["--infer_dir", params["infer_dir"]]
-
-    # 输出目录（空字符串时用默认值）
-    output_dir = params.get("output_dir") or INFER_OUTPUT_DIR
-    cmd += ["--output_dir", output_dir]
-
-    # 其他参数
-    if params.get("draw_threshold"):
-        cmd += ["--draw_threshold", str(params["draw_threshold"])]
+        opts.append(f"weights={params['weights']}")
+    opts += (params.get("extra_opts") or "").split()
+    opt = ArgsParser().parse_args(["-c", params["config"], "-o"] + opts).opt
+
+    cfg = load_config(params["config"])
+    merge_config(opt)
+    for k in ("use_gpu", "use_npu", "use_xpu", "use_mlu"):
+        if k not in cfg:
+            cfg[k] = False
+    if cfg.use_gpu:
+        paddle.set_device("gpu")
+    elif cfg.use_npu:
+        paddle.set_device("npu")
+    elif cfg.use_xpu:
+        paddle.set_device("xpu")
+    elif cfg.use_mlu:
+        paddle.set_device("mlu")
+    else:
+        paddle.set_device("cpu")
     if params.get("slim_config"):
-        cmd += ["--slim_config", params["slim_config"]]
-    if params.get("save_results"):
-        cmd += ["--save_results", "True"]
-    if params.get("slice_infer"):
-        cmd += ["--slice_infer"]
-        if params.get("slice_size"):
-            cmd += ["--slice_size"] + params["slice_size"].split()
-        if params.get("overlap_ratio"):
-            cmd += ["--overlap_ratio"] + params["overlap_ratio"].split()
-        if params.get("combine_method"):
-            cmd += ["--combine_method", params["combine_method"]]
-        if params.get("match_threshold"):
-            cmd += ["--match_threshold", str(params["match_threshold"])]
-        if params.get("match_metric"):
-            cmd += ["--match_metric", params["match_metric"]]
-    if params.get("visualize") == "false":
-        cmd += ["--visualize", "False"]
-
-    with infer_lock:
-        infer_status["log"] += f"CMD: {' '.join(cmd)}\n\n"
+        cfg = build_slim_model(cfg, params["slim_config"], mode="test")
+    check_config(cfg)
+
+    trainer = Trainer(cfg, mode="test")
+    trainer.load_weights(cfg.weights)
+    return trainer
+
+
+def _collect_detections(trainer, results):
+    """把 Trainer 的输出整理为每张图片的检测框列表"""
+    from ppdet.data.source.category import get_categories
+    from ppdet.metrics import get_infer_results
+
+    clsid2catid, catid2name = get_categories(
+        trainer.cfg.metric, anno_file=trainer.dataset.get_anno())
+    imid2path = trainer.dataset.get_imid2path()
+    images = {}
+    for outs in results:
+        for det in get_infer_results(outs, clsid2catid).get("bbox", []):
+            images.setdefault(int(det["image_id"]), []).append({
+                "category_id": int(det["category_id"]),
+                "label": str(catid2name.get(det["category_id"], det["category_id"])),
+                "score": round(float(det["score"]), 4),
+                "bbox": [round(float(v), 2) for v in det["bbox"][:4]],  # x, y, w, h
+            })
+    return [{"image": imid2path[im_id], "detections": images.get(im_id, [])}
+            for im_id in sorted(imid2path)]
+
+
+def _worker_main(worker_id, paddle_root, cache_size, job_queue, event_queue):
+    """worker 进程入口：循环取任务，命中缓存则直接推理"""
+    import copy
+    import gc
+    import traceback
+    from collections import OrderedDict
+
+    os.chdir(paddle_root)
+    sys.path.insert(0, paddle_root)
+
+    def emit(job_id, kind, value=None):
+        event_queue.put((worker_id, job_id, kind, value))
 
     try:
-        proc = subprocess.Popen(
-            cmd, cwd=PADDLE_DET_ROOT,
-            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-            text=True, bufsize=1
-        )
-        for line in proc.stdout:
-            with infer_lock:
-                infer_status["log"] += line
-        proc.wait()
+        import ppdet.engine  # noqa: 导入时注册全部模块
+        from ppdet.core import workspace
+        from ppdet.core.config.schema import SchemaDict
+    except Exception:
+        emit(None, "fatal", traceback.format_exc())
+        return
+
+    # ppdet 的配置是进程内全局的：每个 Trainer 构建前从注册时的初始配置重建，
+    # 并保存自己的一份，推理前换回
+    def copy_config(cfg):
+        return {k: v.copy() if isinstance(v, SchemaDict) else copy.deepcopy(v)
+                for k, v in cfg.items()}
+
+    pristine = copy_config(workspace.global_config)
+
+    def use_config(cfg):
+        workspace.global_config.clear()
+        workspace.global_config.update(cfg)
+
+    trainers = OrderedDict()  # key -> (trainer, config)
+    while True:
+        job = job_queue.get()
+        if job is None:
+            break
+        job_id, key, params = job
+        try:
+            t0 = time.time()
+            if key in trainers:
+                trainers.move_to_end(key)
+                trainer, cfg = trainers[key]
+                emit(job_id, "log", f"[worker {worker_id}] 使用已加载的模型\n")
+            else:
+                emit(job_id, "state", "loading")
+                emit(job_id, "log", f"[worker {worker_id}] 加载模型 {params['config']} {params.get('weights', '')}\n")
+                while len(trainers) >= cache_size:
+                    old_key, _ = trainers.popitem(last=False)
+                    emit(job_id, "log", f"[worker {worker_id}] 释放模型 {old_key[0]} {old_key[1]}\n")
+                    gc.collect()
+                use_config(copy_config(pristine))
+                trainer = _build_trainer(params)
+                cfg = dict(workspace.global_config)
+                trainers[key] = (trainer, cfg)
+                emit(job_id, "log", f"[worker {worker_id}] 模型加载完成 {time.time() - t0:.2f}s\n")
+            emit(job_id, "state", "running")
+            use_config(cfg)
+
+            images = params["images"]
+            output_dir = params["output_dir"]
+            save_results = bool(params.get("save_results"))
+            t1 = time.time()
+            if params.get("slice_infer"):
+                results = trainer.slice_predict(
+                    images,
+                    slice_size=[int(v) for v in (params.get("slice_size") or "640 640").split()],
+                    overlap_ratio=[float(v) for v in (params.get("overlap_ratio") or "0.25 0.25").split()],
+                    slice_batch_size=int(params.get("slice_batch_size") or 8),
+                    combine_method=params.get("combine_method") or "nms",
+                    match_threshold=float(params.get("match_threshold") or 0.6),
+                    match_metric=params.get("match_metric") or "ios",
+                    output_dir=output_dir,
+                    save_results=save_results,
+                    visualize=False)
+            else:
+                results = trainer.predict(
+                    images,
+                    output_dir=output_dir,
+                    save_results=save_results,
+                    visualize=False)
+            detections = _collect_detections(trainer, results)
+            emit(job_id, "log", f"[worker {worker_id}] 推理 {len(images)} 张图片 {time.time() - t1:.2f}s\n")
+            emit(job_id, "done", detections)
+        except Exception:
+            emit(job_id, "error", traceback.format_exc())
+
+
+class InferencePool:
+    """常驻推理进程池
+
+    每个 worker 进程有自己的任务队列与 Trainer LRU 缓存（容量 cache_size）。
+    提交任务时优先派给已缓存该模型的空闲 worker，否则派给最空闲的 worker；
+    父进程维护各 worker 缓存键的镜像（与 worker 按相同顺序执行 LRU），
+    并由后台线程收集 worker 事件更新 infer_jobs。
+    """
+
+    def __init__(self, num_workers=2, cache_size=2):
+        import multiprocessing
+        # 不 fork 带线程的服务进程，Paddle 只在 worker 中导入
+        self.ctx = multiprocessing.get_context("spawn")
+        self.cache_size = max(1, cache_size)
+        self.event_queue = self.ctx.Queue()
+        self.workers = [self._start_worker(i) for i in range(max(1, num_workers))]
+        self.next_job = 0
+        threading.Thread(target=self._collect, daemon=True).start()
+
+    def _start_worker(self, worker_id):
+        job_queue = self.ctx.Queue()
+        proc = self.ctx.Process(
+            target=_worker_main,
+            args=(worker_id, PADDLE_DET_ROOT, self.cache_size, job_queue, self.event_queue),
+            daemon=True)
+        proc.start()
+        return {"id": worker_id, "proc": proc, "queue": job_queue, "jobs": [], "models": []}
+
+    def submit(self, params, images):
+        """入队一个推理任务，返回 job_id"""
+        key = model_key(params)
+        params = dict(params, images=images)
         with infer_lock:
-            infer_status["exit_code"] = proc.returncode
-            infer_status["log"] += f"\n[Exit code: {proc.returncode}]\n"
-
-            # 找到输出图片
-            if proc.returncode == 0:
-                result_imgs = sorted(glob.glob(os.path.join(output_dir, "*.jpg")) +
-                                     glob.glob(os.path.join(output_dir, "*.png")),
-                                     key=os.path.getmtime, reverse=True)
-                if result_imgs:
-                    infer_status["result_image"] = result_imgs[0]
-    except Exception as e:
+            self.next_job += 1
+            job_id = str(self.next_job)
+            cached = [w for w in self.workers if key in w["models"]]
+            idle = [w for w in self.workers if not w["jobs"]]
+            if cached and not cached[0]["jobs"]:
+                worker = cached[0]
+            elif idle:
+                worker = idle[0]
+            else:
+                worker = min(cached or self.workers, key=lambda w: len(w["jobs"]))
+            hit = key in worker["models"]
+            if hit:
+                worker["models"].remove(key)
+            worker["models"].append(key)
+            del worker["models"][:-self.cache_size]
+            worker["jobs"].append(job_id)
+            infer_jobs[job_id] = {
+                "job": job_id, "state": "queued", "worker": worker["id"],
+                "cached": hit, "key": key, "log": f"排队中 (worker {worker['id']})\n",
+                "results": None, "submitted": time.time(), "elapsed": None,
+            }
+            self._prune_jobs()
+        worker["queue"].put((job_id, key, params))
+        return job_id
+
+    def _prune_jobs(self):
+        finished = [j for j, st in infer_jobs.items() if st["state"] in ("done", "error")]
+        for job_id in finished[:-MAX_FINISHED_JOBS]:
+            infer_jobs.pop(job_id, None)
+
+    def _finish(self, worker, job_id, state, log=""):
+        job = infer_jobs.get(job_id)
+        if job_id in worker["jobs"]:
+            worker["jobs"].remove(job_id)
+        if job is None:
+            return
+        job["state"] = state
+        job["log"] += log
+        job["elapsed"] = round(time.time() - job["submitted"], 3)
+
+    def _collect(self):
+        import queue
+        while True:
+            try:
+                worker_id, job_id, kind, value = self.event_queue.get(timeout=1)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            with infer_lock:
+                worker = self.workers[worker_id]
+                job = infer_jobs.get(job_id)
+                if kind == "fatal":
+                    worker["fatal"] = value
+                    print(f"[worker {worker_id}] 启动失败:\n{value}")
+                elif kind == "done":
+                    if job is not None:
+                        job["results"] = value
+                    self._finish(worker, job_id, "done")
+                elif kind == "error":
+                    if job is not None and job["state"] == "loading":
+                        # 加载失败的模型不在 worker 缓存中
+                        worker["models"] = [k for k in worker["models"] if k != job["key"]]
+                    self._finish(worker, job_id, "error", f"\n[ERROR]\n{value}")
+                elif job is not None:
+                    if kind == "state":
+                        job["state"] = value
+                    elif kind == "log":
+                        job["log"] += value
+
+    def _check_workers(self):
+        """worker 异常退出（如显存不足被杀）时任务标记失败并重启该 worker"""
         with infer_lock:
-            infer_status["log"] += f"\n[ERROR] {e}\n"
-            infer_status["exit_code"] = -1
-    finally:
+            for i, worker in enumerate(self.workers):
+                if worker["proc"].is_alive() or (worker.get("fatal") and not worker["jobs"]):
+                    continue
+                reason = worker.get("fatal") or f"worker {i} 异常退出 (exit {worker['proc'].exitcode})"
+                for job_id in list(worker["jobs"]):
+                    self._finish(worker, job_id, "error", f"\n[ERROR] {reason}\n")
+                if not worker.get("fatal"):
+                    # 导入 ppdet 失败时重启也无济于事
+                    self.workers[i] = self._start_worker(i)
+
+    def info(self):
         with infer_lock:
-            infer_status["running"] = False
+            return {"workers": [{"id": w["id"], "alive": w["proc"].is_alive(),
+                                 "pending": len(w["jobs"]),
+                                 "models": [{"config": k[0], "weights": k[1]} for k in w["models"]]}
+                                for w in self.workers],
+                    "cache_size": self.cache_size}
+
+
+infer_pool = None
+
+
+def resolve_infer_images(params):
+    """与 tools/infer.py 的 get_test_images 相同：infer_img 优先，否则 infer_dir 下的图片"""
+    infer_img, infer_dir = params.get("infer_img"), params.get("infer_dir")
+    if infer_img:
+        path = os.path.join(PADDLE_DET_ROOT, infer_img)
+        return [path] if os.path.isfile(path) else []
+    full_dir = os.path.join(PADDLE_DET_ROOT, infer_dir or "")
+    if not infer_dir or not os.path.isdir(full_dir):
+        return []
+    return [os.path.join(full_dir, f) for f in sorted(os.listdir(full_dir))
+            if os.path.splitext(f)[1].lower() in IMG_EXTENSIONS]
 
 
 class ViewerHandler(SimpleHTTPRequestHandler):
-    """自定义 HTTP 请求处理器"""
+    """自定义 HTTP 请求处理器（每个连接一个线程，HTTP/1.1 长连接）"""
+
+    protocol_version = "HTTP/1.1"
 
     def log_message(self, format, *args):
         pass  # 静默日志
@@ -276,7 +640,11 @@ class ViewerHandler(SimpleHTTPRequestHandler):
             full_path = os.path.join(DATASET_ROOT, ds)
             if not os.path.isdir(full_path):
                 return self._json({"error": f"目录不存在: {ds}"})
-            return self._json(scan_dataset(full_path))
+            offset = max(0, int(params.get("offset", ["0"])[0]))
+            limit = int(params.get("limit", ["0"])[0])
+            prefixes = [p for p in params.get("prefix", [""])[0].split(",") if p]
+            query = params.get("q", [""])[0].lower()
+            return self._json(scan_dataset(full_path, offset, limit, prefixes, query))
         if path == "/api/annotation":
             ds = params.get("dataset", [""])[0]
             xml_name = params.get("file", [""])[0]
@@ -293,15 +661,27 @@ class ViewerHandler(SimpleHTTPRequestHandler):
         if path == "/api/slim_configs":
             return self._json(list_slim_configs())
         if path == "/api/infer/status":
+            job_id = params.get("job", [""])[0]
             with infer_lock:
-                return self._json(dict(infer_status))
-        if path == "/api/infer/result_image":
+                job = infer_jobs.get(job_id)
+                job = {k: v for k, v in job.items() if k != "key"} if job else None
+                queued = sum(1 for j in infer_jobs.values() if j["state"] == "queued")
+            if job is None:
+                return self._json({"error": f"任务不存在: {job_id}"})
+            job["queued"] = queued
+            return self._json(job)
+        if path == "/api/infer/image":
+            # 只提供任务结果中的图片，前端在其上绘制检测框
+            job_id = params.get("job", [""])[0]
+            index = int(params.get("index", ["0"])[0])
             with infer_lock:
-                img_path = infer_status.get("result_image")
-            if img_path and os.path.exists(img_path):
-                return self._serve_file(img_path, no_store=True)
+                results = (infer_jobs.get(job_id) or {}).get("results") or []
+            if 0 <= index < len(results) and os.path.exists(results[index]["image"]):
+                return self._serve_file(results[index]["image"])
             self.send_error(404, "No result image")
             return
+        if path == "/api/infer/pool":
+            return self._json(infer_pool.info())
 
         # ── 图片服务 ──
         if path.startswith("/images/"):
@@ -312,13 +692,14 @@ class ViewerHandler(SimpleHTTPRequestHandler):
                 return self._serve_file(img_path)
             self.send_error(404)
             return
-
-        # ── 推理结果图片 ──
-        if path.startswith("/infer_vis/"):
-            fname = unquote(path[len("/infer_vis/"):])
-            fpath = os.path.join(INFER_OUTPUT_DIR, fname)
-            if os.path.exists(fpath):
-                return self._serve_file(fpath)
+        if path.startswith("/thumbs/"):
+            ds = params.get("dataset", [""])[0]
+            img_name = unquote(path[len("/thumbs/"):])
+            size = int(params.get("size", [str(THUMB_SIZES[0])])[0])
+            size = min(THUMB_SIZES, key=lambda s: abs(s - size))
+            img_path = os.path.join(DATASET_ROOT, ds, "images", img_name)
+            if os.path.exists(img_path):
+                return self._serve_file(get_thumbnail(img_path, ds, img_name, size))
             self.send_error(404)
             return
 
@@ -341,20 +722,14 @@ class ViewerHandler(SimpleHTTPRequestHandler):
             except:
                 return self._json({"error": "Invalid JSON"})
 
-            with infer_lock:
-                if infer_status["running"]:
-                    return self._json({"error": "推理正在进行中，请等待完成"})
-
-            # 清理旧结果
-            for f in glob.glob(os.path.join(INFER_OUTPUT_DIR, "*")):
-                try:
-                    os.remove(f)
-                except:
-                    pass
-
-            t = threading.Thread(target=run_inference, args=(params,), daemon=True)
-            t.start()
-            return self._json({"status": "started"})
+            if not params.get("config") or not params.get("weights"):
+                return self._json({"error": "缺少 config 或 weights"})
+            images = resolve_infer_images(params)
+            if not images:
+                return self._json({"error": "未找到推理图片"})
+            params["output_dir"] = params.get("output_dir") or INFER_OUTPUT_DIR
+            job_id = infer_pool.submit(params, images)
+            return self._json({"job": job_id, "images": len(images)})
 
         if path == "/api/upload":
             # 简单的图片上传
@@ -377,22 +752,54 @@ class ViewerHandler(SimpleHTTPRequestHandler):
         self.wfile.write(body)
 
     def _serve_file(self, filepath, no_store=False):
+        """sendfile 发送文件，带 ETag / Last-Modified，未修改时返回 304"""
         try:
-            with open(filepath, "rb") as f:
-                data = f.read()
+            f = open(filepath, "rb")
+        except (FileNotFoundError, IsADirectoryError):
+            self.send_error(404)
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+            cache_control = "no-store" if no_store else "no-cache"
+            if not no_store and self._not_modified(etag, st.st_mtime):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", cache_control)
+                self.end_headers()
+                return
             mime = mimetypes.guess_type(filepath)[0] or "application/octet-stream"
             self.send_response(200)
             self.send_header("Content-Type", mime)
-            self.send_header("Content-Length", len(data))
-            self.send_header("Cache-Control", "no-store" if no_store else "no-cache")
+            self.send_header("Content-Length", st.st_size)
+            self.send_header("Cache-Control", cache_control)
+            if not no_store:
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", formatdate(st.st_mtime, usegmt=True))
             self.end_headers()
-            self.wfile.write(data)
-        except FileNotFoundError:
-            self.send_error(404)
+            try:
+                self.connection.sendfile(f)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+
+    def _not_modified(self, etag, mtime):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = [t.strip() for t in if_none_match.split(",")]
+            return "*" in tags or etag in tags or f"W/{etag}" in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
 
 
-class ReusableHTTPServer(HTTPServer):
+class ReusableHTTPServer(ThreadingHTTPServer):
     allow_reuse_address = True
+    daemon_threads = True
+
     def server_bind(self):
         self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         super().server_bind()
@@ -404,15 +811,21 @@ def main():
     parser.add_argument("--host", type=str, default="0.0.0.0", help="监听地址")
     parser.add_argument("--paddle-root", type=str, default=None,
                         help="PaddleDetection 根目录 (默认自动检测)")
+    parser.add_argument("--infer-workers", type=int, default=2,
+                        help="常驻推理进程数 (默认 2)")
+    parser.add_argument("--model-cache", type=int, default=2,
+                        help="每个推理进程缓存的模型数，超出按 LRU 释放 (默认 2)")
     args = parser.parse_args()
 
     if args.paddle_root:
-        global PADDLE_DET_ROOT, DATASET_ROOT, OUTPUT_ROOT, INFER_OUTPUT_DIR, UPLOAD_DIR
+        global PADDLE_DET_ROOT, DATASET_ROOT, OUTPUT_ROOT, INFER_OUTPUT_DIR, UPLOAD_DIR, THUMB_DIR, INDEX_DIR
         PADDLE_DET_ROOT = os.path.abspath(args.paddle_root)
         DATASET_ROOT = os.path.join(PADDLE_DET_ROOT, "dataset")
         OUTPUT_ROOT = os.path.join(PADDLE_DET_ROOT, "output")
         INFER_OUTPUT_DIR = os.path.join(OUTPUT_ROOT, "_web_infer_vis")
         UPLOAD_DIR = os.path.join(OUTPUT_ROOT, "_web_uploads")
+        THUMB_DIR = os.path.join(OUTPUT_ROOT, "_web_thumbs")
+        INDEX_DIR = os.path.join(OUTPUT_ROOT, "_web_index")
         os.makedirs(INFER_OUTPUT_DIR, exist_ok=True)
         os.makedirs(UPLOAD_DIR, exist_ok=True)
 
@@ -422,8 +835,11 @@ def main():
     print(f"  数据集目录:      {DATASET_ROOT}")
     print(f"  模型输出目录:    {OUTPUT_ROOT}")
     print(f"  服务地址:        http://{args.host}:{args.port}")
+    print(f"  推理进程:        {args.infer_workers} 个，每个缓存 {args.model_cache} 个模型")
     print("=" * 56)
 
+    global infer_pool
+    infer_pool = InferencePool(args.infer_workers, args.model_cache)
     server = ReusableHTTPServer((args.host, args.port), ViewerHandler)
     try:
         server.serve_forever()